@@ -1,12 +1,13 @@
 """
 AI Lead Magnet Generator - Main Entry Point
 Gradio приложение для генерации лид-магнитов с использованием Tavily Search и LLM.
+Без аргументов запускает UI; остальные команды - см. src/cli.py.
 """
 
 import logging
 import sys
 
-from src.ui import main
+from src.cli import main
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -17,4 +18,4 @@ if __name__ == "__main__":
         ]
     )
 
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,189 @@
+"""
+HTTP API Module
+JSON API заданий генерации рядом с Gradio UI: постановка, статус, SSE-прогресс, результат и отмена поверх очереди заданий.
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import asdict, fields
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from src.config import UiSettings, validate_ui_settings
+from src.jobs import JOB_STATUS_FAILED, JOB_STATUS_CANCELLED, JOB_STATUS_RUNNING, JOB_STATUS_SUCCEEDED, TERMINAL_JOB_STATUSES, JobQueue, JobRecord
+from src.progress import ProgressTracker
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api"
+SSE_POLL_INTERVAL = 0.5
+SSE_HEARTBEAT_SECONDS = 15.0
+
+
+class JobSubmission(BaseModel):
+    """Тело запроса постановки задания."""
+    topic: str = Field(..., min_length=1)
+    settings: dict = Field(default_factory=dict)
+
+
+def _job_view(job: JobRecord) -> dict:
+    """Публичное представление задания (без путей сервера)."""
+    view = {
+        "job_id": job.job_id,
+        "topic": job.topic,
+        "status": job.status,
+        "settings": asdict(job.settings),
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+    if job.status == JOB_STATUS_SUCCEEDED and job.result_path:
+        view["result_url"] = f"{API_PREFIX}/jobs/{job.job_id}/result"
+    elif job.status == JOB_STATUS_RUNNING and job.partial_path:
+        view["partial_url"] = f"{API_PREFIX}/jobs/{job.job_id}/partial"
+    return view
+
+
+def _sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Одно сообщение Server-Sent Events."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _settings_from(payload: dict) -> UiSettings:
+    """UiSettings из JSON запроса; неизвестные поля - ошибка."""
+    known = {f.name for f in fields(UiSettings)}
+    unknown = sorted(set(payload) - known)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(unknown)}")
+    settings = UiSettings(**payload)
+    if not validate_ui_settings(settings):
+        raise ValueError("Invalid settings")
+    return settings
+
+
+async def job_events(queue: JobQueue, job_id: str, after_seq: int = 0, poll_interval: float = SSE_POLL_INTERVAL) -> AsyncIterator[str]:
+    """
+    SSE-поток прогресса задания.
+
+    # START_CONTRACT_job_events
+    # Input: queue (JobQueue), job_id (str), after_seq (int) - последний полученный номер события (Last-Event-ID), poll_interval (float)
+    # Russian Intent: Стримить события задания без выделенного потока на клиента: чтение SQLite коротко в пуле, ожидание - в event loop
+    # Output: AsyncIterator[str] - сообщения progress, затем одно done
+    # END_CONTRACT_job_events
+    """
+    logger.debug(f"[API][job_events] Belief: Подписка SSE на задание | Input: job_id={job_id}, after_seq={after_seq} | Expected: AsyncIterator[str]")
+
+    tracker = ProgressTracker()
+    last_seq = after_seq
+    idle = 0.0
+    while True:
+        job = await asyncio.to_thread(queue.get_job, job_id)
+        events = await asyncio.to_thread(queue.list_events, job_id, last_seq)
+        for event in events:
+            last_seq = event.seq
+            progress = tracker.event(event.logs or "", event.markdown, event.filepath)
+            yield _sse("progress", {
+                "seq": event.seq,
+                "message": progress.message,
+                "stage": progress.stage,
+                "step": progress.step,
+                "total_steps": progress.total_steps,
+                "percent": round(progress.percent, 1),
+                "eta_seconds": progress.eta_seconds,
+                "markdown": progress.markdown,
+            }, event.seq)
+
+        # Статус прочитан до событий: события терминального задания уже все получены
+        if job is None or job.status in TERMINAL_JOB_STATUSES:
+            yield _sse("done", _job_view(job) if job is not None else {"job_id": job_id, "status": "unknown"})
+            return
+
+        idle = 0.0 if events else idle + poll_interval
+        if idle >= SSE_HEARTBEAT_SECONDS:
+            idle = 0.0
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(poll_interval)
+
+
+def create_api(queue: JobQueue) -> FastAPI:
+    """
+    Создает FastAPI-приложение API заданий.
+
+    # START_CONTRACT_create_api
+    # Input: queue (JobQueue) - очередь, которую исполняет пул worker-процессов
+    # Russian Intent: Дать интеграциям (CRM) постановку, опрос, SSE-прогресс, результат и отмену без Gradio UI
+    # Output: FastAPI
+    # END_CONTRACT_create_api
+    """
+    logger.debug("[API][create_api] Belief: Создание HTTP API | Input: queue | Expected: FastAPI")
+
+    app = FastAPI(title="AI Lead Magnet Generator API")
+
+    async def require_job(job_id: str) -> JobRecord:
+        job = await asyncio.to_thread(queue.get_job, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+        return job
+
+    @app.post(f"{API_PREFIX}/jobs", status_code=202)
+    async def submit_job(submission: JobSubmission) -> dict:
+        try:
+            settings = _settings_from(submission.settings)
+            job_id = await asyncio.to_thread(queue.submit, submission.topic, settings)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return _job_view(await require_job(job_id))
+
+    @app.get(f"{API_PREFIX}/jobs/{{job_id}}")
+    async def get_job(job_id: str) -> dict:
+        return _job_view(await require_job(job_id))
+
+    @app.get(f"{API_PREFIX}/jobs/{{job_id}}/events")
+    async def stream_job_events(job_id: str, last_event_id: Optional[str] = Header(default=None)) -> StreamingResponse:
+        await require_job(job_id)
+        after_seq = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+        return StreamingResponse(
+            job_events(queue, job_id, after_seq),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    @app.get(f"{API_PREFIX}/jobs/{{job_id}}/result")
+    async def get_result(job_id: str) -> PlainTextResponse:
+        job = await require_job(job_id)
+        if job.status in (JOB_STATUS_FAILED, JOB_STATUS_CANCELLED):
+            raise HTTPException(status_code=409, detail=f"Job {job.status}: {job.error}")
+        if job.status != JOB_STATUS_SUCCEEDED or not job.result_path:
+            raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+        try:
+            markdown = await asyncio.to_thread(Path(job.result_path).read_text, encoding="utf-8")
+        except OSError:
+            raise HTTPException(status_code=410, detail="Result file is no longer available")
+        return PlainTextResponse(markdown, media_type="text/markdown; charset=utf-8")
+
+    @app.get(f"{API_PREFIX}/jobs/{{job_id}}/partial")
+    async def get_partial(job_id: str) -> PlainTextResponse:
+        job = await require_job(job_id)
+        if job.status != JOB_STATUS_RUNNING or not job.partial_path:
+            raise HTTPException(status_code=409, detail=f"No partial document: job is {job.status}")
+        try:
+            markdown = await asyncio.to_thread(Path(job.partial_path).read_text, encoding="utf-8")
+        except OSError:
+            # Частичный файл уже опубликован или удален: клиент перечитывает статус
+            raise HTTPException(status_code=410, detail="Partial document is no longer available")
+        return PlainTextResponse(markdown, media_type="text/markdown; charset=utf-8")
+
+    @app.post(f"{API_PREFIX}/jobs/{{job_id}}/cancel")
+    async def cancel_job(job_id: str) -> dict:
+        await require_job(job_id)
+        cancelled = await asyncio.to_thread(queue.cancel, job_id, "cancelled via API")
+        return {**_job_view(await require_job(job_id)), "cancelled": cancelled}
+
+    return app
@@ -0,0 +1,219 @@
+"""
+Application Context Module
+Долгоживущий контекст процесса: конфигурация, пул клиентов провайдеров и фоновое сохранение настроек сессий.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.config import AppConfig, UiSettings, load_env_config
+from src.clients import LlmClient, TavilyClientWrapper, build_clients
+from src.jobs import JobQueue
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID_UNSAFE = re.compile(r"[^A-Za-z0-9_-]")
+
+_app_context: Optional["AppContext"] = None
+_app_context_lock = threading.Lock()
+
+# Файл .env относительно рабочего каталога процесса
+ENV_FILE = ".env"
+
+
+def env_file_stamp(env_file: str = ENV_FILE) -> str:
+    """Отметка файла .env (mtime и размер); пустая строка, если файла нет."""
+    try:
+        stat = os.stat(env_file)
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def environment_fingerprint(env_file: str = ENV_FILE) -> str:
+    """Отпечаток ENV процесса и файла .env: меняется при любом изменении переменных или правке файла."""
+    payload = "\0".join(f"{name}={value}" for name, value in sorted(os.environ.items()))
+    payload += f"\0{env_file}@{env_file_stamp(env_file)}"
+    return hashlib.sha256(payload.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def reload_env_file(env_file: str = ENV_FILE) -> None:
+    """Перечитывает .env поверх ENV процесса: правка файла побеждает значения, загруженные при старте."""
+    from dotenv import load_dotenv
+
+    if os.path.exists(env_file):
+        load_dotenv(env_file, override=True)
+
+
+class SessionSettingsStore:
+    """Настройки UI по сессиям: запись в фоновом потоке, последняя запись сессии побеждает."""
+
+    def __init__(self, directory: str):
+        """
+        Инициализация хранилища.
+
+        # START_CONTRACT_SessionSettingsStore_init
+        # Input: directory (str) - каталог файлов <session>.json, пусто = не сохранять
+        # Russian Intent: Убрать синхронную запись на диск из пути запроса и гонку сессий за один общий файл
+        # Output: None
+        # END_CONTRACT_SessionSettingsStore_init
+        """
+        self.directory = directory
+        self._pending: Dict[str, UiSettings] = {}
+        self._condition = threading.Condition()
+        self._writing = False
+        self._thread: Optional[threading.Thread] = None
+
+    def path_for(self, session_id: str) -> Path:
+        """Файл настроек сессии."""
+        return Path(self.directory) / f"{_SESSION_ID_UNSAFE.sub('_', session_id)}.json"
+
+    def save_async(self, session_id: Optional[str], settings: UiSettings) -> None:
+        """Ставит настройки сессии в очередь записи и сразу возвращает управление."""
+        if not self.directory or not session_id:
+            return
+        with self._condition:
+            self._pending[session_id] = settings
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ui-settings-writer", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def load(self, session_id: Optional[str]) -> Optional[UiSettings]:
+        """Последние сохраненные настройки сессии или None."""
+        if not self.directory or not session_id:
+            return None
+        with self._condition:
+            if session_id in self._pending:
+                return self._pending[session_id]
+        path = self.path_for(session_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return UiSettings(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.warning(f"[AppContext][SessionSettingsStore] Failed to load {path}: {e}")
+            return None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Ждет записи всех поставленных настроек (для остановки процесса и тестов)."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def _run(self) -> None:
+        """Цикл фонового потока записи."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                session_id, settings = self._pending.popitem()
+                self._writing = True
+            try:
+                self._write(session_id, settings)
+            except OSError as e:
+                logger.warning(f"[AppContext][SessionSettingsStore] Failed to save settings of session {session_id}: {e}")
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def _write(self, session_id: str, settings: UiSettings) -> None:
+        """Атомарная запись: временный файл и замена."""
+        path = self.path_for(session_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(settings), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class AppContext:
+    """Конфигурация и общие клиенты процесса."""
+    config: AppConfig
+    llm_client: LlmClient
+    tavily_client: TavilyClientWrapper
+    settings_store: SessionSettingsStore
+    job_queue: Optional[JobQueue] = None
+    fingerprint: str = ""
+    env_file_stamp: str = ""
+
+    def clients(self) -> Tuple[LlmClient, TavilyClientWrapper]:
+        """
+        Клиенты для запуска.
+
+        # START_CONTRACT_AppContext_clients
+        # Input: None
+        # Russian Intent: Отдавать общие клиенты с пулом соединений; воспроизведение кассеты требует нового проигрывателя на каждый запуск
+        # Output: Tuple[LlmClient, TavilyClientWrapper]
+        # END_CONTRACT_AppContext_clients
+        """
+        if self.config.cassette_mode == "replay":
+            return build_clients(self.config)
+        return self.llm_client, self.tavily_client
+
+
+def build_app_context(app_config: Optional[AppConfig] = None, fingerprint: str = "") -> AppContext:
+    """
+    Собирает контекст приложения.
+
+    # START_CONTRACT_build_app_context
+    # Input: app_config (Optional[AppConfig]) - по умолчанию из ENV, fingerprint (str) - отпечаток ENV, из которого собран контекст
+    # Russian Intent: Один раз на процесс разобрать конфигурацию, создать клиенты провайдеров и открыть очередь заданий
+    # Output: AppContext
+    # END_CONTRACT_build_app_context
+    """
+    logger.debug("[AppContext][build_app_context] Belief: Сборка контекста приложения | Input: app_config | Expected: AppContext")
+
+    app_config = app_config or load_env_config()
+    llm_client, tavily_client = build_clients(app_config)
+    return AppContext(
+        config=app_config,
+        llm_client=llm_client,
+        tavily_client=tavily_client,
+        settings_store=SessionSettingsStore(app_config.ui_settings_dir),
+        job_queue=JobQueue(app_config.job_queue_path) if app_config.job_queue_path else None,
+        fingerprint=fingerprint,
+        env_file_stamp=env_file_stamp()
+    )
+
+
+def get_app_context() -> AppContext:
+    """
+    Общий для процесса контекст приложения.
+
+    # START_CONTRACT_get_app_context
+    # Input: None
+    # Russian Intent: Переиспользовать конфигурацию, клиенты и очередь заданий между запросами, пересобирая их только при изменении ENV или .env
+    # Output: AppContext
+    # END_CONTRACT_get_app_context
+    """
+    global _app_context
+    with _app_context_lock:
+        fingerprint = environment_fingerprint()
+        if _app_context is None or _app_context.fingerprint != fingerprint:
+            logger.debug(f"[AppContext][get_app_context] Belief: ENV изменился, пересборка контекста | Input: fingerprint={fingerprint[:8]} | Expected: AppContext")
+            previous = _app_context
+            # Правка .env после старта попадает в ENV только перечитыванием файла
+            if previous is not None and previous.env_file_stamp != env_file_stamp():
+                reload_env_file()
+                fingerprint = environment_fingerprint()
+            _app_context = build_app_context(fingerprint=fingerprint)
+            # Незаписанные настройки сессий не теряются при пересборке
+            if previous is not None and previous.settings_store.directory == _app_context.settings_store.directory:
+                _app_context.settings_store = previous.settings_store
+        return _app_context
+
+
+def reset_app_context() -> None:
+    """Сбрасывает контекст процесса (следующий запрос соберет его заново)."""
+    global _app_context
+    with _app_context_lock:
+        _app_context = None
@@ -0,0 +1,343 @@
+"""
+Artifact Store Module
+Хранилище итоговых документов: атомарная запись, имена с run id и дедупликация одинакового содержимого по sha256.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+OBJECTS_PREFIX = ".objects"
+
+
+def _umask_file_mode() -> int:
+    """Права нового файла, как у open(): 0666 без битов umask процесса."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# mkstemp создает файлы 0600; опубликованные документы получают права по umask (читается один раз при импорте)
+DEFAULT_FILE_MODE = _umask_file_mode()
+
+_background_writer: Optional[ThreadPoolExecutor] = None
+_background_lock = threading.Lock()
+
+
+def _writer() -> ThreadPoolExecutor:
+    """Общий фоновый писатель процесса (создается при первой фоновой записи)."""
+    global _background_writer
+    with _background_lock:
+        if _background_writer is None:
+            _background_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-writer")
+        return _background_writer
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> Path:
+    """
+    Атомарно записывает файл.
+
+    # START_CONTRACT_atomic_write_bytes
+    # Input: path (Path), data (bytes)
+    # Russian Intent: Писать во временный файл того же каталога и заменять целевой, чтобы читатели и параллельные писатели не видели частично записанный файл
+    # Output: Path
+    # END_CONTRACT_atomic_write_bytes
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_name, DEFAULT_FILE_MODE)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    return path
+
+
+def object_key(digest: str, suffix: str = "") -> str:
+    """Ключ объекта содержимого по sha256."""
+    return f"{OBJECTS_PREFIX}/{digest[:2]}/{digest}{suffix}"
+
+
+class ArtifactBackend(ABC):
+    """Хранилище байтов по ключу; реализации - локальный каталог и объектное хранилище."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Есть ли ключ."""
+
+    @abstractmethod
+    def write(self, key: str, data: bytes) -> None:
+        """Атомарная запись ключа."""
+
+    def write_if_absent(self, key: str, data: bytes) -> bool:
+        """Записывает ключ, только если его нет; True - записан этим вызовом."""
+        if self.exists(key):
+            return False
+        self.write(key, data)
+        return True
+
+    @abstractmethod
+    def alias(self, key: str, source_key: str) -> None:
+        """Делает key указателем на содержимое source_key без повторной записи данных."""
+
+    def link_if_absent(self, key: str, source_key: str) -> bool:
+        """Создает key с содержимым source_key, только если key нет; True - создан этим вызовом."""
+        return self.write_if_absent(key, self.read(source_key))
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Путь файла ключа для потоковой записи; None, если backend не файловый."""
+        return None
+
+    @abstractmethod
+    def read(self, key: str) -> bytes:
+        """Содержимое ключа."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Удаляет ключ (отсутствующий ключ - не ошибка)."""
+
+    @abstractmethod
+    def location(self, key: str) -> str:
+        """Адрес ключа для пользователя (путь файла или URI)."""
+
+
+class LocalArtifactBackend(ArtifactBackend):
+    """Каталог на диске; псевдонимы - жесткие ссылки на объект содержимого."""
+
+    def __init__(self, root: str = "outputs"):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def write(self, key: str, data: bytes) -> None:
+        atomic_write_bytes(self._path(key), data)
+
+    def write_if_absent(self, key: str, data: bytes) -> bool:
+        path = self._path(key)
+        if path.exists():
+            return False
+        # link() не заменяет существующий файл: из одновременных писателей одного содержимого побеждает один
+        tmp = atomic_write_bytes(path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.new"), data)
+        try:
+            os.link(tmp, path)
+            return True
+        except FileExistsError:
+            return False
+        except OSError:
+            os.replace(tmp, path)
+            return True
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def link_if_absent(self, key: str, source_key: str) -> bool:
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(self._path(source_key), target)
+            return True
+        except FileExistsError:
+            return False
+        except OSError:
+            return super().link_if_absent(key, source_key)
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+    def alias(self, key: str, source_key: str) -> None:
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.link")
+        try:
+            os.link(self._path(source_key), tmp)
+            os.replace(tmp, target)
+        except OSError:
+            # Файловая система без жестких ссылок: обычная атомарная копия
+            if tmp.exists():
+                tmp.unlink()
+            self.write(key, self.read(source_key))
+
+    def read(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def delete(self, key: str) -> None:
+        # Другие жесткие ссылки на то же содержимое остаются целыми
+        self._path(key).unlink(missing_ok=True)
+
+    def location(self, key: str) -> str:
+        return str(self._path(key))
+
+
+class MemoryArtifactBackend(ArtifactBackend):
+    """Хранилище в памяти процесса (заглушка объектного хранилища для тестов)."""
+
+    def __init__(self, bucket: str = "artifacts"):
+        self.bucket = bucket
+        self.objects: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            return key in self.objects
+
+    def write(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self.objects[key] = bytes(data)
+
+    def write_if_absent(self, key: str, data: bytes) -> bool:
+        with self._lock:
+            if key in self.objects:
+                return False
+            self.objects[key] = bytes(data)
+            return True
+
+    def alias(self, key: str, source_key: str) -> None:
+        with self._lock:
+            self.objects[key] = self.objects[source_key]
+
+    def link_if_absent(self, key: str, source_key: str) -> bool:
+        with self._lock:
+            if key in self.objects:
+                return False
+            self.objects[key] = self.objects[source_key]
+            return True
+
+    def read(self, key: str) -> bytes:
+        with self._lock:
+            return self.objects[key]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def location(self, key: str) -> str:
+        return f"memory://{self.bucket}/{key}"
+
+
+@dataclass
+class Artifact:
+    """Сохраненный документ."""
+    key: str
+    location: str
+    sha256: str
+    size: int
+    deduplicated: bool
+
+
+class ArtifactStore:
+    """Документы запусков поверх backend: уникальные имена, атомарная запись, дедупликация содержимого."""
+
+    def __init__(self, backend: ArtifactBackend):
+        """
+        Инициализация хранилища.
+
+        # START_CONTRACT_ArtifactStore_init
+        # Input: backend (ArtifactBackend)
+        # Russian Intent: Сохранять документы так, чтобы одновременные запуски не перезаписывали друг друга, а одинаковое содержимое хранилось один раз
+        # Output: None
+        # END_CONTRACT_ArtifactStore_init
+        """
+        self.backend = backend
+
+    def save_document(self, name: str, content: str) -> Artifact:
+        """
+        Сохраняет документ под именем запуска.
+
+        # START_CONTRACT_save_document
+        # Input: name (str) - имя запуска (с run id), content (str)
+        # Russian Intent: Записать содержимое один раз под sha256-ключом и сделать имя запуска указателем на него
+        # Output: Artifact
+        # END_CONTRACT_save_document
+        """
+        logger.debug(f"[Artifacts][save_document] Belief: Сохранение документа | Input: name={name} | Expected: Artifact")
+
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        source_key = object_key(digest, Path(name).suffix)
+        deduplicated = not self.backend.write_if_absent(source_key, data)
+        self.backend.alias(name, source_key)
+        if deduplicated:
+            logger.info(f"[Artifacts] {name} has the same content as an earlier document, stored once")
+        return Artifact(
+            key=name,
+            location=self.backend.location(name),
+            sha256=digest,
+            size=len(data),
+            deduplicated=deduplicated
+        )
+
+    def remove_document(self, name: str, sha256: str, release_blob: bool = True) -> None:
+        """Удаляет документ запуска и, если release_blob, его объект содержимого (когда на него больше никто не ссылается)."""
+        self.backend.delete(name)
+        if release_blob:
+            self.backend.delete(object_key(sha256, Path(name).suffix))
+
+    def register_document(self, name: str, sha256: str, size: int) -> Artifact:
+        """
+        Регистрирует документ, уже записанный под именем запуска (потоковая запись).
+
+        # START_CONTRACT_register_document
+        # Input: name (str), sha256 (str), size (int) - посчитаны при записи
+        # Russian Intent: Дедуплицировать готовый файл без повторной записи данных: он сам становится объектом содержимого или заменяется ссылкой на существующий
+        # Output: Artifact
+        # END_CONTRACT_register_document
+        """
+        logger.debug(f"[Artifacts][register_document] Belief: Регистрация записанного документа | Input: name={name} | Expected: Artifact")
+
+        source_key = object_key(sha256, Path(name).suffix)
+        deduplicated = not self.backend.link_if_absent(source_key, name)
+        if deduplicated:
+            self.backend.alias(name, source_key)
+            logger.info(f"[Artifacts] {name} has the same content as an earlier document, stored once")
+        return Artifact(
+            key=name,
+            location=self.backend.location(name),
+            sha256=sha256,
+            size=size,
+            deduplicated=deduplicated
+        )
+
+    def local_path(self, name: str) -> Optional[Path]:
+        """Путь для потоковой записи документа или None для нефайлового backend."""
+        return self.backend.local_path(name)
+
+    def read_document(self, name: str) -> str:
+        """Содержимое сохраненного документа."""
+        return self.backend.read(name).decode("utf-8")
+
+    def save_text(self, name: str, content: str) -> str:
+        """Атомарно сохраняет сопутствующий файл (отчет и т.п.) без дедупликации; возвращает адрес."""
+        self.backend.write(name, content.encode("utf-8"))
+        return self.backend.location(name)
+
+    def save_text_async(self, name: str, content: str) -> "Future[str]":
+        """Сохраняет сопутствующий файл в фоне, не задерживая стадию; ошибка записи логируется и не прерывает запуск."""
+        def write() -> str:
+            try:
+                return self.save_text(name, content)
+            except Exception as e:
+                logger.warning(f"[Artifacts] Background write of {name} failed: {e}")
+                raise
+        return _writer().submit(write)
@@ -0,0 +1,441 @@
+"""
+Offline Benchmark Module
+Прогон полного pipeline на имитаторах LLM и Tavily с настраиваемой латентностью, ошибками и объемом ответов.
+
+Запуск: python -m src.benchmark --chapters 3,5,10 --concurrency 1,4,8
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from types import SimpleNamespace
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from src.config import AppConfig, UiSettings
+from src.clients import LlmClient, TavilyClientWrapper
+from src.concurrency import AdaptiveConcurrencyLimiter
+from src.ratelimit import RateLimitConfig, RateLimiter
+from src.resilience import RetryPolicy
+from src.planner import StageTimingStore
+from src.tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+_WORD = "слово"
+
+
+class SimulatedProviderError(Exception):
+    """Имитация ошибки провайдера со статусом (429/5xx/408 повторяются resilience-слоем)."""
+
+    def __init__(self, status_code: int, message: str = "simulated provider error"):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+
+@dataclass
+class LatencyProfile:
+    """Распределение латентности и доля ошибок одного провайдера."""
+    median_seconds: float = 0.05
+    jitter: float = 0.3
+    error_rate: float = 0.0
+
+    # START_CONTRACT_LatencyProfile
+    # Input: median_seconds (float), jitter (float) - sigma логнормального распределения, error_rate (float) - доля ответов 503
+    # Russian Intent: Задать латентность провайдера с длинным хвостом, как у реальных API
+    # Output: LatencyProfile
+    # END_CONTRACT_LatencyProfile
+
+    def sample(self, rng: random.Random) -> float:
+        """Случайная латентность одного вызова."""
+        if self.median_seconds <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median_seconds), self.jitter) if self.jitter > 0 else self.median_seconds
+
+
+def simulated_reply(system_prompt: str, user_prompt: str, size_factor: float = 1.0) -> str:
+    """
+    Правдоподобный ответ LLM для стадии pipeline.
+
+    # START_CONTRACT_simulated_reply
+    # Input: system_prompt (str), user_prompt (str), size_factor (float) - множитель объема главы относительно лимита слов
+    # Russian Intent: По роли из системного промпта вернуть валидный JSON запросов/структуры или Markdown главы/секции/документа
+    # Output: str
+    # END_CONTRACT_simulated_reply
+    """
+    if "уточнению поисковых запросов" in system_prompt:
+        count = int(re.search(r"ровно (\d+)", system_prompt).group(1))
+        return json.dumps([f"benchmark query {i}" for i in range(1, count + 1)])
+    if "планировщик проекта" in system_prompt:
+        count = int(re.search(r"ровно из (\d+) глав", system_prompt).group(1))
+        return json.dumps({
+            "title": "Benchmark Lead Magnet",
+            "subtitle": "Offline run",
+            "introduction": " ".join([_WORD] * 100),
+            "conclusions": " ".join([_WORD] * 100),
+            "chapters": [{"title": f"Глава {i}", "prompt": f"Инструкции главы {i}"} for i in range(1, count + 1)],
+        }, ensure_ascii=False)
+    if "Редактор отдельной секции" in system_prompt:
+        return user_prompt.split("Текст секции:\n", 1)[-1].rsplit("\n\nСгенерируйте ответ сейчас.", 1)[0]
+    if "финальный редактор" in system_prompt:
+        return user_prompt.split("Содержимое черновика:\n", 1)[-1].rsplit("\n\nСгенерируйте ответ сейчас.", 1)[0]
+    match = re.search(r"Примерно (\d+) слов", system_prompt)
+    words = int(match.group(1)) if match else 100
+    return "### Раздел\n\n" + " ".join([_WORD] * max(1, int(words * size_factor)))
+
+
+def simulated_search_results(query: str, max_results: int = 5, raw_content_chars: int = 4000) -> dict:
+    """Ответ Tavily Search с max_results результатами заданного объема."""
+    return {"query": query, "results": [
+        {
+            "title": f"{query} #{i}",
+            "url": f"https://example.com/{abs(hash(query)) % 10_000}/{i}",
+            "content": f"Краткое содержание результата {i} по запросу {query}",
+            "raw_content": "x" * raw_content_chars,
+            "score": round(1.0 - i / 100, 2),
+        }
+        for i in range(1, max_results + 1)
+    ]}
+
+
+class _FakeProvider:
+    """Общая часть имитаторов: задержка, инъекция ошибок, счетчики вызовов."""
+
+    def __init__(self, profile: LatencyProfile, seed: int):
+        self.profile = profile
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(self, timeout: Optional[float]) -> None:
+        """Ждет латентность вызова и бросает ошибку с заданной вероятностью."""
+        with self._lock:
+            self.calls += 1
+            latency = self.profile.sample(self._rng)
+            failed = self._rng.random() < self.profile.error_rate
+            if failed:
+                self.errors += 1
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise SimulatedProviderError(408, "simulated timeout")
+        time.sleep(latency)
+        if failed:
+            raise SimulatedProviderError(503)
+
+
+class FakeChatCompletions(_FakeProvider):
+    """Имитатор OpenAI chat.completions: отвечает по роли из системного промпта."""
+
+    def __init__(self, profile: LatencyProfile, seed: int = 0, size_factor: float = 1.0):
+        """
+        Инициализация имитатора LLM.
+
+        # START_CONTRACT_FakeChatCompletions_init
+        # Input: profile (LatencyProfile), seed (int), size_factor (float) - множитель объема глав относительно лимита слов
+        # Russian Intent: Отвечать валидным JSON/Markdown для каждой стадии без сети
+        # Output: None
+        # END_CONTRACT_FakeChatCompletions_init
+        """
+        super().__init__(profile, seed)
+        self.size_factor = size_factor
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model: str, messages: List[dict], temperature: float = 0.7, timeout: Optional[float] = None, **kwargs):
+        """Сигнатура совместима с OpenAI().chat.completions.create."""
+        self._simulate(timeout)
+        system_prompt, user_prompt = messages[0]["content"], messages[-1]["content"]
+        content = simulated_reply(system_prompt, user_prompt, self.size_factor)
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
+
+
+class FakeTavilySearch(_FakeProvider):
+    """Имитатор TavilyClient.search."""
+
+    def __init__(self, profile: LatencyProfile, seed: int = 1, raw_content_chars: int = 4000):
+        """
+        Инициализация имитатора поиска.
+
+        # START_CONTRACT_FakeTavilySearch_init
+        # Input: profile (LatencyProfile), seed (int), raw_content_chars (int) - объем raw_content каждого результата
+        # Russian Intent: Отдавать результаты поиска заданного объема без сети
+        # Output: None
+        # END_CONTRACT_FakeTavilySearch_init
+        """
+        super().__init__(profile, seed)
+        self.raw_content_chars = raw_content_chars
+
+    def search(self, query: str, max_results: int = 5, timeout: Optional[float] = None, **kwargs) -> dict:
+        """Сигнатура совместима с TavilyClient.search."""
+        self._simulate(timeout)
+        return simulated_search_results(query, max_results, self.raw_content_chars)
+
+
+@dataclass
+class BenchmarkScenario:
+    """Один прогон: размер документа, параллелизм и профили провайдеров."""
+    chapter_count: int = 5
+    concurrency: int = 4
+    words_per_chapter: int = 300
+    section_editors: bool = True
+    llm: LatencyProfile = field(default_factory=LatencyProfile)
+    search: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_seconds=0.02))
+    size_factor: float = 1.0
+    raw_content_chars: int = 4000
+    seed: int = 0
+
+
+@dataclass
+class BenchmarkResult:
+    """Результат прогона."""
+    chapter_count: int
+    concurrency: int
+    wall_seconds: float
+    llm_calls: int
+    llm_errors: int
+    search_calls: int
+    search_errors: int
+    peak_memory_mb: float
+    succeeded: bool
+    error: Optional[str] = None
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    output_files: int = 0
+    output_kb: float = 0.0
+
+
+class _StageSpanCollector:
+    """Экспортер спанов, запоминающий длительности стадий прогона."""
+
+    def __init__(self):
+        self.stage_seconds: Dict[str, float] = {}
+
+    def export(self, spans) -> None:
+        for span in spans:
+            if span.name.startswith("stage.") and span.duration is not None:
+                name = span.name[len("stage."):]
+                self.stage_seconds[name] = round(self.stage_seconds.get(name, 0.0) + span.duration, 4)
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _output_footprint(root: Path) -> tuple:
+    """Число файлов и объем (КБ) в outputs/; жесткие ссылки на одно содержимое считаются один раз."""
+    inodes = {}
+    for path in root.rglob("*") if root.exists() else ():
+        if path.is_file():
+            stat = path.stat()
+            inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return len(inodes), round(sum(inodes.values()) / 1024, 1)
+
+
+@contextmanager
+def working_directory(path: str) -> Iterator[None]:
+    """Временно меняет рабочую директорию (outputs/ пишутся относительно нее)."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def run_scenario(scenario: BenchmarkScenario) -> BenchmarkResult:
+    """
+    Прогоняет run_pipeline на имитаторах провайдеров.
+
+    # START_CONTRACT_run_scenario
+    # Input: scenario (BenchmarkScenario)
+    # Russian Intent: Измерить время, число вызовов провайдеров и пиковую память одного запуска через настоящие клиенты, лимитеры и оркестратор
+    # Output: BenchmarkResult
+    # END_CONTRACT_run_scenario
+    """
+    from src.orchestrator import GenerationOrchestrator
+
+    logger.debug(f"[Benchmark][run_scenario] Belief: Прогон сценария | Input: chapters={scenario.chapter_count}, concurrency={scenario.concurrency} | Expected: BenchmarkResult")
+
+    app_config = AppConfig(
+        llm_api_key="offline",
+        llm_base_url="http://127.0.0.1:9/v1",
+        llm_model="benchmark-model",
+        tavily_api_key="offline",
+        llm_max_concurrency=scenario.concurrency,
+        search_max_concurrency=scenario.concurrency,
+        run_deadline_seconds=0.0
+    )
+    ui_settings = UiSettings(
+        words_per_chapter=scenario.words_per_chapter,
+        chapter_count=scenario.chapter_count,
+        enable_section_editors=scenario.section_editors,
+        preset="custom"
+    )
+    unlimited = RateLimiter({"llm": RateLimitConfig(), "tavily": RateLimitConfig()})
+    fake_llm = FakeChatCompletions(scenario.llm, seed=scenario.seed, size_factor=scenario.size_factor)
+    fake_search = FakeTavilySearch(scenario.search, seed=scenario.seed + 1, raw_content_chars=scenario.raw_content_chars)
+
+    llm_client = LlmClient(
+        app_config,
+        rate_limiter=unlimited,
+        concurrency_limiter=AdaptiveConcurrencyLimiter("llm", initial_limit=scenario.concurrency, max_limit=scenario.concurrency)
+    )
+    llm_client.client = fake_llm
+    tavily_client = TavilyClientWrapper(
+        app_config,
+        unlimited,
+        AdaptiveConcurrencyLimiter("tavily", initial_limit=scenario.concurrency, max_limit=scenario.concurrency),
+        RetryPolicy(max_attempts=app_config.search_max_attempts, attempt_timeout=app_config.search_timeout_seconds)
+    )
+    tavily_client.client = fake_search
+    orchestrator = GenerationOrchestrator(app_config, ui_settings, llm_client, tavily_client, timing_store=StageTimingStore())
+    spans = _StageSpanCollector()
+    orchestrator.tracer = Tracer([spans])
+
+    error = None
+    output_files, output_kb = 0, 0.0
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory() as workdir, working_directory(workdir):
+            for _ in orchestrator.run_pipeline("Offline benchmark topic"):
+                pass
+            output_files, output_kb = _output_footprint(Path("outputs"))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall_seconds = time.perf_counter() - started_at
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return BenchmarkResult(
+        chapter_count=scenario.chapter_count,
+        concurrency=scenario.concurrency,
+        wall_seconds=round(wall_seconds, 3),
+        llm_calls=fake_llm.calls,
+        llm_errors=fake_llm.errors,
+        search_calls=fake_search.calls,
+        search_errors=fake_search.errors,
+        peak_memory_mb=round(peak / 1024 / 1024, 2),
+        succeeded=error is None,
+        error=error,
+        stage_seconds=spans.stage_seconds,
+        output_files=output_files,
+        output_kb=output_kb
+    )
+
+
+def run_matrix(chapter_counts: Sequence[int], concurrency_levels: Sequence[int], base: BenchmarkScenario, repeat: int = 1) -> List[BenchmarkResult]:
+    """
+    Прогоняет сценарии для всех сочетаний числа глав и параллелизма.
+
+    # START_CONTRACT_run_matrix
+    # Input: chapter_counts (Sequence[int]), concurrency_levels (Sequence[int]), base (BenchmarkScenario) - профили и объемы, repeat (int)
+    # Russian Intent: Сравнить пропускную способность pipeline при разных размерах документа и параллелизме
+    # Output: List[BenchmarkResult]
+    # END_CONTRACT_run_matrix
+    """
+    results = []
+    for chapter_count in chapter_counts:
+        for concurrency in concurrency_levels:
+            for attempt in range(repeat):
+                scenario = BenchmarkScenario(**{
+                    **asdict(base),
+                    "chapter_count": chapter_count,
+                    "concurrency": concurrency,
+                    "llm": base.llm,
+                    "search": base.search,
+                    "seed": base.seed + attempt,
+                })
+                results.append(run_scenario(scenario))
+    return results
+
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    """Таблица результатов для консоли."""
+    header = (
+        f"{'chapters':>8} {'conc':>4} {'wall_s':>8} {'asm_s':>6} {'llm':>5} {'llm_err':>7} {'search':>6} {'srch_err':>8} "
+        f"{'peak_mb':>8} {'files':>5} {'out_kb':>7}  status"
+    )
+    lines = [header, "-" * len(header)]
+    for r in results:
+        status = "ok" if r.succeeded else f"FAILED ({r.error})"
+        lines.append(
+            f"{r.chapter_count:>8} {r.concurrency:>4} {r.wall_seconds:>8.2f} {r.stage_seconds.get('assembly', 0.0):>6.3f} "
+            f"{r.llm_calls:>5} {r.llm_errors:>7} {r.search_calls:>6} {r.search_errors:>8} {r.peak_memory_mb:>8.2f} "
+            f"{r.output_files:>5} {r.output_kb:>7.1f}  {status}"
+        )
+    return "\n".join(lines)
+
+
+def _int_list(value: str) -> List[int]:
+    """Разбирает список вида 3,5,10."""
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    CLI бенчмарка.
+
+    # START_CONTRACT_benchmark_main
+    # Input: argv (Optional[Sequence[str]])
+    # Russian Intent: Запустить матрицу сценариев без сети и вывести таблицу (и JSON при --json)
+    # Output: int - код выхода (1, если какой-то прогон упал)
+    # END_CONTRACT_benchmark_main
+    """
+    parser = argparse.ArgumentParser(description="Offline benchmark of the generation pipeline")
+    parser.add_argument("--chapters", type=_int_list, default=[3, 5], help="число глав, через запятую")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4], help="уровни параллелизма, через запятую")
+    parser.add_argument("--words", type=int, default=300, help="слов на главу")
+    parser.add_argument("--no-section-editors", action="store_true", help="отключить промежуточные редакторы")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="медиана латентности LLM, с")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="sigma логнормального разброса LLM")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="доля ответов LLM 503")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="медиана латентности поиска, с")
+    parser.add_argument("--search-jitter", type=float, default=0.3, help="sigma логнормального разброса поиска")
+    parser.add_argument("--search-error-rate", type=float, default=0.0, help="доля ответов поиска 503")
+    parser.add_argument("--size-factor", type=float, default=1.0, help="объем глав относительно лимита слов")
+    parser.add_argument("--raw-content-chars", type=int, default=4000, help="объем raw_content результата поиска")
+    parser.add_argument("--repeat", type=int, default=1, help="повторов каждого сценария")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", default="", help="сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    base = BenchmarkScenario(
+        words_per_chapter=args.words,
+        section_editors=not args.no_section_editors,
+        llm=LatencyProfile(args.llm_latency, args.llm_jitter, args.llm_error_rate),
+        search=LatencyProfile(args.search_latency, args.search_jitter, args.search_error_rate),
+        size_factor=args.size_factor,
+        raw_content_chars=args.raw_content_chars,
+        seed=args.seed
+    )
+    results = run_matrix(args.chapters, args.concurrency, base, args.repeat)
+    print(format_results(results))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump([asdict(result) for result in results], f, ensure_ascii=False, indent=2)
+
+    return 0 if all(result.succeeded for result in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,240 @@
+"""
+Deadline & Cancellation Module
+Токены отмены с дедлайнами запуска и стадий, распространяемые во все вызовы провайдеров.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, TypeVar
+
+from src.errors import RunCancelledError
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+_current_token: contextvars.ContextVar[Optional["CancelToken"]] = contextvars.ContextVar("cancel_token", default=None)
+_current_abort: contextvars.ContextVar[Optional["AbortScope"]] = contextvars.ContextVar("abort_scope", default=None)
+
+
+class CancelToken:
+    """Кооперативный токен отмены с опциональным дедлайном."""
+
+    def __init__(
+        self,
+        deadline_seconds: Optional[float] = None,
+        parent: Optional["CancelToken"] = None,
+        name: str = "run",
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Инициализация токена.
+
+        # START_CONTRACT_CancelToken_init
+        # Input: deadline_seconds (Optional[float]), parent (Optional[CancelToken]), name (str), clock (Callable)
+        # Russian Intent: Создать токен, отменяемый явно, по дедлайну или вместе с родителем
+        # Output: None
+        # END_CONTRACT_CancelToken_init
+        """
+        self.name = name
+        self.parent = parent
+        self._clock = clock
+        self._event = threading.Event()
+        self._reason = ""
+
+        deadline = clock() + deadline_seconds if deadline_seconds else None
+        if parent is not None and parent.deadline is not None:
+            deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+        self.deadline = deadline
+
+    def child(self, budget_seconds: Optional[float], name: str) -> "CancelToken":
+        """Создает токен стадии с бюджетом, не выходящим за дедлайн родителя."""
+        return CancelToken(budget_seconds, parent=self, name=name, clock=self._clock)
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Отменяет токен и всех его потомков."""
+        if not self._event.is_set():
+            self._reason = reason
+            self._event.set()
+            logger.info(f"[Cancellation] {self.name} cancelled: {reason}")
+
+    @property
+    def cancelled(self) -> bool:
+        """True, если токен или родитель отменен либо дедлайн истек."""
+        if self._event.is_set():
+            return True
+        if self.parent is not None and self.parent.cancelled:
+            return True
+        return self.deadline is not None and self._clock() >= self.deadline
+
+    @property
+    def reason(self) -> str:
+        """Причина отмены."""
+        if self._event.is_set():
+            return self._reason
+        if self.parent is not None and self.parent.cancelled:
+            return self.parent.reason
+        if self.deadline is not None and self._clock() >= self.deadline:
+            return f"{self.name} deadline exceeded"
+        return ""
+
+    def remaining(self) -> Optional[float]:
+        """Секунды до дедлайна или None, если дедлайна нет."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - self._clock())
+
+    def raise_if_cancelled(self) -> None:
+        """Бросает RunCancelledError, если токен отменен."""
+        if self.cancelled:
+            raise RunCancelledError(self.reason)
+
+    def bound_timeout(self, timeout: Optional[float]) -> Optional[float]:
+        """Ограничивает таймаут вызова остатком дедлайна."""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def sleep(self, seconds: float) -> None:
+        """Прерываемый sleep (например, для backoff)."""
+        end = self._clock() + seconds
+        while True:
+            self.raise_if_cancelled()
+            left = end - self._clock()
+            if left <= 0:
+                return
+            self._event.wait(min(left, 0.1))
+
+
+class AbortScope:
+    """Область одного вызова провайдера: при отмене прерывает его и освобождает удерживаемые ресурсы."""
+
+    def __init__(self, parent: Optional["AbortScope"] = None):
+        """
+        Инициализация области.
+
+        # START_CONTRACT_AbortScope_init
+        # Input: parent (Optional[AbortScope]) - прерывание родителя прерывает и эту область
+        # Russian Intent: Дать коду внутри вызова место для регистрации действий отмены (закрыть стрим, вернуть слот и токены)
+        # Output: None
+        # END_CONTRACT_AbortScope_init
+        """
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        if parent is not None:
+            parent.on_abort(self.abort)
+
+    @property
+    def aborted(self) -> bool:
+        """True, если вызов прерван."""
+        return self._event.is_set()
+
+    def on_abort(self, callback: Callable[[], None]) -> None:
+        """Регистрирует действие отмены; если область уже прервана, выполняет его сразу."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def abort(self) -> None:
+        """Прерывает вызов: выполняет зарегистрированные действия один раз."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"[Cancellation] Abort callback failed: {e}")
+
+    def raise_if_aborted(self) -> None:
+        """Бросает RunCancelledError, если вызов прерван."""
+        if self.aborted:
+            raise RunCancelledError("provider call aborted")
+
+
+def current_abort_scope() -> Optional[AbortScope]:
+    """Возвращает область прерывания текущего вызова провайдера."""
+    return _current_abort.get()
+
+
+@contextmanager
+def use_abort_scope(scope: Optional[AbortScope]) -> Iterator[Optional[AbortScope]]:
+    """Делает область прерывания текущей для вызова провайдера внутри блока."""
+    reset_token = _current_abort.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_abort.reset(reset_token)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """Возвращает токен текущего контекста выполнения."""
+    return _current_token.get()
+
+
+@contextmanager
+def use_cancel_token(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """
+    Делает токен текущим для вызовов провайдеров внутри блока.
+
+    # START_CONTRACT_use_cancel_token
+    # Input: token (Optional[CancelToken])
+    # Russian Intent: Распространить дедлайн и отмену стадии во все вложенные вызовы LLM и поиска
+    # Output: Iterator - контекстный менеджер (блок не должен содержать yield генератора)
+    # END_CONTRACT_use_cancel_token
+    """
+    reset_token = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset_token)
+
+
+def run_cancellable(fn: Callable[[], R], token: Optional[CancelToken], poll_interval: float = 0.1) -> R:
+    """
+    Выполняет блокирующий вызов, возвращая управление сразу при отмене.
+
+    # START_CONTRACT_run_cancellable
+    # Input: fn (Callable[[], R]), token (Optional[CancelToken]), poll_interval (float)
+    # Russian Intent: Освободить поток запуска сразу при отмене и прервать сам вызов через AbortScope (закрыть стрим, вернуть слот и токены)
+    # Output: R - результат вызова или RunCancelledError
+    # END_CONTRACT_run_cancellable
+    """
+    if token is None:
+        return fn()
+    token.raise_if_cancelled()
+
+    done = threading.Event()
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    scope = AbortScope(parent=_current_abort.get())
+    context = contextvars.copy_context()
+    context.run(_current_abort.set, scope)
+    threading.Thread(target=context.run, args=(target,), name=f"cancellable-{token.name}", daemon=True).start()
+
+    while not done.wait(poll_interval):
+        if token.cancelled:
+            logger.info(f"[Cancellation] Aborting in-flight call: {token.reason}")
+            scope.abort()
+            raise RunCancelledError(token.reason)
+
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
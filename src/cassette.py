@@ -0,0 +1,290 @@
+"""
+Cassette Module
+Запись трафика LLM и Tavily запуска в компактный JSONL-файл и детерминированное воспроизведение из него.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional
+
+from src.config import CASSETTE_MODES
+
+logger = logging.getLogger(__name__)
+
+LATENCY_ORIGINAL = "original"
+LATENCY_ZERO = "zero"
+
+PROVIDER_LLM = "llm"
+PROVIDER_SEARCH = "search"
+
+
+class CassetteMissError(LookupError):
+    """В кассете нет ответа для запроса."""
+
+
+class ReplayedProviderError(Exception):
+    """Ошибка провайдера, записанная в кассету (status_code сохраняет классификацию повторов)."""
+
+    def __init__(self, error_type: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+        self.status_code = status_code
+
+
+def request_key(provider: str, request: Dict[str, Any]) -> str:
+    """Ключ запроса: sha256 канонического JSON."""
+    payload = json.dumps({"provider": provider, **request}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _llm_request(model: str, messages: List[dict], temperature: float, kwargs: dict) -> Dict[str, Any]:
+    """Поля chat completion, определяющие ответ (без таймаута)."""
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "response_format": kwargs.get("response_format"),
+        "extra_body": kwargs.get("extra_body"),
+    }
+
+
+def _preview(text: str, limit: int = 200) -> str:
+    """Начало текста для чтения кассеты глазами."""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class Cassette:
+    """Файл кассеты: одна JSON-строка на вызов провайдера."""
+
+    def __init__(self, path: str):
+        """
+        Инициализация кассеты.
+
+        # START_CONTRACT_Cassette_init
+        # Input: path (str) - JSONL-файл
+        # Russian Intent: Хранить запросы (ключ и превью) и ответы провайдеров запуска в порядке завершения
+        # Output: None
+        # END_CONTRACT_Cassette_init
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Дописывает один вызов."""
+        with self._lock:
+            self._seq += 1
+            entry = {"seq": self._seq, **entry}
+            parent = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(parent, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Читает все вызовы кассеты."""
+        with open(self.path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def _error_entry(error: BaseException) -> Dict[str, Any]:
+    """Сериализация ошибки провайдера."""
+    status_code = getattr(error, "status_code", None)
+    return {
+        "type": type(error).__name__,
+        "message": str(error),
+        "status_code": status_code if isinstance(status_code, int) else None,
+    }
+
+
+class RecordingChatCompletions:
+    """Прокси OpenAI-клиента: пропускает вызовы chat.completions и записывает их в кассету."""
+
+    def __init__(self, inner: Any, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model: str, messages: List[dict], temperature: float = 0.7, timeout: Optional[float] = None, **kwargs):
+        """Сигнатура совместима с OpenAI().chat.completions.create."""
+        request = _llm_request(model, messages, temperature, kwargs)
+        entry: Dict[str, Any] = {
+            "provider": PROVIDER_LLM,
+            "key": request_key(PROVIDER_LLM, request),
+            "request": {"model": model, "json_mode": bool(kwargs.get("response_format")), "user": _preview(messages[-1]["content"])},
+        }
+        # Кассете нужен полный ответ: запись идет без SSE-стрима
+        kwargs.pop("stream", None)
+        kwargs.pop("stream_options", None)
+        started_at = time.monotonic()
+        try:
+            response = self.inner.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, timeout=timeout, **kwargs
+            )
+        except Exception as e:
+            entry.update(latency=round(time.monotonic() - started_at, 4), error=_error_entry(e))
+            self.cassette.append(entry)
+            raise
+        usage = getattr(response, "usage", None)
+        entry.update(
+            latency=round(time.monotonic() - started_at, 4),
+            response={
+                "content": response.choices[0].message.content,
+                "usage": {
+                    name: value for name in ("prompt_tokens", "completion_tokens", "total_tokens")
+                    if isinstance(value := getattr(usage, name, None), int)
+                },
+            }
+        )
+        self.cassette.append(entry)
+        return response
+
+
+class RecordingTavily:
+    """Прокси TavilyClient: пропускает поиск и записывает его в кассету."""
+
+    def __init__(self, inner: Any, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+
+    def search(self, query: str, max_results: int = 5, timeout: Optional[float] = None, **kwargs) -> dict:
+        """Сигнатура совместима с TavilyClient.search."""
+        request = {"query": query, "max_results": max_results, **kwargs}
+        entry: Dict[str, Any] = {"provider": PROVIDER_SEARCH, "key": request_key(PROVIDER_SEARCH, request), "request": request}
+        search_kwargs = {"timeout": timeout} if timeout else {}
+        started_at = time.monotonic()
+        try:
+            response = self.inner.search(query=query, max_results=max_results, **kwargs, **search_kwargs)
+        except Exception as e:
+            entry.update(latency=round(time.monotonic() - started_at, 4), error=_error_entry(e))
+            self.cassette.append(entry)
+            raise
+        entry.update(latency=round(time.monotonic() - started_at, 4), response=response)
+        self.cassette.append(entry)
+        return response
+
+
+class CassettePlayer:
+    """Отдает записанные ответы по ключу запроса."""
+
+    def __init__(self, entries: List[Dict[str, Any]], latency: str = LATENCY_ORIGINAL, strict: bool = False):
+        """
+        Инициализация проигрывателя.
+
+        # START_CONTRACT_CassettePlayer_init
+        # Input: entries (List[dict]) - вызовы кассеты, latency (str) - original | zero, strict (bool) - промах по ключу = ошибка
+        # Russian Intent: Воспроизводить ответы детерминированно: по ключу в порядке записи, повтор последнего ответа для hedged/лишних вызовов, при измененном промпте - следующий неиспользованный ответ провайдера
+        # Output: None
+        # END_CONTRACT_CassettePlayer_init
+        """
+        if latency not in (LATENCY_ORIGINAL, LATENCY_ZERO):
+            raise ValueError(f"latency must be {LATENCY_ORIGINAL!r} or {LATENCY_ZERO!r}")
+        self.latency = latency
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._unused: Dict[str, List[Dict[str, Any]]] = {PROVIDER_LLM: [], PROVIDER_SEARCH: []}
+        # Порядок файла - порядок завершения вызовов при записи
+        for entry in entries:
+            self._by_key.setdefault(entry["key"], deque()).append(entry)
+            self._unused.setdefault(entry["provider"], []).append(entry)
+
+    def _take(self, provider: str, key: str) -> Dict[str, Any]:
+        """Следующий ответ для ключа."""
+        with self._lock:
+            queue = self._by_key.get(key)
+            if queue:
+                entry = queue.popleft()
+            elif key in self._last:
+                entry = self._last[key]
+            elif not self.strict and self._unused[provider]:
+                entry = self._unused[provider][0]
+                self._by_key[entry["key"]].remove(entry)
+                logger.warning(f"[Cassette] No recorded {provider} call for key {key[:8]}, replaying next unused one (seq {entry.get('seq')})")
+            else:
+                raise CassetteMissError(f"No recorded {provider} call for key {key[:8]}")
+            if entry in self._unused[provider]:
+                self._unused[provider].remove(entry)
+            self._last[key] = entry
+            return entry
+
+    def play(self, provider: str, key: str, timeout: Optional[float]) -> Any:
+        """Ждет исходную латентность (в пределах таймаута) и возвращает ответ или бросает записанную ошибку."""
+        entry = self._take(provider, key)
+        delay = entry.get("latency", 0.0) if self.latency == LATENCY_ORIGINAL else 0.0
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise ReplayedProviderError("Timeout", f"replayed latency {delay:.2f}s exceeds timeout", 408)
+        if delay:
+            time.sleep(delay)
+        error = entry.get("error")
+        if error is not None:
+            raise ReplayedProviderError(error["type"], error["message"], error.get("status_code"))
+        return entry["response"]
+
+
+class ReplayChatCompletions:
+    """Замена OpenAI-клиента, отвечающая из кассеты."""
+
+    def __init__(self, player: CassettePlayer):
+        self.player = player
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model: str, messages: List[dict], temperature: float = 0.7, timeout: Optional[float] = None, **kwargs):
+        """Сигнатура совместима с OpenAI().chat.completions.create."""
+        key = request_key(PROVIDER_LLM, _llm_request(model, messages, temperature, kwargs))
+        response = self.player.play(PROVIDER_LLM, key, timeout)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=response["content"]))],
+            usage=SimpleNamespace(**response.get("usage", {}))
+        )
+
+
+class ReplayTavily:
+    """Замена TavilyClient, отвечающая из кассеты."""
+
+    def __init__(self, player: CassettePlayer):
+        self.player = player
+
+    def search(self, query: str, max_results: int = 5, timeout: Optional[float] = None, **kwargs) -> dict:
+        """Сигнатура совместима с TavilyClient.search."""
+        key = request_key(PROVIDER_SEARCH, {"query": query, "max_results": max_results, **kwargs})
+        return self.player.play(PROVIDER_SEARCH, key, timeout)
+
+
+def attach_cassette(llm_client: Any, tavily_client: Any, mode: str, path: str, latency: str = LATENCY_ORIGINAL) -> None:
+    """
+    Подключает запись или воспроизведение к клиентам провайдеров.
+
+    # START_CONTRACT_attach_cassette
+    # Input: llm_client (LlmClient), tavily_client (TavilyClientWrapper), mode (str) - off | record | replay, path (str), latency (str) - original | zero
+    # Russian Intent: Подменить SDK-объекты клиентов, сохранив повторы, лимитеры, трассировку и учет usage выше них
+    # Output: None
+    # END_CONTRACT_attach_cassette
+    """
+    logger.debug(f"[Cassette][attach_cassette] Belief: Подключение кассеты | Input: mode={mode}, path={path} | Expected: None")
+
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"Cassette mode must be one of {CASSETTE_MODES}")
+    if mode == "off":
+        return
+    if not path:
+        raise ValueError("Cassette path is required for record/replay")
+
+    cassette = Cassette(path)
+    if mode == "record":
+        llm_client.client = RecordingChatCompletions(llm_client.client, cassette)
+        tavily_client.client = RecordingTavily(tavily_client.client, cassette)
+        logger.info(f"[Cassette] Recording provider traffic to {path}")
+        return
+
+    player = CassettePlayer(cassette.load(), latency=latency)
+    llm_client.client = ReplayChatCompletions(player)
+    tavily_client.client = ReplayTavily(player)
+    logger.info(f"[Cassette] Replaying provider traffic from {path} ({latency} latency)")
@@ -0,0 +1,438 @@
+"""
+Output Catalog Module
+Индекс сгенерированных документов в SQLite: метаданные запусков, полнотекстовый поиск по заголовку и теме и вытеснение старых документов по политике хранения.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from src.artifacts import ArtifactStore
+from src.config import AppConfig, UiSettings
+from src.usage import usage_path_for
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    run_id TEXT,
+    key TEXT NOT NULL,
+    location TEXT NOT NULL,
+    title TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    settings_json TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL,
+    duration_seconds REAL,
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'document'
+);
+CREATE INDEX IF NOT EXISTS idx_documents_created ON documents (created_at);
+CREATE INDEX IF NOT EXISTS idx_documents_sha256 ON documents (sha256);
+"""
+
+_FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(doc_id UNINDEXED, title, topic, tokenize='unicode61')"
+
+KIND_DOCUMENT = "document"
+KIND_DRAFT = "draft"
+
+
+@dataclass
+class CatalogEntry:
+    """Запись каталога о сгенерированном документе."""
+    doc_id: str
+    key: str
+    location: str
+    title: str
+    topic: str
+    sha256: str
+    size_bytes: int
+    settings: Dict[str, object] = field(default_factory=dict)
+    run_id: Optional[str] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: Optional[float] = None
+    duration_seconds: Optional[float] = None
+    created_at: float = 0.0
+    kind: str = KIND_DOCUMENT
+
+    def label(self) -> str:
+        """Строка списка документов в UI."""
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created_at))
+        return f"{self.title} · {self.topic} · {created}"
+
+
+@dataclass
+class RetentionPolicy:
+    """Политика хранения документов; 0 - без ограничения."""
+    max_age_days: float = 0.0
+    max_count: int = 0
+    max_total_bytes: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_age_days or self.max_count or self.max_total_bytes)
+
+
+def retention_policy_from(config: AppConfig) -> RetentionPolicy:
+    """Политика хранения из конфигурации."""
+    return RetentionPolicy(
+        max_age_days=config.output_retention_days,
+        max_count=config.output_retention_max_count,
+        max_total_bytes=int(config.output_retention_max_mb * 1024 * 1024)
+    )
+
+
+def _fts_query(text: str) -> str:
+    """Запрос FTS5 из пользовательского текста: каждое слово - префикс, спецсимволы экранируются кавычками."""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _like_pattern(text: str) -> str:
+    """Шаблон LIKE из пользовательского текста: %, _ и \\ экранируются (ESCAPE '\\')."""
+    escaped = text.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _markdown_title(data: bytes, default: str) -> str:
+    """Заголовок документа - первая строка '# ...'."""
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        if line.startswith("# "):
+            return line[2:].strip() or default
+    return default
+
+
+class OutputCatalog:
+    """Каталог документов outputs/ на SQLite с FTS5."""
+
+    def __init__(self, db_path: str):
+        """
+        Инициализация каталога.
+
+        # START_CONTRACT_OutputCatalog_init
+        # Input: db_path (str)
+        # Russian Intent: Открыть общий для процессов файл каталога и создать схему; без FTS5 в сборке SQLite поиск идет через LIKE
+        # Output: None
+        # END_CONTRACT_OutputCatalog_init
+        """
+        logger.debug("[Catalog][OutputCatalog_init] Belief: Инициализация каталога документов | Input: db_path | Expected: Каталог готов")
+
+        self.db_path = db_path
+        self._backfilled: set = set()
+        self._backfill_lock = threading.Lock()
+        parent = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+            try:
+                conn.execute(_FTS_SCHEMA)
+                self.full_text = True
+            except sqlite3.OperationalError as e:
+                logger.warning(f"[Catalog] FTS5 is not available ({e}), search falls back to LIKE")
+                self.full_text = False
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """Добавляет колонки, появившиеся после создания файла каталога."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+        if "kind" not in columns:
+            conn.execute(f"ALTER TABLE documents ADD COLUMN kind TEXT NOT NULL DEFAULT '{KIND_DOCUMENT}'")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Открывает соединение в autocommit-режиме (транзакции управляются явно)."""
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=30000")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> CatalogEntry:
+        return CatalogEntry(
+            doc_id=row["doc_id"],
+            key=row["key"],
+            location=row["location"],
+            title=row["title"],
+            topic=row["topic"],
+            sha256=row["sha256"],
+            size_bytes=row["size_bytes"],
+            settings=json.loads(row["settings_json"]),
+            run_id=row["run_id"],
+            input_tokens=row["input_tokens"],
+            output_tokens=row["output_tokens"],
+            cost_usd=row["cost_usd"],
+            duration_seconds=row["duration_seconds"],
+            created_at=row["created_at"],
+            kind=row["kind"]
+        )
+
+    def add(
+        self,
+        key: str,
+        location: str,
+        title: str,
+        topic: str,
+        sha256: str,
+        size_bytes: int,
+        settings: Optional[UiSettings] = None,
+        run_id: Optional[str] = None,
+        usage_totals: Optional[dict] = None,
+        duration_seconds: Optional[float] = None,
+        kind: str = KIND_DOCUMENT
+    ) -> CatalogEntry:
+        """
+        Добавляет документ в каталог.
+
+        # START_CONTRACT_OutputCatalog_add
+        # Input: key (str) - ключ в хранилище, location (str), title, topic, sha256, size_bytes, settings (Optional[UiSettings]), run_id, usage_totals (Optional[dict]) - UsageLedger.totals(), duration_seconds, kind (str) - KIND_DOCUMENT или KIND_DRAFT
+        # Russian Intent: Записать метаданные документа и проиндексировать заголовок и тему одной транзакцией, заменив прежнюю запись того же ключа; черновики не индексируются для поиска, но подчиняются политике хранения
+        # Output: CatalogEntry
+        # END_CONTRACT_OutputCatalog_add
+        """
+        logger.debug(f"[Catalog][add] Belief: Добавление документа в каталог | Input: key={key} | Expected: CatalogEntry")
+
+        usage_totals = usage_totals or {}
+        entry = CatalogEntry(
+            doc_id=uuid.uuid4().hex,
+            key=key,
+            location=location,
+            title=title,
+            topic=topic,
+            sha256=sha256,
+            size_bytes=size_bytes,
+            settings=asdict(settings) if settings is not None else {},
+            run_id=run_id,
+            input_tokens=usage_totals.get("input_tokens", 0),
+            output_tokens=usage_totals.get("output_tokens", 0),
+            cost_usd=usage_totals.get("cost_usd"),
+            duration_seconds=None if duration_seconds is None else round(duration_seconds, 3),
+            created_at=time.time(),
+            kind=kind
+        )
+        self._insert(entry)
+        return entry
+
+    def _insert(self, entry: CatalogEntry, if_absent: bool = False) -> bool:
+        """Записывает entry вместо записей того же ключа; при if_absent существующий ключ не трогается."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = [row["doc_id"] for row in conn.execute("SELECT doc_id FROM documents WHERE key = ?", (entry.key,))]
+                if existing and if_absent:
+                    conn.execute("COMMIT")
+                    return False
+                for doc_id in existing:
+                    self._remove(conn, doc_id)
+                conn.execute(
+                    "INSERT INTO documents (doc_id, run_id, key, location, title, topic, settings_json, sha256, size_bytes, "
+                    "input_tokens, output_tokens, cost_usd, duration_seconds, created_at, kind) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        entry.doc_id, entry.run_id, entry.key, entry.location, entry.title, entry.topic,
+                        json.dumps(entry.settings, ensure_ascii=False), entry.sha256, entry.size_bytes,
+                        entry.input_tokens, entry.output_tokens, entry.cost_usd, entry.duration_seconds, entry.created_at, entry.kind
+                    )
+                )
+                if self.full_text and entry.kind == KIND_DOCUMENT:
+                    conn.execute(
+                        "INSERT INTO documents_fts (doc_id, title, topic) VALUES (?, ?, ?)", (entry.doc_id, entry.title, entry.topic)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def get(self, doc_id: str) -> Optional[CatalogEntry]:
+        """Запись по id."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def recent(self, limit: int = 50) -> List[CatalogEntry]:
+        """Последние документы (без черновиков), новые первыми."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM documents WHERE kind = ? ORDER BY created_at DESC LIMIT ?", (KIND_DOCUMENT, limit)
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def search(self, text: str, limit: int = 50) -> List[CatalogEntry]:
+        """
+        Ищет документы по заголовку и теме.
+
+        # START_CONTRACT_OutputCatalog_search
+        # Input: text (str) - слова запроса (префиксы), limit (int)
+        # Russian Intent: Найти прошлые документы по словам заголовка или темы без перебора файлов; пустой запрос - последние документы
+        # Output: List[CatalogEntry] - по релевантности (FTS5) или новые первыми (LIKE)
+        # END_CONTRACT_OutputCatalog_search
+        """
+        if not text or not text.strip():
+            return self.recent(limit)
+        with self._connect() as conn:
+            if self.full_text:
+                rows = conn.execute(
+                    "SELECT d.* FROM documents_fts f JOIN documents d ON d.doc_id = f.doc_id "
+                    "WHERE documents_fts MATCH ? ORDER BY bm25(documents_fts), d.created_at DESC LIMIT ?",
+                    (_fts_query(text), limit)
+                ).fetchall()
+            else:
+                pattern = _like_pattern(text)
+                rows = conn.execute(
+                    "SELECT * FROM documents WHERE kind = ? AND (title LIKE ? ESCAPE '\\' OR topic LIKE ? ESCAPE '\\') "
+                    "ORDER BY created_at DESC LIMIT ?",
+                    (KIND_DOCUMENT, pattern, pattern, limit)
+                ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def backfill(self, store: ArtifactStore) -> List[CatalogEntry]:
+        """
+        Вносит в каталог документы, сохраненные до его появления.
+
+        # START_CONTRACT_backfill
+        # Input: store (ArtifactStore) - хранилище документов
+        # Russian Intent: Один раз на процесс просканировать каталог файлового хранилища и записать неизвестные .md-файлы (документы и черновики draft_*), чтобы их находил поиск и вытесняла политика хранения
+        # Output: List[CatalogEntry] - добавленные записи
+        # END_CONTRACT_backfill
+        """
+        root = store.local_path("")
+        if root is None:
+            return []
+        with self._backfill_lock:
+            if str(root) in self._backfilled:
+                return []
+            self._backfilled.add(str(root))
+        if not root.is_dir():
+            return []
+        logger.debug(f"[Catalog][backfill] Belief: Сканирование сохраненных документов | Input: root={root} | Expected: List[CatalogEntry]")
+
+        with self._connect() as conn:
+            known = {row["key"] for row in conn.execute("SELECT key FROM documents")}
+        added: List[CatalogEntry] = []
+        for path in sorted(root.glob("*.md")):
+            if path.name in known or path.name.startswith("."):
+                continue
+            try:
+                data = path.read_bytes()
+                created_at = path.stat().st_mtime
+            except OSError as e:
+                logger.warning(f"[Catalog] Failed to backfill {path.name}: {e}")
+                continue
+            entry = CatalogEntry(
+                doc_id=uuid.uuid4().hex,
+                key=path.name,
+                location=store.backend.location(path.name),
+                title=_markdown_title(data, path.stem),
+                topic="",
+                sha256=hashlib.sha256(data).hexdigest(),
+                size_bytes=len(data),
+                created_at=created_at,
+                kind=KIND_DRAFT if path.name.startswith("draft_") else KIND_DOCUMENT
+            )
+            # Запуск, завершившийся во время сканирования, уже записал свои метаданные: они не перетираются
+            if self._insert(entry, if_absent=True):
+                added.append(entry)
+        if added:
+            logger.info(f"[Catalog] Backfilled {len(added)} documents from {root}")
+        return added
+
+    def _remove(self, conn: sqlite3.Connection, doc_id: str) -> None:
+        conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        if self.full_text:
+            conn.execute("DELETE FROM documents_fts WHERE doc_id = ?", (doc_id,))
+
+    def enforce_retention(self, policy: RetentionPolicy, store: ArtifactStore, now: Optional[float] = None) -> List[CatalogEntry]:
+        """
+        Вытесняет старые документы по политике хранения.
+
+        # START_CONTRACT_enforce_retention
+        # Input: policy (RetentionPolicy), store (ArtifactStore) - хранилище документов, now (Optional[float])
+        # Russian Intent: Удалить старейшие документы и черновики старше max_age_days и сверх max_count / max_total_bytes вместе с отчетами usage; объект содержимого удаляется, когда на него не ссылается ни один документ
+        # Output: List[CatalogEntry] - вытесненные записи
+        # END_CONTRACT_enforce_retention
+        """
+        if not policy.enabled:
+            return []
+        logger.debug(f"[Catalog][enforce_retention] Belief: Применение политики хранения | Input: policy={policy} | Expected: List[CatalogEntry]")
+
+        now = time.time() if now is None else now
+        evicted: List[CatalogEntry] = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute("SELECT * FROM documents ORDER BY created_at DESC").fetchall()
+                kept = 0
+                kept_bytes = 0
+                for row in rows:
+                    too_old = policy.max_age_days and now - row["created_at"] > policy.max_age_days * 86400
+                    too_many = policy.max_count and kept >= policy.max_count
+                    too_big = policy.max_total_bytes and kept_bytes + row["size_bytes"] > policy.max_total_bytes
+                    if too_old or too_many or too_big:
+                        evicted.append(self._entry(row))
+                        self._remove(conn, row["doc_id"])
+                    else:
+                        kept += 1
+                        kept_bytes += row["size_bytes"]
+                shared = {
+                    row["sha256"] for row in conn.execute(
+                        f"SELECT DISTINCT sha256 FROM documents WHERE kind = ? AND sha256 IN ({', '.join('?' for _ in evicted)})",
+                        [KIND_DOCUMENT] + [entry.sha256 for entry in evicted]
+                    )
+                } if evicted else set()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        # Файлы удаляются после фиксации: запись каталога никогда не указывает на удаленный файл.
+        # Черновик - обычный файл без объекта содержимого
+        for entry in evicted:
+            try:
+                release_blob = entry.kind == KIND_DOCUMENT and entry.sha256 not in shared
+                store.remove_document(entry.key, entry.sha256, release_blob=release_blob)
+                store.backend.delete(str(usage_path_for(Path(entry.key))))
+            except OSError as e:
+                logger.warning(f"[Catalog] Failed to remove {entry.key}: {e}")
+        if evicted:
+            logger.info(f"[Catalog] Evicted {len(evicted)} documents by retention policy")
+        return evicted
+
+
+_catalogs: Dict[str, OutputCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_output_catalog(config: AppConfig) -> Optional[OutputCatalog]:
+    """
+    Каталог документов, общий для процесса.
+
+    # START_CONTRACT_get_output_catalog
+    # Input: config (AppConfig)
+    # Russian Intent: Открыть каталог один раз на процесс; пустой OUTPUT_CATALOG_PATH выключает каталог
+    # Output: Optional[OutputCatalog]
+    # END_CONTRACT_get_output_catalog
+    """
+    if not config.output_catalog_path:
+        return None
+    with _catalogs_lock:
+        if config.output_catalog_path not in _catalogs:
+            _catalogs[config.output_catalog_path] = OutputCatalog(config.output_catalog_path)
+        return _catalogs[config.output_catalog_path]
@@ -0,0 +1,253 @@
+"""
+Command Line Module
+Точка входа с быстрым стартом: тяжелые зависимости (Gradio, SDK провайдеров) загружаются только выбранной командой.
+
+    python -m src.cli ui                         # Gradio UI (по умолчанию)
+    python -m src.cli generate "Тема" --preset speed
+    python -m src.cli batch "Тема 1" "Тема 2" --file topics.txt
+    python -m src.cli worker --db jobs.sqlite3 --workers 2
+    python -m src.cli benchmark --chapters 3,5
+    python -m src.cli startup                    # бюджет времени импорта
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Модули, которые не должны загружаться на путях без UI
+HEAVY_MODULES = ("gradio", "fastapi", "openai", "tavily")
+
+# Бюджет холодного импорта (секунды) и модули, запрещенные на этом пути
+IMPORT_BUDGETS: Dict[str, float] = {
+    "src.cli": 0.1,
+    "src.jobs": 0.25,
+    "src.orchestrator": 0.6,
+}
+FORBIDDEN_IMPORTS: Dict[str, Sequence[str]] = {
+    "src.cli": HEAVY_MODULES,
+    "src.jobs": HEAVY_MODULES,
+    "src.orchestrator": HEAVY_MODULES,
+}
+
+_PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "seconds = time.perf_counter() - started\n"
+    "print(json.dumps({{'seconds': seconds, 'modules': sorted(name for name in {heavy!r} if name in sys.modules)}}))\n"
+)
+
+
+@dataclass
+class ImportTiming:
+    """Замер холодного импорта модуля."""
+    module: str
+    median_seconds: float
+    max_seconds: float
+    loaded_heavy: List[str] = field(default_factory=list)
+    budget_seconds: Optional[float] = None
+    forbidden: List[str] = field(default_factory=list)
+
+    @property
+    def within_budget(self) -> bool:
+        """Импорт уложился в бюджет и не загрузил запрещенные модули."""
+        fits = self.budget_seconds is None or self.median_seconds <= self.budget_seconds
+        return fits and not set(self.loaded_heavy) & set(self.forbidden)
+
+
+def measure_import(module: str, repeat: int = 3) -> ImportTiming:
+    """
+    Измеряет холодный импорт модуля в отдельных процессах.
+
+    # START_CONTRACT_measure_import
+    # Input: module (str), repeat (int) - число процессов
+    # Russian Intent: Оценить стоимость старта процесса (autoscaled worker, CLI) и проверить, какие тяжелые зависимости он тянет
+    # Output: ImportTiming
+    # END_CONTRACT_measure_import
+    """
+    logger.debug(f"[CLI][measure_import] Belief: Замер импорта | Input: module={module}, repeat={repeat} | Expected: ImportTiming")
+
+    samples = []
+    loaded: List[str] = []
+    for _ in range(max(1, repeat)):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        samples.append(probe["seconds"])
+        loaded = probe["modules"]
+    return ImportTiming(
+        module=module,
+        median_seconds=round(statistics.median(samples), 4),
+        max_seconds=round(max(samples), 4),
+        loaded_heavy=loaded,
+        budget_seconds=IMPORT_BUDGETS.get(module),
+        forbidden=list(FORBIDDEN_IMPORTS.get(module, ()))
+    )
+
+
+def _run_startup(args: argparse.Namespace) -> int:
+    """Команда startup: таблица времени импорта и проверка бюджета."""
+    modules = args.modules or list(IMPORT_BUDGETS) + ["src.ui"]
+    timings = [measure_import(module, args.repeat) for module in modules]
+    print(f"{'module':<18} {'median s':>9} {'max s':>7} {'budget s':>9}  heavy deps")
+    for t in timings:
+        budget = "-" if t.budget_seconds is None else f"{t.budget_seconds:.2f}"
+        mark = "" if t.within_budget else "  OVER BUDGET"
+        print(f"{t.module:<18} {t.median_seconds:>9.3f} {t.max_seconds:>7.3f} {budget:>9}  {','.join(t.loaded_heavy) or '-'}{mark}")
+    return 0 if all(t.within_budget for t in timings) else 1
+
+
+def _build_orchestrator(args: argparse.Namespace):
+    """Оркестратор с настройками генерации из аргументов команды."""
+    from src.config import UiSettings, load_env_config
+    from src.clients import build_clients
+    from src.orchestrator import GenerationOrchestrator
+    from src.tracing import configure_tracing
+
+    app_config = load_env_config()
+    configure_tracing(app_config)
+    ui_settings = UiSettings(
+        words_per_chapter=args.words,
+        chapter_count=args.chapters,
+        temperature=args.temperature,
+        preset=args.preset
+    )
+    llm_client, tavily_client = build_clients(app_config)
+    return GenerationOrchestrator(app_config, ui_settings, llm_client, tavily_client)
+
+
+def _run_generate(args: argparse.Namespace) -> int:
+    """Команда generate: один запуск pipeline без Gradio, путь к документу - в stdout."""
+    orchestrator = _build_orchestrator(args)
+
+    filepath = None
+    for logs, _, path in orchestrator.run_pipeline(args.topic):
+        if logs:
+            print(logs, file=sys.stderr, flush=True)
+        filepath = path or filepath
+    if filepath:
+        print(filepath)
+    return 0 if filepath else 1
+
+
+def read_batch_topics(topics: Sequence[str], topics_file: Optional[str] = None) -> List[str]:
+    """Темы пакета из аргументов и файла (по одной на строку, # - комментарий) без пустых и повторов."""
+    lines = list(topics)
+    if topics_file:
+        with open(topics_file, encoding="utf-8") as f:
+            lines += [line for line in f.read().splitlines() if not line.lstrip().startswith("#")]
+    return list(dict.fromkeys(line.strip() for line in lines if line.strip()))
+
+
+def _run_batch(args: argparse.Namespace) -> int:
+    """Команда batch: пакет тем с общим поиском, пути документов - в stdout, сбои тем - в stderr."""
+    topics = read_batch_topics(args.topics, args.file)
+    if not topics:
+        print("batch: нет тем (аргументы или --file)", file=sys.stderr)
+        return 2
+    orchestrator = _build_orchestrator(args)
+
+    for logs, _, path in orchestrator.run_batch_pipeline(topics):
+        if logs:
+            print(logs, file=sys.stderr, flush=True)
+        if path:
+            print(path, flush=True)
+    failed = [topic for topic, filepath in orchestrator.batch_results.items() if filepath is None]
+    for topic in failed:
+        print(f"batch: тема не сгенерирована: {topic}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _run_ui(args: argparse.Namespace) -> int:
+    """Команда ui: Gradio-приложение."""
+    from src.ui import main as ui_main
+
+    ui_main()
+    return 0
+
+
+def _run_worker(args: argparse.Namespace) -> int:
+    """Команда worker: пул worker-процессов очереди заданий."""
+    from src.jobs import start_worker_pool
+
+    metrics_port = args.metrics_port if args.metrics_port is not None else int(os.getenv("METRICS_PORT") or 0)
+    for process in start_worker_pool(args.db, args.workers, metrics_port):
+        process.join()
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    CLI приложения.
+
+    # START_CONTRACT_cli_main
+    # Input: argv (Optional[Sequence[str]])
+    # Russian Intent: Выбрать команду до импорта тяжелых зависимостей, чтобы worker, CLI и бенчмарки стартовали без Gradio
+    # Output: int - код выхода
+    # END_CONTRACT_cli_main
+    """
+    parser = argparse.ArgumentParser(description="AI Lead Magnet Generator")
+    commands = parser.add_subparsers(dest="command")
+
+    commands.add_parser("ui", help="Gradio UI (по умолчанию)")
+
+    generate = commands.add_parser("generate", help="сгенерировать документ без UI")
+    generate.add_argument("topic")
+
+    batch = commands.add_parser("batch", help="сгенерировать документы по пакету тем с общим поиском")
+    batch.add_argument("topics", nargs="*")
+    batch.add_argument("--file", help="файл тем, по одной на строку")
+
+    for command in (generate, batch):
+        command.add_argument("--preset", default="balanced", help="speed | balanced | thorough | custom")
+        command.add_argument("--chapters", type=int, default=5)
+        command.add_argument("--words", type=int, default=300)
+        command.add_argument("--temperature", type=float, default=0.7)
+
+    worker = commands.add_parser("worker", help="worker-процессы очереди заданий")
+    worker.add_argument("--db", default=os.getenv("JOB_QUEUE_PATH") or "jobs.sqlite3")
+    worker.add_argument("--workers", type=int, default=1)
+    worker.add_argument("--metrics-port", type=int, default=None, help="worker i отдает /metrics на порту + 1 + i (по умолчанию METRICS_PORT)")
+
+    commands.add_parser("benchmark", help="офлайн-бенчмарк pipeline (аргументы src.benchmark)", add_help=False)
+
+    startup = commands.add_parser("startup", help="время холодного импорта и бюджет")
+    startup.add_argument("modules", nargs="*", help="модули (по умолчанию бюджетные и src.ui)")
+    startup.add_argument("--repeat", type=int, default=3)
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv[:1] == ["benchmark"]:
+        from src.benchmark import main as benchmark_main
+        return benchmark_main(argv[1:])
+
+    args = parser.parse_args(argv)
+    if args.command == "startup":
+        return _run_startup(args)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    # generate и batch печатают логи стадий сами; INFO-логгеры дублировали бы их
+    logging.basicConfig(
+        level=logging.WARNING if args.command in ("generate", "batch") else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+    handlers = {"generate": _run_generate, "batch": _run_batch, "worker": _run_worker}
+    return handlers.get(args.command, _run_ui)(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,37 +3,122 @@ Provider Clients Module
 Единый интерфейс к OpenAI-compatible LLM и Tavily Search.
 """
 
+import importlib
 import logging
-from typing import Optional
-from openai import OpenAI
-from tavily import TavilyClient
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional, Tuple
 
 from src.config import AppConfig
+from src.errors import RunCancelledError
+from src.cancellation import AbortScope, current_abort_scope, current_cancel_token, run_cancellable
+from src.ratelimit import RateLimiter, estimate_tokens, get_rate_limiter
+from src.concurrency import AdaptiveConcurrencyLimiter, get_concurrency_limiter
+from src.resilience import LatencyTracker, RetryPolicy, call_with_retry, hedged_call
+from src.tracing import get_tracer
+from src.metrics import LLM_TOKENS_TOTAL, record_provider_call
+from src.usage import current_usage
+from src.cassette import attach_cassette
 
 logger = logging.getLogger(__name__)
 
 
+# SDK провайдеров загружаются при первом создании клиента: импорт модуля не тянет openai/tavily (холодный старт)
+_LAZY_SDK = {
+    "OpenAI": ("openai", "OpenAI"),
+    "TavilyClient": ("tavily", "TavilyClient"),
+    "UsageLimitExceededError": ("tavily.errors", "UsageLimitExceededError"),
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Ленивый импорт классов SDK как атрибутов модуля."""
+    if name not in _LAZY_SDK:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_SDK[name]
+    value = getattr(importlib.import_module(module_name), attribute)
+    globals()[name] = value
+    return value
+
+
+def _sdk(name: str) -> Any:
+    """Класс SDK (подмененный в тестах или загруженный при первом обращении)."""
+    return globals().get(name) or __getattr__(name)
+
+
+def _collect_stream(stream: Any, abort_scope: Optional[AbortScope]) -> Any:
+    """
+    Собирает SSE-стрим chat.completion.chunk в объект с формой обычного ответа.
+
+    # START_CONTRACT__collect_stream
+    # Input: stream (openai.Stream), abort_scope (Optional[AbortScope])
+    # Russian Intent: Проверять отмену между чанками и закрывать соединение, чтобы провайдер прекратил генерацию
+    # Output: Any - объект с choices[0].message.content и usage (у прерванного стрима - накопленная часть и usage=None)
+    # END_CONTRACT__collect_stream
+    """
+    parts: List[str] = []
+    usage = None
+    try:
+        for chunk in stream:
+            if abort_scope is not None and abort_scope.aborted:
+                break
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            for choice in getattr(chunk, "choices", None) or []:
+                content = getattr(choice.delta, "content", None)
+                if content:
+                    parts.append(content)
+    finally:
+        stream.close()
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(parts)))], usage=usage)
+
+
+def _rejects_stream_options(error: Exception) -> bool:
+    """Провайдер (или старый SDK) не принимает stream_options: нужен обычный запрос без стрима."""
+    if "stream_options" not in str(error):
+        return False
+    return isinstance(error, TypeError) or getattr(error, "status_code", None) in (400, 422)
+
+
 class LlmClient:
     """Клиент для OpenAI-compatible LLM."""
 
-    def __init__(self, config: AppConfig):
+    def __init__(
+        self,
+        config: AppConfig,
+        rate_limiter: Optional[RateLimiter] = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None
+    ):
         """
         Инициализация LLM клиента.
 
         # START_CONTRACT_LlmClient_init
-        # Input: config (AppConfig)
+        # Input: config (AppConfig), rate_limiter (Optional[RateLimiter]), concurrency_limiter (Optional[AdaptiveConcurrencyLimiter]) - по умолчанию общие для процесса
         # Russian Intent: Инициализировать клиент LLM с настройками из конфигурации
         # Output: None
         # END_CONTRACT_LlmClient_init
         """
         logger.debug("[Clients][LlmClient_init] Belief: Инициализация LLM клиента | Input: config | Expected: Клиент готов")
 
-        self.client = OpenAI(
+        # Повторы выполняет собственный resilience-слой, встроенные повторы SDK отключены
+        self.client = _sdk("OpenAI")(
             api_key=config.llm_api_key,
-            base_url=config.llm_base_url
+            base_url=config.llm_base_url,
+            max_retries=0
         )
         self.model = config.llm_model
         self.reasoning_budget = config.llm_reasoning_budget
+        self.rate_limiter = rate_limiter or get_rate_limiter(config)
+        self.concurrency_limiter = concurrency_limiter or get_concurrency_limiter("llm", config.llm_max_concurrency)
+        self.retry_policy = RetryPolicy(
+            max_attempts=config.llm_max_attempts,
+            attempt_timeout=config.llm_timeout_seconds,
+            deadline_seconds=config.llm_call_deadline_seconds
+        )
+        self.hedge_requests = config.llm_hedge_requests
+        # Markdown-ответы стримятся (отмена закрывает соединение), пока провайдер принимает stream_options
+        self.stream_markdown = True
+        self.latency_trackers = {"json": LatencyTracker(), "markdown": LatencyTracker()}
 
         logger.debug("[Clients][LlmClient_init] Belief: LLM клиент инициализирован | Input: config | Expected: Клиент готов")
 
@@ -60,12 +145,151 @@ class LlmClient:
         logger.debug("[Clients][_build_reasoning_kwargs] Belief: Thinking budget передан через extra_body только для Gemini | Input: model, reasoning_budget | Expected: dict")
         return kwargs
 
-    def generate_json(self, system_prompt: str, user_prompt: str, temperature: float = 0.7) -> str:
+    def _create_chat_completion(
+        self,
+        messages: List[dict],
+        temperature: float,
+        json_mode: bool = False,
+        hedge: bool = False
+    ) -> str:
+        """
+        Выполняет один chat completion вызов через общий лимитер.
+
+        # START_CONTRACT__create_chat_completion
+        # Input: messages (List[dict]), temperature (float), json_mode (bool), hedge (bool)
+        # Russian Intent: Единая точка вызова LLM: повторы с backoff и дедлайном, опциональный hedging, лимит rpm/tpm, AIMD-слот, сверка токенов по usage; таймауты ограничены дедлайном стадии, отмена прерывает ожидание лимита, закрывает стрим markdown-ответа и сразу возвращает слот, а tpm сверяется с уже потраченными токенами
+        # Output: str - содержимое ответа
+        # END_CONTRACT__create_chat_completion
+        """
+        operation = "json" if json_mode else "markdown"
+        latency_tracker = self.latency_trackers[operation]
+        estimated_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+
+        request_kwargs = self._build_reasoning_kwargs()
+        if json_mode:
+            request_kwargs["response_format"] = {"type": "json_object"}
+
+        usage_context = current_usage()
+
+        def record_usage(usage: Any) -> None:
+            # Каждый отправленный запрос, включая проигравший hedge и прерванный, попадает в журнал usage
+            tokens = {}
+            for usage_field, direction in (("prompt_tokens", "input"), ("completion_tokens", "output")):
+                value = getattr(usage, usage_field, None)
+                tokens[direction] = value if isinstance(value, int) else 0
+                if isinstance(value, int):
+                    LLM_TOKENS_TOTAL.inc(value, model=self.model, direction=direction)
+            if usage_context is not None:
+                ledger, stage = usage_context
+                ledger.record(stage, self.model, operation, tokens["input"], tokens["output"])
+
+        def send(timeout: Optional[float]):
+            abort_scope = current_abort_scope()
+            self.rate_limiter.acquire("llm", self.model, estimated_tokens)
+            with self.concurrency_limiter.slot(operation) as lease:
+                if abort_scope is not None:
+                    abort_scope.on_abort(lease.abandon)
+                    abort_scope.raise_if_aborted()
+                started_at = time.monotonic()
+                response = self._send_request(messages, temperature, timeout, request_kwargs, stream=not json_mode)
+                if not hasattr(response, "choices"):
+                    response = _collect_stream(response, abort_scope)
+                latency_tracker.record(time.monotonic() - started_at)
+
+            usage = getattr(response, "usage", None)
+            aborted = abort_scope is not None and abort_scope.aborted
+            if aborted and usage is None:
+                # Прерванный стрим не получил usage: промпт и сгенерированная часть все равно оплачены
+                content = response.choices[0].message.content or ""
+                completion_tokens = estimate_tokens(content) if content else 0
+                usage = SimpleNamespace(
+                    prompt_tokens=estimated_tokens,
+                    completion_tokens=completion_tokens,
+                    total_tokens=estimated_tokens + completion_tokens
+                )
+            record_usage(usage)
+            # tpm сверяется с потраченным, в том числе прерванным стримом и проигравшим hedge: они не возвращают токены
+            total_tokens = getattr(usage, "total_tokens", None)
+            if isinstance(total_tokens, int):
+                self.rate_limiter.reconcile("llm", self.model, estimated_tokens, total_tokens)
+            if aborted:
+                abort_scope.raise_if_aborted()
+            return response
+
+        cancel_token = current_cancel_token()
+
+        def attempt(timeout: Optional[float]):
+            if cancel_token is not None:
+                timeout = cancel_token.bound_timeout(timeout)
+            if hedge and self.hedge_requests:
+                return run_cancellable(lambda: hedged_call(lambda: send(timeout), latency_tracker.percentile(0.95)), cancel_token)
+            return run_cancellable(lambda: send(timeout), cancel_token)
+
+        with get_tracer().span(
+            "llm.chat_completion",
+            **{"gen_ai.system": "openai", "gen_ai.request.model": self.model, "llm.operation": operation, "llm.hedge": hedge and self.hedge_requests}
+        ) as span:
+            retries = []
+            started_at = time.monotonic()
+            status = "error"
+            try:
+                response = call_with_retry(
+                    attempt,
+                    self.retry_policy,
+                    operation=f"llm.{operation}",
+                    on_retry=lambda attempt_no, error, delay: retries.append(type(error).__name__),
+                    sleep=cancel_token.sleep if cancel_token is not None else time.sleep
+                )
+                status = "ok"
+            except RunCancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                record_provider_call("llm", operation, status, time.monotonic() - started_at, len(retries))
+            usage = getattr(response, "usage", None)
+            span.set(**{"llm.retries": len(retries), "llm.estimated_tokens": estimated_tokens})
+            for attribute, usage_field in (("gen_ai.usage.input_tokens", "prompt_tokens"), ("gen_ai.usage.output_tokens", "completion_tokens")):
+                value = getattr(usage, usage_field, None)
+                if isinstance(value, int):
+                    span.set(**{attribute: value})
+
+        return response.choices[0].message.content
+
+    def _send_request(self, messages: List[dict], temperature: float, timeout: Optional[float], request_kwargs: dict, stream: bool) -> Any:
+        """
+        Отправляет chat completion, при необходимости стримом.
+
+        # START_CONTRACT__send_request
+        # Input: messages (List[dict]), temperature (float), timeout (Optional[float]), request_kwargs (dict), stream (bool) - вызову нужны токены по мере генерации
+        # Russian Intent: Стримить только длинные markdown-ответы; провайдер, отклонивший stream_options, получает обычный запрос сейчас и впредь
+        # Output: Any - ответ SDK или стрим чанков
+        # END_CONTRACT__send_request
+        """
+        create = self.client.chat.completions.create
+        if stream and self.stream_markdown:
+            try:
+                return create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **request_kwargs
+                )
+            except Exception as e:
+                if not _rejects_stream_options(e):
+                    raise
+                logger.warning(f"[Clients][_send_request] Provider rejected stream_options, falling back to non-streaming calls: {e}")
+                self.stream_markdown = False
+        return create(model=self.model, messages=messages, temperature=temperature, timeout=timeout, **request_kwargs)
+
+    def generate_json(self, system_prompt: str, user_prompt: str, temperature: float = 0.7, hedge: bool = False) -> str:
         """
         Генерирует JSON ответ от LLM.
 
         # START_CONTRACT_generate_json
-        # Input: system_prompt (str), user_prompt (str), temperature (float)
+        # Input: system_prompt (str), user_prompt (str), temperature (float), hedge (bool) - разрешить hedged-запрос
         # Russian Intent: Получить JSON ответ от LLM для структурированных данных
         # Output: str - raw JSON строка
         # END_CONTRACT_generate_json
@@ -73,30 +297,27 @@ class LlmClient:
         logger.debug("[Clients][generate_json] Belief: Генерация JSON от LLM | Input: system_prompt, user_prompt, temperature | Expected: str")
 
         try:
-            reasoning_kwargs = self._build_reasoning_kwargs()
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            result = self._create_chat_completion(
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=temperature,
-                response_format={"type": "json_object"},
-                **reasoning_kwargs
+                json_mode=True,
+                hedge=hedge
             )
-            result = response.choices[0].message.content
             logger.debug("[Clients][generate_json] Belief: JSON получен успешно | Input: system_prompt, user_prompt, temperature | Expected: str")
             return result
         except Exception as e:
             logger.error(f"[Clients][generate_json] LLM error: {e}")
             raise
 
-    def generate_markdown(self, system_prompt: str, user_prompt: str, temperature: float = 0.7) -> str:
+    def generate_markdown(self, system_prompt: str, user_prompt: str, temperature: float = 0.7, hedge: bool = False) -> str:
         """
         Генерирует Markdown текст от LLM.
 
         # START_CONTRACT_generate_markdown
-        # Input: system_prompt (str), user_prompt (str), temperature (float)
+        # Input: system_prompt (str), user_prompt (str), temperature (float), hedge (bool) - разрешить hedged-запрос
         # Russian Intent: Получить Markdown текст от LLM
         # Output: str - Markdown текст
         # END_CONTRACT_generate_markdown
@@ -104,17 +325,14 @@ class LlmClient:
         logger.debug("[Clients][generate_markdown] Belief: Генерация Markdown от LLM | Input: system_prompt, user_prompt, temperature | Expected: str")
 
         try:
-            reasoning_kwargs = self._build_reasoning_kwargs()
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            result = self._create_chat_completion(
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=temperature,
-                **reasoning_kwargs
+                hedge=hedge
             )
-            result = response.choices[0].message.content
             logger.debug("[Clients][generate_markdown] Belief: Markdown получен успешно | Input: system_prompt, user_prompt, temperature | Expected: str")
             return result
         except Exception as e:
@@ -150,18 +368,14 @@ class LlmClient:
 Верните исправленный JSON сейчас."""
 
         try:
-            reasoning_kwargs = self._build_reasoning_kwargs()
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            result = self._create_chat_completion(
+                [
                     {"role": "system", "content": repair_system_prompt},
                     {"role": "user", "content": repair_user_prompt}
                 ],
                 temperature=0.0,
-                response_format={"type": "json_object"},
-                **reasoning_kwargs
+                json_mode=True
             )
-            result = response.choices[0].message.content
             logger.debug("[Clients][repair_json_once] Belief: JSON отремонтирован | Input: broken_json | Expected: str")
             return result
         except Exception as e:
@@ -172,21 +386,50 @@ class LlmClient:
 class TavilyClientWrapper:
     """Обертка для Tavily Search."""
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        config: AppConfig,
+        rate_limiter: Optional[RateLimiter] = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None
+    ):
         """
         Инициализация Tavily клиента.
 
         # START_CONTRACT_TavilyClientWrapper_init
-        # Input: api_key (str)
+        # Input: config (AppConfig), rate_limiter (Optional[RateLimiter]), concurrency_limiter (Optional[AdaptiveConcurrencyLimiter]) - по умолчанию общие для процесса, retry_policy (Optional[RetryPolicy]) - по умолчанию из SEARCH_MAX_ATTEMPTS/SEARCH_TIMEOUT_SECONDS
         # Russian Intent: Инициализировать клиент Tavily Search
         # Output: None
         # END_CONTRACT_TavilyClientWrapper_init
         """
-        logger.debug("[Clients][TavilyClientWrapper_init] Belief: Инициализация Tavily клиента | Input: api_key | Expected: Клиент готов")
-
-        self.client = TavilyClient(api_key=api_key)
+        logger.debug("[Clients][TavilyClientWrapper_init] Belief: Инициализация Tavily клиента | Input: config | Expected: Клиент готов")
+
+        self.client = _sdk("TavilyClient")(api_key=config.tavily_api_key, api_base_url=config.tavily_base_url or None)
+        self.rate_limiter = rate_limiter or get_rate_limiter(config)
+        self.concurrency_limiter = concurrency_limiter or get_concurrency_limiter("tavily", config.search_max_concurrency)
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_attempts=config.search_max_attempts,
+            attempt_timeout=config.search_timeout_seconds,
+            deadline_seconds=config.search_timeout_seconds * config.search_max_attempts
+        )
 
-        logger.debug("[Clients][TavilyClientWrapper_init] Belief: Tavily клиент инициализирован | Input: api_key | Expected: Клиент готов")
+        logger.debug("[Clients][TavilyClientWrapper_init] Belief: Tavily клиент инициализирован | Input: config | Expected: Клиент готов")
+
+    def _search(self, query: str, max_results: int, timeout: Optional[float] = None) -> dict:
+        """Прямой вызов Tavily Search API."""
+        self.rate_limiter.acquire("tavily", "search")
+        search_kwargs = {"timeout": timeout} if timeout else {}
+        with self.concurrency_limiter.slot("search") as lease:
+            abort_scope = current_abort_scope()
+            if abort_scope is not None:
+                abort_scope.on_abort(lease.abandon)
+            return self.client.search(
+                query=query,
+                max_results=max_results,
+                search_depth="basic",
+                include_raw_content=True,
+                **search_kwargs
+            )
 
     def search_once(self, query: str, max_results: int = 5) -> Optional[dict]:
         """
@@ -194,24 +437,74 @@ class TavilyClientWrapper:
 
         # START_CONTRACT_search_once
         # Input: query (str), max_results (int)
-        # Russian Intent: Выполнить поиск по запросу через Tavily
-        # Output: dict - результаты поиска или None при ошибке
+        # Russian Intent: Выполнить поиск по запросу через Tavily, повторяя транзиентные сбои в пределах дедлайна стадии
+        # Output: dict - результаты поиска или None после исчерпания попыток / фатальной ошибки; отмена -> RunCancelledError
         # END_CONTRACT_search_once
         """
         logger.debug(f"[Clients][search_once] Belief: Поиск по запросу | Input: query={query}, max_results | Expected: dict")
 
+        cancel_token = current_cancel_token()
+
+        def attempt(timeout: Optional[float]) -> dict:
+            if cancel_token is not None:
+                timeout = cancel_token.bound_timeout(timeout)
+            return run_cancellable(lambda: self._search(query, max_results, timeout), cancel_token)
+
+        span = get_tracer().start_span("search.tavily", **{"search.query": query, "search.max_results": max_results})
+        retries = []
+        started_at = time.monotonic()
+        status = "error"
         try:
-            response = self.client.search(
-                query=query,
-                max_results=max_results,
-                search_depth="basic",
-                include_raw_content=True
+            response = call_with_retry(
+                attempt,
+                self.retry_policy,
+                operation="tavily.search",
+                on_retry=lambda attempt_no, error, delay: retries.append(type(error).__name__),
+                sleep=cancel_token.sleep if cancel_token is not None else time.sleep
             )
+            results = response.get("results", []) if isinstance(response, dict) else []
+            span.set(**{
+                "search.hits": len(results),
+                "search.bytes": sum(len(r.get("content") or "") + len(r.get("raw_content") or "") for r in results)
+            })
             logger.debug(f"[Clients][search_once] Belief: Поиск успешен | Input: query={query}, max_results | Expected: dict")
+            status = "ok"
             return response
+        except RunCancelledError as e:
+            status = "cancelled"
+            span.fail(e)
+            raise
+        except _sdk("UsageLimitExceededError") as e:
+            status = "rate_limited"
+            span.fail(e)
+            logger.error(f"[Clients][search_once] Search rate limited (429) after retries for query '{query}': {e}")
+            return None
         except Exception as e:
+            span.fail(e)
             logger.error(f"[Clients][search_once] Search failed for query '{query}': {e}")
             return None
+        finally:
+            span.set(**{"search.retries": len(retries)})
+            span.end()
+            record_provider_call("tavily", "search", status, time.monotonic() - started_at, len(retries))
+
+
+def build_clients(app_config: AppConfig) -> Tuple[LlmClient, TavilyClientWrapper]:
+    """
+    Создает LLM и Tavily клиентов с общими лимитерами и политиками повторов.
+
+    # START_CONTRACT_build_clients
+    # Input: app_config (AppConfig)
+    # Russian Intent: Единая точка сборки клиентов для UI и worker-процессов
+    # Output: Tuple[LlmClient, TavilyClientWrapper]
+    # END_CONTRACT_build_clients
+    """
+    logger.debug("[Clients][build_clients] Belief: Сборка клиентов провайдеров | Input: app_config | Expected: Tuple[LlmClient, TavilyClientWrapper]")
+
+    llm_client = LlmClient(app_config)
+    tavily_client = TavilyClientWrapper(app_config)
+    attach_cassette(llm_client, tavily_client, app_config.cassette_mode, app_config.cassette_path, app_config.cassette_latency)
+    return llm_client, tavily_client
 
 
 def safe_log_error(error: Exception, context: str) -> str:
@@ -0,0 +1,155 @@
+"""
+Request Coalescing Module
+Объединяет одновременные идентичные запуски генерации в один (single-flight).
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from src.config import UiSettings
+from src.metrics import COALESCED_REQUESTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+
+def build_run_key(topic: str, settings: UiSettings) -> str:
+    """
+    Строит ключ идентичности запуска.
+
+    # START_CONTRACT_build_run_key
+    # Input: topic (str), settings (UiSettings)
+    # Russian Intent: Однозначно идентифицировать запуск по теме (без учета регистра и пробелов) и настройкам
+    # Output: str - sha256 ключ
+    # END_CONTRACT_build_run_key
+    """
+    normalized_topic = " ".join(topic.casefold().split())
+    payload = json.dumps({"topic": normalized_topic, "settings": asdict(settings)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """Один выполняющийся запуск и журнал его событий."""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 0
+        self.on_abandon: Optional[Callable[[], None]] = None
+        self.condition = threading.Condition()
+
+
+class SingleFlight:
+    """Реестр выполняющихся запусков с подпиской на общий поток событий."""
+
+    def __init__(self):
+        """
+        Инициализация реестра.
+
+        # START_CONTRACT_SingleFlight_init
+        # Input: None
+        # Russian Intent: Создать потокобезопасный реестр выполняющихся запусков
+        # Output: None
+        # END_CONTRACT_SingleFlight_init
+        """
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+
+    def in_flight(self, key: str) -> bool:
+        """Проверяет, выполняется ли запуск с данным ключом."""
+        with self._lock:
+            return key in self._flights
+
+    def subscribe(
+        self,
+        key: str,
+        factory: Callable[[], Iterable[Any]],
+        on_abandon: Optional[Callable[[], None]] = None,
+        detach: Optional[threading.Event] = None
+    ) -> Iterator[Any]:
+        """
+        Подписывается на запуск с данным ключом, стартуя его при необходимости.
+
+        # START_CONTRACT_subscribe
+        # Input: key (str), factory (Callable[[], Iterable]) - создает поток событий запуска, on_abandon (Optional[Callable]) - отмена запуска (берется у лидера), detach (Optional[Event]) - отписка без ожидания следующего события
+        # Russian Intent: Присоединить идентичный запрос к уже выполняющемуся запуску вместо нового; отменить запуск, когда ушел последний подписчик
+        # Output: Iterator - все события запуска с начала; ошибка запуска пробрасывается каждому подписчику
+        # END_CONTRACT_subscribe
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                flight.on_abandon = on_abandon
+                self._flights[key] = flight
+            flight.subscribers += 1
+
+        COALESCED_REQUESTS_TOTAL.inc(result="started" if is_leader else "joined")
+        if is_leader:
+            logger.debug("[Coalescing][subscribe] Belief: Старт нового запуска | Input: key | Expected: Iterator")
+            threading.Thread(
+                target=self._drive,
+                args=(key, flight, factory),
+                name=f"single-flight-{key[:8]}",
+                daemon=True
+            ).start()
+        else:
+            logger.info(f"[Coalescing] Attached to in-flight run {key[:8]} ({flight.subscribers} subscribers)")
+
+        try:
+            yield from self._replay(flight, detach)
+        finally:
+            with self._lock:
+                flight.subscribers -= 1
+                abandoned = flight.subscribers == 0 and not flight.done
+                # Новый идентичный запрос не должен присоединяться к отменяемому запуску
+                if abandoned and self._flights.get(key) is flight:
+                    del self._flights[key]
+            if abandoned and flight.on_abandon is not None:
+                logger.info(f"[Coalescing] Last subscriber left run {key[:8]}, cancelling it")
+                flight.on_abandon()
+
+    def _drive(self, key: str, flight: _Flight, factory: Callable[[], Iterable[Any]]) -> None:
+        """Исполняет запуск в фоне и публикует события всем подписчикам."""
+        try:
+            for event in factory():
+                with flight.condition:
+                    flight.events.append(event)
+                    flight.condition.notify_all()
+        except BaseException as e:
+            logger.error(f"[Coalescing][_drive] Run {key[:8]} failed: {e}")
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    def _replay(self, flight: _Flight, detach: Optional[threading.Event] = None) -> Iterator[Any]:
+        """Отдает события запуска с начала и ждет новых до завершения или отписки."""
+        index = 0
+        while True:
+            with flight.condition:
+                while index >= len(flight.events) and not flight.done:
+                    if detach is None:
+                        flight.condition.wait()
+                    elif detach.is_set():
+                        return
+                    else:
+                        flight.condition.wait(0.1)
+                batch = flight.events[index:]
+                finished = flight.done
+            index += len(batch)
+            yield from batch
+            if finished and index >= len(flight.events):
+                break
+
+        if flight.error is not None:
+            raise flight.error
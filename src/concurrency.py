@@ -0,0 +1,296 @@
+"""
+Adaptive Concurrency Module
+AIMD-контроллер параллелизма вызовов провайдеров и fan-out помощник для оркестратора.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Callable, Deque, Dict, Iterator, Optional, Sequence, Tuple, TypeVar
+
+from src.metrics import CONCURRENCY_DECISIONS_TOTAL, CONCURRENCY_INFLIGHT, CONCURRENCY_LIMIT
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_OVERLOAD_ERROR_NAMES = ("RateLimitError", "UsageLimitExceededError", "APITimeoutError", "TimeoutError", "InternalServerError")
+
+
+@dataclass
+class LimitDecision:
+    """Одно решение контроллера об изменении лимита."""
+    timestamp: float
+    action: str
+    old_limit: float
+    new_limit: float
+    reason: str
+
+
+class FanOutError(Exception):
+    """Ошибка одного элемента fan-out с его индексом."""
+
+    def __init__(self, index: int, error: BaseException):
+        self.index = index
+        self.error = error
+        super().__init__(f"Item {index} failed: {error}")
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    Определяет, сигнализирует ли ошибка о перегрузке провайдера.
+
+    # START_CONTRACT_is_overload_error
+    # Input: error (BaseException)
+    # Russian Intent: Отличить 429/5xx/таймауты (повод снизить параллелизм) от ошибок запроса
+    # Output: bool
+    # END_CONTRACT_is_overload_error
+    """
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int) and (status_code == 429 or status_code >= 500):
+        return True
+    return any(cls.__name__ in _OVERLOAD_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class SlotLease:
+    """Занятый слот лимитера; освобождается ровно один раз."""
+
+    def __init__(self, limiter: "AdaptiveConcurrencyLimiter", operation: str, started_at: float):
+        self._limiter = limiter
+        self.operation = operation
+        self.started_at = started_at
+        self.released = False
+
+    def release(self, error: Optional[BaseException] = None) -> None:
+        """Освобождает слот и учитывает исход вызова в AIMD."""
+        self._limiter._release(self, error, record=True)
+
+    def abandon(self) -> None:
+        """Освобождает слот прерванного вызова, не учитывая его латентность в AIMD."""
+        self._limiter._release(self, None, record=False)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD-лимитер числа одновременных вызовов провайдера."""
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = 2.0,
+        min_limit: float = 1.0,
+        max_limit: float = 16.0,
+        latency_tolerance: float = 2.0,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 1.0,
+        history_size: int = 100,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Инициализация контроллера.
+
+        # START_CONTRACT_AdaptiveConcurrencyLimiter_init
+        # Input: name, initial_limit, min_limit, max_limit, latency_tolerance, decrease_factor, cooldown_seconds, history_size, clock
+        # Russian Intent: Повышать параллелизм аддитивно при здоровых ответах и снижать мультипликативно при 429/5xx/всплесках латентности относительно базовой латентности той же операции
+        # Output: None
+        # END_CONTRACT_AdaptiveConcurrencyLimiter_init
+        """
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= max_limit")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be in (0, 1)")
+
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self._limit = max(min_limit, min(max_limit, initial_limit))
+        self._inflight = 0
+        # Базовая латентность своя у каждой операции: короткие JSON-вызовы не делают длинные markdown-ответы «всплесками»
+        self._baselines: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self._last_decrease_at = float("-inf")
+        self._decisions: Deque[LimitDecision] = deque(maxlen=history_size)
+        self._condition = threading.Condition()
+        CONCURRENCY_LIMIT.set(self.limit, provider=name)
+
+    @property
+    def limit(self) -> int:
+        """Текущий целочисленный лимит одновременных вызовов."""
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        """Число вызовов в полете."""
+        return self._inflight
+
+    @contextmanager
+    def slot(self, operation: str = "call") -> Iterator[SlotLease]:
+        """
+        Занимает слот на время одного вызова провайдера.
+
+        # START_CONTRACT_slot
+        # Input: operation (str) - вид вызова (json, markdown, search) со своей базовой латентностью
+        # Russian Intent: Дождаться свободного слота, измерить латентность вызова и учесть исход в AIMD; прерванный вызов может вернуть слот раньше через lease.abandon()
+        # Output: Iterator[SlotLease] - контекстный менеджер
+        # END_CONTRACT_slot
+        """
+        with self._condition:
+            while self._inflight >= self.limit:
+                self._condition.wait()
+            self._inflight += 1
+        CONCURRENCY_INFLIGHT.inc(provider=self.name)
+
+        lease = SlotLease(self, operation, self._clock())
+        try:
+            yield lease
+        except BaseException as e:
+            lease.release(e)
+            raise
+        lease.release()
+
+    def _release(self, lease: SlotLease, error: Optional[BaseException], record: bool) -> None:
+        """Возвращает слот лимитеру, если он еще не возвращен."""
+        with self._condition:
+            if lease.released:
+                return
+            lease.released = True
+            self._inflight -= 1
+            CONCURRENCY_INFLIGHT.dec(provider=self.name)
+            if record:
+                self._record(self._clock() - lease.started_at, error, lease.operation)
+            self._condition.notify_all()
+
+    def record(self, latency: float, error: Optional[BaseException] = None, operation: str = "call") -> None:
+        """Учитывает исход вызова, выполненного вне slot()."""
+        with self._condition:
+            self._record(latency, error, operation)
+            self._condition.notify_all()
+
+    def _record(self, latency: float, error: Optional[BaseException], operation: str) -> None:
+        """Применяет правило AIMD (вызывается под блокировкой)."""
+        if error is not None:
+            if is_overload_error(error):
+                self._decrease(f"overload: {type(error).__name__}")
+            return
+
+        baseline = self._baselines.get(operation)
+        samples = self._samples.get(operation, 0)
+        is_spike = baseline is not None and samples >= 5 and latency > baseline * self.latency_tolerance
+        self._baselines[operation] = latency if baseline is None else 0.9 * baseline + 0.1 * latency
+        self._samples[operation] = samples + 1
+
+        if is_spike:
+            self._decrease(f"latency spike: {latency:.2f}s > {self.latency_tolerance}x baseline")
+            return
+
+        if self._limit < self.max_limit:
+            old = self._limit
+            # +1 к лимиту за «окно» из limit успешных вызовов
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            if int(self._limit) != int(old):
+                self._decide("increase", old, "healthy latency")
+
+    def _decrease(self, reason: str) -> None:
+        """Мультипликативно уменьшает лимит не чаще одного раза за cooldown."""
+        now = self._clock()
+        if now - self._last_decrease_at < self.cooldown_seconds:
+            return
+        self._last_decrease_at = now
+        old = self._limit
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        self._decide("decrease", old, reason)
+        logger.info(f"[Concurrency] {self.name}: limit {old:.1f} -> {self._limit:.1f} ({reason})")
+
+    def _decide(self, action: str, old: float, reason: str) -> None:
+        """Сохраняет решение в историю и публикует его в метрики."""
+        self._decisions.append(LimitDecision(time.time(), action, old, self._limit, reason))
+        CONCURRENCY_LIMIT.set(self.limit, provider=self.name)
+        CONCURRENCY_DECISIONS_TOTAL.inc(provider=self.name, action=action)
+
+    def snapshot(self) -> dict:
+        """
+        Возвращает состояние контроллера для наблюдаемости.
+
+        # START_CONTRACT_snapshot
+        # Input: None
+        # Russian Intent: Экспортировать текущий лимит, нагрузку и последние решения
+        # Output: dict
+        # END_CONTRACT_snapshot
+        """
+        with self._condition:
+            return {
+                "name": self.name,
+                "limit": self.limit,
+                "inflight": self._inflight,
+                "baseline_latency": dict(self._baselines),
+                "decisions": [asdict(d) for d in self._decisions],
+            }
+
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_concurrency_limiter(name: str, max_limit: int = 16) -> AdaptiveConcurrencyLimiter:
+    """
+    Возвращает process-wide контроллер для провайдера.
+
+    # START_CONTRACT_get_concurrency_limiter
+    # Input: name (str), max_limit (int)
+    # Russian Intent: Разделять один AIMD-контроллер между всеми сессиями и стадиями
+    # Output: AdaptiveConcurrencyLimiter
+    # END_CONTRACT_get_concurrency_limiter
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            max_limit = max(1, max_limit)
+            limiter = AdaptiveConcurrencyLimiter(name, initial_limit=min(2, max_limit), max_limit=max_limit)
+            _limiters[name] = limiter
+        return limiter
+
+
+def fan_out(items: Sequence[T], fn: Callable[[T], R], max_workers: int) -> Iterator[Tuple[int, R]]:
+    """
+    Выполняет fn для каждого элемента с ограниченным параллелизмом.
+
+    # START_CONTRACT_fan_out
+    # Input: items (Sequence), fn (Callable), max_workers (int)
+    # Russian Intent: Общая точка fan-out оркестратора; фактическое число вызовов в полете ограничивает AIMD-контроллер клиента
+    # Output: Iterator[Tuple[int, R]] - (индекс, результат) в порядке завершения; первая ошибка -> FanOutError
+    # END_CONTRACT_fan_out
+    """
+    if max_workers <= 1 or len(items) <= 1:
+        for index, item in enumerate(items):
+            try:
+                result = fn(item)
+            except Exception as e:
+                raise FanOutError(index, e) from e
+            yield index, result
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        futures = {
+            pool.submit(contextvars.copy_context().run, fn, item): index
+            for index, item in enumerate(items)
+        }
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    raise FanOutError(index, e) from e
+                yield index, result
+        finally:
+            for future in futures:
+                future.cancel()
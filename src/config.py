@@ -6,11 +6,27 @@ Configuration & Settings Module
 import os
 import json
 import logging
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
+from typing import Dict, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Бюджеты стадий по умолчанию (секунды), ключи - имена PipelineStage
+DEFAULT_STAGE_BUDGETS: Dict[str, float] = {
+    "QUERY_BUILDER": 120.0,
+    "SEARCH": 180.0,
+    "STRUCTURE_PLANNER": 240.0,
+    "CHAPTER_WRITER": 900.0,
+    "ASSEMBLY": 900.0,
+}
+
+# Пресеты планировщика запуска; custom - ручное управление редакторами секций
+UI_PRESETS = ("speed", "balanced", "thorough", "custom")
+CASSETTE_MODES = ("off", "record", "replay")
+CASSETTE_LATENCIES = ("original", "zero")
+WARMUP_MODES = ("off", "connect", "completion")
+
 
 @dataclass
 class AppConfig:
@@ -19,8 +35,44 @@ class AppConfig:
     llm_base_url: str
     llm_model: str
     tavily_api_key: str
+    tavily_base_url: str = ""
     llm_max_output_tokens: int = 12000
     llm_reasoning_budget: int = 256
+    job_queue_path: str = ""
+    job_workers: int = 2
+    llm_requests_per_minute: int = 0
+    llm_tokens_per_minute: int = 0
+    search_requests_per_minute: int = 0
+    rate_limit_db_path: str = ""
+    llm_max_concurrency: int = 4
+    search_max_concurrency: int = 4
+    llm_max_attempts: int = 3
+    llm_timeout_seconds: float = 120.0
+    llm_call_deadline_seconds: float = 300.0
+    llm_hedge_requests: bool = False
+    search_max_attempts: int = 3
+    search_timeout_seconds: float = 30.0
+    run_deadline_seconds: float = 1800.0
+    stage_budgets: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_STAGE_BUDGETS))
+    stage_timings_path: str = ""
+    ui_settings_dir: str = "ui_settings"
+    trace_jsonl_path: str = ""
+    otlp_endpoint: str = ""
+    metrics_port: int = 0
+    gradio_concurrency_limit: int = 4
+    gradio_queue_max_size: int = 0
+    cassette_mode: str = "off"
+    cassette_path: str = ""
+    cassette_latency: str = "original"
+    warmup_mode: str = "off"
+    warmup_timeout_seconds: float = 10.0
+    save_drafts: bool = False
+    output_catalog_path: str = ""
+    output_retention_days: float = 0.0
+    output_retention_max_count: int = 0
+    output_retention_max_mb: float = 0.0
+    # Модель -> (USD за 1M входных токенов, USD за 1M выходных токенов)
+    llm_prices: Dict[str, Tuple[float, float]] = field(default_factory=dict)
 
 
 @dataclass
@@ -32,9 +84,10 @@ class UiSettings:
     editor_temperature: float = 0.2
     keep_links: bool = True
     enable_section_editors: bool = True
+    preset: str = "balanced"
 
     # START_CONTRACT_UiSettings
-    # Input: words_per_chapter (int), chapter_count (int), temperature (float), editor_temperature (float), keep_links (bool), enable_section_editors (bool)
+    # Input: words_per_chapter (int), chapter_count (int), temperature (float), editor_temperature (float), keep_links (bool), enable_section_editors (bool) - только для пресета custom, preset (str)
     # Russian Intent: Хранить настройки UI с валидацией диапазонов
     # Output: Валидный объект UiSettings
     # END_CONTRACT_UiSettings
@@ -47,6 +100,8 @@ class UiSettings:
         self.editor_temperature = max(0.0, min(1.0, self.editor_temperature))
         self.keep_links = bool(self.keep_links)
         self.enable_section_editors = bool(self.enable_section_editors)
+        if self.preset not in UI_PRESETS:
+            self.preset = "balanced"
 
 
 def load_env_config() -> AppConfig:
@@ -65,8 +120,25 @@ def load_env_config() -> AppConfig:
     llm_base_url = os.getenv("LLM_BASE_URL")
     llm_model = os.getenv("LLM_MODEL")
     tavily_api_key = os.getenv("TAVILY_API_KEY")
+    tavily_base_url = os.getenv("TAVILY_BASE_URL", "")
     llm_max_output_tokens_raw = os.getenv("LLM_MAX_OUTPUT_TOKENS", "12000")
     llm_reasoning_budget_raw = os.getenv("LLM_REASONING_BUDGET", "256")
+    job_queue_path = os.getenv("JOB_QUEUE_PATH", "")
+    job_workers_raw = os.getenv("JOB_WORKERS", "2")
+    rate_limit_db_path = os.getenv("RATE_LIMIT_DB_PATH", "")
+    stage_timings_path = os.getenv("STAGE_TIMINGS_PATH", "")
+    ui_settings_dir = os.getenv("UI_SETTINGS_DIR", "ui_settings")
+    trace_jsonl_path = os.getenv("TRACE_JSONL_PATH", "")
+    otlp_endpoint = os.getenv("OTLP_ENDPOINT", "")
+    metrics_port_raw = os.getenv("METRICS_PORT", "0")
+    gradio_concurrency_limit_raw = os.getenv("GRADIO_CONCURRENCY_LIMIT", "4")
+    gradio_queue_max_size_raw = os.getenv("GRADIO_QUEUE_MAX_SIZE", "0")
+    cassette_mode = os.getenv("CASSETTE_MODE", "off").strip().lower() or "off"
+    warmup_mode = os.getenv("WARMUP_MODE", "off").strip().lower() or "off"
+    warmup_timeout_raw = os.getenv("WARMUP_TIMEOUT_SECONDS", "10")
+    cassette_path = os.getenv("CASSETTE_PATH", "")
+    output_catalog_path = os.getenv("OUTPUT_CATALOG_PATH", "")
+    cassette_latency = os.getenv("CASSETTE_LATENCY", "original").strip().lower() or "original"
 
     missing = []
     if not llm_api_key:
@@ -97,13 +169,172 @@ def load_env_config() -> AppConfig:
     if llm_reasoning_budget < 0:
         raise ValueError("LLM_REASONING_BUDGET must be >= 0")
 
+    try:
+        job_workers = int(job_workers_raw)
+    except ValueError as e:
+        raise ValueError("JOB_WORKERS must be an integer") from e
+
+    if job_workers < 0:
+        raise ValueError("JOB_WORKERS must be >= 0")
+
+    try:
+        metrics_port = int(metrics_port_raw)
+    except ValueError as e:
+        raise ValueError("METRICS_PORT must be an integer") from e
+
+    if not 0 <= metrics_port <= 65535:
+        raise ValueError("METRICS_PORT must be between 0 and 65535")
+
+    try:
+        gradio_concurrency_limit = int(gradio_concurrency_limit_raw)
+        gradio_queue_max_size = int(gradio_queue_max_size_raw)
+    except ValueError as e:
+        raise ValueError("GRADIO_CONCURRENCY_LIMIT and GRADIO_QUEUE_MAX_SIZE must be integers") from e
+
+    if gradio_concurrency_limit < 1:
+        raise ValueError("GRADIO_CONCURRENCY_LIMIT must be >= 1")
+    if gradio_queue_max_size < 0:
+        raise ValueError("GRADIO_QUEUE_MAX_SIZE must be >= 0")
+
+    if warmup_mode not in WARMUP_MODES:
+        raise ValueError(f"WARMUP_MODE must be one of {', '.join(WARMUP_MODES)}")
+    try:
+        warmup_timeout_seconds = float(warmup_timeout_raw)
+    except ValueError as e:
+        raise ValueError("WARMUP_TIMEOUT_SECONDS must be a number") from e
+    if warmup_timeout_seconds <= 0:
+        raise ValueError("WARMUP_TIMEOUT_SECONDS must be > 0")
+
+    retention = {}
+    for env_name, cast in (("OUTPUT_RETENTION_DAYS", float), ("OUTPUT_RETENTION_MAX_COUNT", int), ("OUTPUT_RETENTION_MAX_MB", float)):
+        try:
+            retention[env_name] = cast(os.getenv(env_name, "0") or "0")
+        except ValueError as e:
+            raise ValueError(f"{env_name} must be a number") from e
+        if retention[env_name] < 0:
+            raise ValueError(f"{env_name} must be >= 0")
+
+    if cassette_mode not in CASSETTE_MODES:
+        raise ValueError(f"CASSETTE_MODE must be one of {', '.join(CASSETTE_MODES)}")
+    if cassette_mode != "off" and not cassette_path:
+        raise ValueError("CASSETTE_PATH is required when CASSETTE_MODE is record or replay")
+    if cassette_latency not in CASSETTE_LATENCIES:
+        raise ValueError(f"CASSETTE_LATENCY must be one of {', '.join(CASSETTE_LATENCIES)}")
+
+    max_concurrency = {}
+    for env_name in ("LLM_MAX_CONCURRENCY", "SEARCH_MAX_CONCURRENCY"):
+        try:
+            max_concurrency[env_name] = int(os.getenv(env_name, "4"))
+        except ValueError as e:
+            raise ValueError(f"{env_name} must be an integer") from e
+        if max_concurrency[env_name] < 1:
+            raise ValueError(f"{env_name} must be >= 1")
+
+    max_attempts = {}
+    for env_name in ("LLM_MAX_ATTEMPTS", "SEARCH_MAX_ATTEMPTS"):
+        try:
+            max_attempts[env_name] = int(os.getenv(env_name, "3"))
+        except ValueError as e:
+            raise ValueError(f"{env_name} must be an integer") from e
+        if max_attempts[env_name] < 1:
+            raise ValueError(f"{env_name} must be >= 1")
+
+    timeouts = {}
+    for env_name, default in (("LLM_TIMEOUT_SECONDS", "120"), ("LLM_CALL_DEADLINE_SECONDS", "300"), ("SEARCH_TIMEOUT_SECONDS", "30")):
+        try:
+            timeouts[env_name] = float(os.getenv(env_name, default))
+        except ValueError as e:
+            raise ValueError(f"{env_name} must be a number") from e
+        if timeouts[env_name] <= 0:
+            raise ValueError(f"{env_name} must be > 0")
+
+    try:
+        run_deadline_seconds = float(os.getenv("RUN_DEADLINE_SECONDS", "1800"))
+    except ValueError as e:
+        raise ValueError("RUN_DEADLINE_SECONDS must be a number") from e
+    if run_deadline_seconds < 0:
+        raise ValueError("RUN_DEADLINE_SECONDS must be >= 0")
+
+    stage_budgets = dict(DEFAULT_STAGE_BUDGETS)
+    for item in filter(None, (part.strip() for part in os.getenv("STAGE_BUDGETS_SECONDS", "").split(","))):
+        name, _, value = item.partition("=")
+        name = name.strip().upper()
+        if name not in stage_budgets:
+            raise ValueError(f"STAGE_BUDGETS_SECONDS: unknown stage {name!r}")
+        try:
+            stage_budgets[name] = float(value)
+        except ValueError as e:
+            raise ValueError(f"STAGE_BUDGETS_SECONDS: budget for {name} must be a number") from e
+        if stage_budgets[name] < 0:
+            raise ValueError(f"STAGE_BUDGETS_SECONDS: budget for {name} must be >= 0")
+
+    llm_prices: Dict[str, Tuple[float, float]] = {}
+    for item in filter(None, (part.strip() for part in os.getenv("LLM_PRICES", "").split(","))):
+        model, _, value = item.rpartition("=")
+        input_price, _, output_price = value.partition("/")
+        if not model.strip():
+            raise ValueError(f"LLM_PRICES: entry {item!r} must look like model=input/output")
+        try:
+            llm_prices[model.strip()] = (float(input_price), float(output_price))
+        except ValueError as e:
+            raise ValueError(f"LLM_PRICES: prices for {model.strip()} must be numbers (input/output per 1M tokens)") from e
+        if min(llm_prices[model.strip()]) < 0:
+            raise ValueError(f"LLM_PRICES: prices for {model.strip()} must be >= 0")
+
+    llm_hedge_requests = os.getenv("LLM_HEDGE_REQUESTS", "0").strip().lower() in ("1", "true", "yes")
+    save_drafts = os.getenv("SAVE_DRAFTS", "0").strip().lower() in ("1", "true", "yes")
+
+    rate_limits = {}
+    for env_name in ("LLM_REQUESTS_PER_MINUTE", "LLM_TOKENS_PER_MINUTE", "SEARCH_REQUESTS_PER_MINUTE"):
+        try:
+            rate_limits[env_name] = int(os.getenv(env_name, "0"))
+        except ValueError as e:
+            raise ValueError(f"{env_name} must be an integer") from e
+        if rate_limits[env_name] < 0:
+            raise ValueError(f"{env_name} must be >= 0")
+
     config = AppConfig(
         llm_api_key=llm_api_key,
         llm_base_url=llm_base_url,
         llm_model=llm_model,
         tavily_api_key=tavily_api_key,
+        tavily_base_url=tavily_base_url,
         llm_max_output_tokens=llm_max_output_tokens,
-        llm_reasoning_budget=llm_reasoning_budget
+        llm_reasoning_budget=llm_reasoning_budget,
+        job_queue_path=job_queue_path,
+        job_workers=job_workers,
+        llm_requests_per_minute=rate_limits["LLM_REQUESTS_PER_MINUTE"],
+        llm_tokens_per_minute=rate_limits["LLM_TOKENS_PER_MINUTE"],
+        search_requests_per_minute=rate_limits["SEARCH_REQUESTS_PER_MINUTE"],
+        rate_limit_db_path=rate_limit_db_path,
+        llm_max_concurrency=max_concurrency["LLM_MAX_CONCURRENCY"],
+        search_max_concurrency=max_concurrency["SEARCH_MAX_CONCURRENCY"],
+        llm_max_attempts=max_attempts["LLM_MAX_ATTEMPTS"],
+        llm_timeout_seconds=timeouts["LLM_TIMEOUT_SECONDS"],
+        llm_call_deadline_seconds=timeouts["LLM_CALL_DEADLINE_SECONDS"],
+        llm_hedge_requests=llm_hedge_requests,
+        search_max_attempts=max_attempts["SEARCH_MAX_ATTEMPTS"],
+        search_timeout_seconds=timeouts["SEARCH_TIMEOUT_SECONDS"],
+        run_deadline_seconds=run_deadline_seconds,
+        stage_budgets=stage_budgets,
+        stage_timings_path=stage_timings_path,
+        ui_settings_dir=ui_settings_dir,
+        trace_jsonl_path=trace_jsonl_path,
+        otlp_endpoint=otlp_endpoint,
+        metrics_port=metrics_port,
+        gradio_concurrency_limit=gradio_concurrency_limit,
+        gradio_queue_max_size=gradio_queue_max_size,
+        cassette_mode=cassette_mode,
+        warmup_mode=warmup_mode,
+        warmup_timeout_seconds=warmup_timeout_seconds,
+        save_drafts=save_drafts,
+        output_catalog_path=output_catalog_path,
+        output_retention_days=retention["OUTPUT_RETENTION_DAYS"],
+        output_retention_max_count=retention["OUTPUT_RETENTION_MAX_COUNT"],
+        output_retention_max_mb=retention["OUTPUT_RETENTION_MAX_MB"],
+        cassette_path=cassette_path,
+        cassette_latency=cassette_latency,
+        llm_prices=llm_prices
     )
 
     logger.debug("[Config][load_env_config] Belief: ENV-конфигурация загружена успешно | Input: None | Expected: Валидный AppConfig")
@@ -177,7 +408,8 @@ def validate_ui_settings(settings: UiSettings) -> bool:
         0.0 <= settings.temperature <= 1.0 and
         0.0 <= settings.editor_temperature <= 1.0 and
         isinstance(settings.keep_links, bool) and
-        isinstance(settings.enable_section_editors, bool)
+        isinstance(settings.enable_section_editors, bool) and
+        settings.preset in UI_PRESETS
     )
 
     logger.debug(f"[Config][validate_ui_settings] Belief: Валидация завершена | Input: settings | Expected: bool, Result: {is_valid}")
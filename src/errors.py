@@ -24,8 +24,17 @@ class PipelineError(Exception):
     """Критическая ошибка pipeline."""
 
 
+class RunCancelledError(PipelineError):
+    """Запуск отменен пользователем, отключением клиента или истечением дедлайна."""
+
+    def __init__(self, reason: str = "cancelled"):
+        self.reason = reason
+        super().__init__(f"Run cancelled: {reason}")
+
+
 class PipelineStage(Enum):
     """Стадии pipeline."""
+    PLANNER = "Планировщик запуска"
     QUERY_BUILDER = "Генератор запросов"
     SEARCH = "Поиск"
     STRUCTURE_PLANNER = "Планировщик структуры"
@@ -130,36 +139,16 @@ def stream_logs(
 
     # START_CONTRACT_stream_logs
     # Input: generator (Generator)
-    # Russian Intent: Обернуть генератор для безопасного накопительного стриминга логов
+    # Russian Intent: Обернуть генератор для безопасного накопительного стриминга логов (текст ограниченного журнала ProgressLog)
     # Output: Generator
     # END_CONTRACT_stream_logs
     """
     logger.debug("[Errors][stream_logs] Belief: Начало накопительного стриминга логов | Input: generator | Expected: Generator")
 
-    accumulated_logs = ""
-    accumulated_markdown = None
-    accumulated_filepath = None
-
-    try:
-        for logs, markdown, filepath in generator:
-            # Накапливаем логи
-            if logs:
-                if accumulated_logs:
-                    accumulated_logs += "\n" + logs
-                else:
-                    accumulated_logs = logs
-
-            # Обновляем markdown и filepath (они не накапливаются)
-            if markdown is not None:
-                accumulated_markdown = markdown
-            if filepath is not None:
-                accumulated_filepath = filepath
-
-            # Yield накопленное состояние
-            yield (accumulated_logs, accumulated_markdown, accumulated_filepath)
-    except Exception as e:
-        logger.error(f"[Errors][stream_logs] Error during streaming: {e}")
-        error_msg = f"❌ Unexpected error: {type(e).__name__}"
-        if accumulated_logs:
-            error_msg = accumulated_logs + "\n" + error_msg
-        yield (error_msg, None, None)
+    # Представление поверх потока событий прогресса (импорт здесь: progress зависит от этого модуля)
+    from src.progress import ProgressLog, progress_events
+
+    log = ProgressLog()
+    for event in progress_events(generator):
+        log.append(event)
+        yield (log.text(), log.markdown, log.filepath)
@@ -1,16 +1,113 @@
 """
 Markdown Assembly & Export Module
-Сшивает документ и сохраняет в файл с timestamp.
+Сшивает документ и сохраняет в файл с timestamp (потоково, по секциям).
 """
 
+import hashlib
 import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from src.artifacts import DEFAULT_FILE_MODE, atomic_write_bytes
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class DocumentSection:
+    """Секция собранного документа и ее положение в markdown."""
+    name: str
+    text: str
+    start: int
+    end: int
+
+
+@dataclass
+class AssembledDocument:
+    """Собранный в памяти документ: markdown и смещения секций."""
+    markdown: str
+    sections: List[DocumentSection] = field(default_factory=list)
+
+    def section(self, name: str) -> Optional[DocumentSection]:
+        """Секция по имени (Introduction, Chapter N, Conclusion)."""
+        return next((section for section in self.sections if section.name == name), None)
+
+
+def header_chunk(title: str, subtitle: str) -> str:
+    """Заголовок документа: первый фрагмент при потоковой записи."""
+    return f"# {title}\n\n## {subtitle}\n\n"
+
+
+def _section_prefix(name: str) -> str:
+    return "" if name == "Introduction" else f"## {name}\n\n"
+
+
+def document_chunk(name: str, text: str) -> str:
+    """
+    Фрагмент документа для секции.
+
+    # START_CONTRACT_document_chunk
+    # Input: name (str) - Introduction, Chapter N или Conclusion, text (str)
+    # Russian Intent: Дать секцию вместе с ее заголовком и разделителями, чтобы фрагменты по порядку складывались в тот же Markdown, что и сборка целиком
+    # Output: str
+    # END_CONTRACT_document_chunk
+    """
+    ending = "\n" if name == "Conclusion" else "\n\n"
+    return f"{_section_prefix(name)}{text}{ending}"
+
+
+def document_chunks(
+    title: str,
+    subtitle: str,
+    introduction: str,
+    chapters: Iterable[str],
+    conclusions: str
+) -> Iterator[str]:
+    """Фрагменты документа по порядку: заголовок, введение, главы, заключение."""
+    yield header_chunk(title, subtitle)
+    yield document_chunk("Introduction", introduction)
+    for i, chapter in enumerate(chapters, 1):
+        yield document_chunk(f"Chapter {i}", chapter)
+    yield document_chunk("Conclusion", conclusions)
+
+
+def assemble_document(
+    title: str,
+    subtitle: str,
+    introduction: str,
+    chapters: List[str],
+    conclusions: str
+) -> AssembledDocument:
+    """
+    Собирает документ в памяти.
+
+    # START_CONTRACT_assemble_document
+    # Input: title, subtitle, introduction, chapters (List[str]), conclusions
+    # Russian Intent: Сшить секции в фиксированном порядке и запомнить смещения текста каждой секции, чтобы редактор получал документ без записи на диск
+    # Output: AssembledDocument
+    # END_CONTRACT_assemble_document
+    """
+    logger.debug("[Export][assemble_document] Belief: Сборка документа | Input: title, subtitle, introduction, chapters, conclusions | Expected: AssembledDocument")
+
+    sections: List[DocumentSection] = []
+    chunks = [header_chunk(title, subtitle)]
+    offset = len(chunks[0])
+    named = [("Introduction", introduction)] + [(f"Chapter {i}", chapter) for i, chapter in enumerate(chapters, 1)]
+    for name, text in named + [("Conclusion", conclusions)]:
+        chunk = document_chunk(name, text)
+        start = offset + len(_section_prefix(name))
+        sections.append(DocumentSection(name, text, start, start + len(text)))
+        chunks.append(chunk)
+        offset += len(chunk)
+
+    return AssembledDocument("".join(chunks), sections)
+
+
 def assemble_document_sections(
     title: str,
     subtitle: str,
@@ -27,24 +124,32 @@ def assemble_document_sections(
     # Output: str - собранный документ
     # END_CONTRACT_assemble_document_sections
     """
-    logger.debug("[Export][assemble_document_sections] Belief: Сборка документа | Input: title, subtitle, introduction, chapters, conclusions | Expected: str")
+    return assemble_document(title, subtitle, introduction, chapters, conclusions).markdown
 
-    parts = []
 
-    parts.append(f"# {title}\n")
-    parts.append(f"## {subtitle}\n")
-    parts.append(f"{introduction}\n")
-
-    for i, chapter in enumerate(chapters, 1):
-        parts.append(f"## Chapter {i}\n")
-        parts.append(f"{chapter}\n")
-
-    parts.append("## Conclusion\n")
-    parts.append(f"{conclusions}\n")
+def render_preview(
+    title: str,
+    subtitle: str,
+    introduction: str,
+    chapters: List[Optional[str]],
+    conclusions: str,
+    chapter_titles: Optional[List[str]] = None
+) -> str:
+    """
+    Собирает промежуточный документ для предпросмотра.
 
-    document = "\n".join(parts)
-    logger.debug("[Export][assemble_document_sections] Belief: Документ собран | Input: title, subtitle, introduction, chapters, conclusions | Expected: str")
-    return document
+    # START_CONTRACT_render_preview
+    # Input: title, subtitle, introduction, chapters (List[Optional[str]]) - None для ненаписанных глав, conclusions, chapter_titles (Optional[List[str]])
+    # Russian Intent: Показать документ в порядке итоговой сборки до завершения pipeline, отметив главы в работе
+    # Output: str - Markdown предпросмотра
+    # END_CONTRACT_render_preview
+    """
+    titles = chapter_titles or []
+    filled = [
+        chapter if chapter is not None else f"_{titles[i] if i < len(titles) else 'Глава'}: пишется…_"
+        for i, chapter in enumerate(chapters)
+    ]
+    return assemble_document_sections(title, subtitle, introduction, filled, conclusions)
 
 
 def ensure_outputs_dir(outputs_dir: str = "outputs") -> Path:
@@ -66,12 +171,12 @@ def ensure_outputs_dir(outputs_dir: str = "outputs") -> Path:
     return path
 
 
-def build_output_filename(prefix: str = "lead_magnet") -> str:
+def build_output_filename(prefix: str = "lead_magnet", run_id: str = "") -> str:
     """
     Генерирует имя файла с timestamp.
 
     # START_CONTRACT_build_output_filename
-    # Input: prefix (str)
+    # Input: prefix (str), run_id (str) - id запуска, делает имя уникальным при завершении запусков в одну секунду
     # Russian Intent: Сгенерировать имя файла с временной меткой
     # Output: str - имя файла
     # END_CONTRACT_build_output_filename
@@ -79,7 +184,8 @@ def build_output_filename(prefix: str = "lead_magnet") -> str:
     logger.debug("[Export][build_output_filename] Belief: Генерация имени файла | Input: prefix | Expected: str")
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{prefix}_{timestamp}.md"
+    suffix = f"_{run_id[:12]}" if run_id else ""
+    filename = f"{prefix}_{timestamp}{suffix}.md"
 
     logger.debug(f"[Export][build_output_filename] Belief: Имя файла сгенерировано | Input: prefix | Expected: str, Result: {filename}")
     return filename
@@ -91,44 +197,139 @@ def save_markdown_file(content: str, filepath: Path) -> Path:
 
     # START_CONTRACT_save_markdown_file
     # Input: content (str), filepath (Path)
-    # Russian Intent: Сохранить содержимое в файл
+    # Russian Intent: Атомарно сохранить содержимое в файл
     # Output: Path - путь к сохраненному файлу
     # END_CONTRACT_save_markdown_file
     """
     logger.debug("[Export][save_markdown_file] Belief: Сохранение файла | Input: content, filepath | Expected: Path")
 
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(content)
+    atomic_write_bytes(filepath, content.encode("utf-8"))
 
     logger.debug(f"[Export][save_markdown_file] Belief: Файл сохранен | Input: content, filepath | Expected: Path, Result: {filepath}")
     return filepath
 
 
+class StreamingMarkdownWriter:
+    """Потоковая запись документа по секциям во временный файл с атомарной заменой при завершении."""
+
+    def __init__(self, filepath: Path, sections: Optional[int] = None):
+        """
+        Открывает временный файл документа.
+
+        # START_CONTRACT_StreamingMarkdownWriter_init
+        # Input: filepath (Path) - итоговый путь, sections (Optional[int]) - ожидаемое число фрагментов
+        # Russian Intent: Дописывать фрагменты на диск по мере готовности, держа в памяти только пришедшие не по порядку, и публиковать файл одной заменой
+        # Output: None
+        # END_CONTRACT_StreamingMarkdownWriter_init
+        """
+        logger.debug(f"[Export][StreamingMarkdownWriter_init] Belief: Открытие потоковой записи | Input: filepath={filepath}, sections={sections} | Expected: Writer готов")
+
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.filepath.parent, prefix=f".{self.filepath.name}.", suffix=".partial")
+        self._file = os.fdopen(fd, "wb")
+        # Частичный документ: непрерывный префикс готовых фрагментов, можно отдавать до завершения
+        self.partial_path = Path(tmp_name)
+        self.sections = sections
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._pending: Dict[int, bytes] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def written_sections(self) -> int:
+        """Число фрагментов, уже записанных в файл."""
+        return self._next
+
+    @property
+    def sha256(self) -> str:
+        """sha256 записанного содержимого."""
+        return self._digest.hexdigest()
+
+    def put(self, index: int, chunk: str) -> None:
+        """Фрагмент с номером index; записывается, как только записаны все предыдущие."""
+        with self._lock:
+            if self._closed:
+                raise ValueError("Writer is closed")
+            if index < self._next or index in self._pending or (self.sections is not None and index >= self.sections):
+                raise ValueError(f"Unexpected section index {index}")
+            self._pending[index] = chunk.encode("utf-8")
+            while self._next in self._pending:
+                data = self._pending.pop(self._next)
+                self._file.write(data)
+                self._digest.update(data)
+                self.size += len(data)
+                self._next += 1
+            self._file.flush()
+
+    def read_partial(self) -> str:
+        """Уже записанная часть документа."""
+        with self._lock:
+            if self._closed:
+                return self.filepath.read_text(encoding="utf-8")
+            return self.partial_path.read_text(encoding="utf-8")
+
+    def commit(self) -> Path:
+        """Проверяет полноту, сбрасывает на диск и атомарно публикует файл."""
+        with self._lock:
+            if self._pending or (self.sections is not None and self._next != self.sections):
+                raise ValueError(f"Document is incomplete: {self._next} of {self.sections} sections written")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.chmod(self.partial_path, DEFAULT_FILE_MODE)
+            os.replace(self.partial_path, self.filepath)
+            self._closed = True
+        logger.debug(f"[Export][StreamingMarkdownWriter_commit] Belief: Документ опубликован | Input: sections={self._next} | Expected: Path, Result: {self.filepath}")
+        return self.filepath
+
+    def abort(self) -> None:
+        """Удаляет незавершенный файл (после commit ничего не делает)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._file.close()
+            self.partial_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "StreamingMarkdownWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.abort()
+
+
 def export_lead_magnet(
     title: str,
     subtitle: str,
     introduction: str,
     chapters: List[str],
     conclusions: str,
-    outputs_dir: str = "outputs"
+    outputs_dir: str = "outputs",
+    filename: Optional[str] = None
 ) -> str:
     """
     Полный цикл экспорта лид-магнита.
 
     # START_CONTRACT_export_lead_magnet
-    # Input: title, subtitle, introduction, chapters, conclusions, outputs_dir
+    # Input: title, subtitle, introduction, chapters, conclusions, outputs_dir, filename (Optional[str]) - по умолчанию build_output_filename()
     # Russian Intent: Собрать и сохранить лид-магнит в файл
     # Output: str - путь к сохраненному файлу
     # END_CONTRACT_export_lead_magnet
     """
     logger.debug("[Export][export_lead_magnet] Belief: Экспорт лид-магнита | Input: title, subtitle, introduction, chapters, conclusions, outputs_dir | Expected: str")
 
-    document = assemble_document_sections(title, subtitle, introduction, chapters, conclusions)
     dir_path = ensure_outputs_dir(outputs_dir)
-    filename = build_output_filename()
+    filename = filename or build_output_filename()
     filepath = dir_path / filename
 
-    save_markdown_file(document, filepath)
+    # Документ не склеивается в памяти: фрагменты пишутся в файл по одному
+    with StreamingMarkdownWriter(filepath, sections=len(chapters) + 3) as writer:
+        for index, chunk in enumerate(document_chunks(title, subtitle, introduction, chapters, conclusions)):
+            writer.put(index, chunk)
+        writer.commit()
 
     logger.debug(f"[Export][export_lead_magnet] Belief: Лид-магнит экспортирован | Input: title, subtitle, introduction, chapters, conclusions, outputs_dir | Expected: str, Result: {filepath}")
     return str(filepath)
@@ -0,0 +1,670 @@
+"""
+Persistent Job Queue Module
+Хранит запуски GenerationOrchestrator в SQLite-очереди и исполняет их в пуле worker-процессов.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Generator, Iterator, List, Optional, Tuple
+
+from src.config import UiSettings
+from src.coalescing import build_run_key
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+
+TERMINAL_JOB_STATUSES = (JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    settings_json TEXT NOT NULL,
+    run_key TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    result_path TEXT,
+    partial_path TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    logs TEXT,
+    markdown TEXT,
+    filepath TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobLeaseLostError(RuntimeError):
+    """Worker больше не владеет арендой задания: задание отменено или перехвачено другим worker."""
+
+
+@dataclass
+class JobRecord:
+    """Запись задания генерации."""
+    job_id: str
+    topic: str
+    settings: UiSettings
+    status: str
+    attempts: int = 0
+    worker_id: Optional[str] = None
+    result_path: Optional[str] = None
+    partial_path: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+
+@dataclass
+class JobEvent:
+    """Событие прогресса задания."""
+    job_id: str
+    seq: int
+    logs: Optional[str]
+    markdown: Optional[str]
+    filepath: Optional[str]
+
+
+class JobQueue:
+    """Долговечная очередь заданий генерации на SQLite."""
+
+    def __init__(self, db_path: str = "jobs.sqlite3", lease_seconds: float = 120.0, max_attempts: int = 3):
+        """
+        Инициализация очереди.
+
+        # START_CONTRACT_JobQueue_init
+        # Input: db_path (str), lease_seconds (float), max_attempts (int)
+        # Russian Intent: Открыть файл очереди, общий для процессов и машин, и создать схему
+        # Output: None
+        # END_CONTRACT_JobQueue_init
+        """
+        logger.debug("[Jobs][JobQueue_init] Belief: Инициализация очереди заданий | Input: db_path, lease_seconds, max_attempts | Expected: Очередь готова")
+
+        if lease_seconds <= 0:
+            raise ValueError("lease_seconds must be > 0")
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be >= 1")
+
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        parent = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(parent, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+
+        logger.debug("[Jobs][JobQueue_init] Belief: Очередь заданий готова | Input: db_path | Expected: Очередь готова")
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Добавляет колонки run_key и partial_path в очереди, созданные до их появления."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "run_key" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN run_key TEXT")
+        if "partial_path" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN partial_path TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_run_key ON jobs (run_key, status)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Открывает соединение в autocommit-режиме (транзакции управляются явно)."""
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=30000")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, topic: str, settings: UiSettings, coalesce: bool = True) -> str:
+        """
+        Ставит задание в очередь.
+
+        # START_CONTRACT_submit
+        # Input: topic (str), settings (UiSettings), coalesce (bool)
+        # Russian Intent: Сохранить задание генерации до его исполнения; идентичное незавершенное задание переиспользуется
+        # Output: str - job_id (новый или уже выполняющегося идентичного задания)
+        # END_CONTRACT_submit
+        """
+        logger.debug("[Jobs][submit] Belief: Постановка задания в очередь | Input: topic, settings, coalesce | Expected: job_id")
+
+        if not topic or not topic.strip():
+            raise ValueError("Topic must be a non-empty string")
+
+        run_key = build_run_key(topic, settings)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if coalesce:
+                    row = conn.execute(
+                        "SELECT job_id FROM jobs WHERE run_key = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                        (run_key, JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+                    ).fetchone()
+                    if row is not None:
+                        conn.execute("COMMIT")
+                        logger.info(f"[Jobs] Coalesced submission into in-flight job {row['job_id']}")
+                        return row["job_id"]
+
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (job_id, topic, settings_json, run_key, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, topic, json.dumps(asdict(settings), ensure_ascii=False), run_key, JOB_STATUS_QUEUED, now, now)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        logger.info(f"[Jobs] Job {job_id} queued")
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[JobRecord]:
+        """
+        Захватывает следующее задание для исполнения.
+
+        # START_CONTRACT_claim
+        # Input: worker_id (str)
+        # Russian Intent: Атомарно взять старейшее задание из очереди или с истекшей арендой упавшего worker
+        # Output: Optional[JobRecord]
+        # END_CONTRACT_claim
+        """
+        logger.debug("[Jobs][claim] Belief: Захват задания | Input: worker_id | Expected: Optional[JobRecord]")
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._fail_exhausted(conn, now)
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker_id = ?, partial_path = NULL, attempts = attempts + 1, lease_expires_at = ?, updated_at = ? WHERE job_id = ?",
+                    (JOB_STATUS_RUNNING, worker_id, now + self.lease_seconds, now, row["job_id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        logger.info(f"[Jobs] Job {row['job_id']} claimed by {worker_id}")
+        return self.get_job(row["job_id"])
+
+    def _fail_exhausted(self, conn: sqlite3.Connection, now: float) -> None:
+        """Завершает с ошибкой задания, исчерпавшие попытки после падений worker."""
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+            (JOB_STATUS_FAILED, "Worker lost: max attempts exceeded", now, JOB_STATUS_RUNNING, now, self.max_attempts)
+        )
+
+    def release_worker_jobs(self, worker_ids: List[str]) -> int:
+        """
+        Возвращает в очередь задания worker, которые заведомо не работают.
+
+        # START_CONTRACT_release_worker_jobs
+        # Input: worker_ids (List[str])
+        # Russian Intent: Вернуть в очередь задания worker, о которых оператор точно знает, что они мертвы, не дожидаясь истечения аренды; пул при старте это не вызывает, id могут принадлежать живому процессу
+        # Output: int - число возвращенных заданий
+        # END_CONTRACT_release_worker_jobs
+        """
+        if not worker_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in worker_ids)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, lease_expires_at = NULL, updated_at = ? "
+                f"WHERE status = ? AND attempts >= ? AND worker_id IN ({placeholders})",
+                (JOB_STATUS_FAILED, "Worker lost: max attempts exceeded", now, JOB_STATUS_RUNNING, self.max_attempts, *worker_ids)
+            )
+            cursor = conn.execute(
+                f"UPDATE jobs SET status = ?, lease_expires_at = NULL, updated_at = ? WHERE status = ? AND worker_id IN ({placeholders})",
+                (JOB_STATUS_QUEUED, now, JOB_STATUS_RUNNING, *worker_ids)
+            )
+            released = cursor.rowcount
+        if released:
+            logger.info(f"[Jobs] Released {released} interrupted jobs back to the queue")
+        return released
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """
+        Продлевает аренду задания исполняющим worker.
+
+        # START_CONTRACT_heartbeat
+        # Input: job_id (str), worker_id (str) - владелец аренды
+        # Russian Intent: Не дать аренде истечь во время долгой стадии (вызов LLM дольше lease_seconds), чтобы задание не захватил второй worker
+        # Output: bool - False, если задание уже не выполняется этим worker (отменено, аренда перехвачена)
+        # END_CONTRACT_heartbeat
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE job_id = ? AND status = ? AND worker_id = ?",
+                (now + self.lease_seconds, now, job_id, JOB_STATUS_RUNNING, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def append_event(
+        self,
+        job_id: str,
+        logs: Optional[str],
+        markdown: Optional[str] = None,
+        filepath: Optional[str] = None,
+        worker_id: Optional[str] = None
+    ) -> int:
+        """
+        Добавляет событие прогресса и продлевает аренду.
+
+        # START_CONTRACT_append_event
+        # Input: job_id (str), logs, markdown, filepath, worker_id (Optional[str]) - владелец аренды; без него событие пишется безусловно
+        # Russian Intent: Сохранить событие прогресса для подписчиков задания; событие worker, потерявшего аренду, не смешивается с событиями нового владельца
+        # Output: int - порядковый номер события; JobLeaseLostError, если задание уже не выполняется этим worker
+        # END_CONTRACT_append_event
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if worker_id is not None:
+                    # Проверка аренды и вставка - одна транзакция: перехват между ними невозможен
+                    renewed = conn.execute(
+                        "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE job_id = ? AND status = ? AND worker_id = ?",
+                        (now + self.lease_seconds, now, job_id, JOB_STATUS_RUNNING, worker_id)
+                    ).rowcount
+                    if not renewed:
+                        raise JobLeaseLostError(f"Worker {worker_id} no longer owns job {job_id}")
+                seq = conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,)
+                ).fetchone()[0]
+                conn.execute(
+                    "INSERT INTO job_events (job_id, seq, logs, markdown, filepath, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, seq, logs, markdown, filepath, now)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def set_partial_path(self, job_id: str, partial_path: Optional[str], worker_id: str) -> bool:
+        """Публикует путь частичного документа выполняющегося задания (только владельцем аренды)."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET partial_path = ?, updated_at = ? WHERE job_id = ? AND status = ? AND worker_id = ?",
+                (partial_path, time.time(), job_id, JOB_STATUS_RUNNING, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, result_path: Optional[str], worker_id: Optional[str] = None) -> bool:
+        """Отмечает задание успешно завершенным (с worker_id - только если аренда все еще у этого worker)."""
+        return self._finish(job_id, JOB_STATUS_SUCCEEDED, result_path=result_path, worker_id=worker_id)
+
+    def fail(self, job_id: str, error: str, worker_id: Optional[str] = None) -> bool:
+        """Отмечает задание завершенным с ошибкой (с worker_id - только если аренда все еще у этого worker)."""
+        return self._finish(job_id, JOB_STATUS_FAILED, error=error, worker_id=worker_id)
+
+    def cancel(self, job_id: str, reason: str = "stopped by user") -> bool:
+        """
+        Отменяет ожидающее или выполняющееся задание.
+
+        # START_CONTRACT_cancel
+        # Input: job_id (str), reason (str)
+        # Russian Intent: Снять задание с исполнения; worker замечает отмену и прерывает вызовы провайдеров
+        # Output: bool - True, если задание было отменено этим вызовом
+        # END_CONTRACT_cancel
+        """
+        logger.debug(f"[Jobs][cancel] Belief: Отмена задания | Input: job_id={job_id}, reason={reason} | Expected: bool")
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, partial_path = NULL, lease_expires_at = NULL, updated_at = ? WHERE job_id = ? AND status IN (?, ?)",
+                (JOB_STATUS_CANCELLED, reason, time.time(), job_id, JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+            )
+        return cursor.rowcount > 0
+
+    def _finish(
+        self,
+        job_id: str,
+        status: str,
+        result_path: Optional[str] = None,
+        error: Optional[str] = None,
+        worker_id: Optional[str] = None
+    ) -> bool:
+        """Переводит задание в терминальный статус (отмененное задание и задание, перехваченное другим worker, не перезаписываются)."""
+        logger.debug(f"[Jobs][_finish] Belief: Завершение задания | Input: job_id={job_id}, status={status}, worker_id={worker_id} | Expected: bool")
+        query = "UPDATE jobs SET status = ?, result_path = ?, partial_path = NULL, error = ?, lease_expires_at = NULL, updated_at = ? WHERE job_id = ? AND status != ?"
+        params = [status, result_path, error, time.time(), job_id, JOB_STATUS_CANCELLED]
+        if worker_id is not None:
+            query += " AND status = ? AND worker_id = ?"
+            params += [JOB_STATUS_RUNNING, worker_id]
+        with self._connect() as conn:
+            finished = conn.execute(query, params).rowcount > 0
+        if not finished and worker_id is not None:
+            logger.warning(f"[Jobs] Worker {worker_id} no longer owns job {job_id}, result discarded")
+        return finished
+
+    def get_job(self, job_id: str) -> Optional[JobRecord]:
+        """Возвращает задание по идентификатору."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return JobRecord(
+            job_id=row["job_id"],
+            topic=row["topic"],
+            settings=UiSettings(**json.loads(row["settings_json"])),
+            status=row["status"],
+            attempts=row["attempts"],
+            worker_id=row["worker_id"],
+            result_path=row["result_path"],
+            partial_path=row["partial_path"],
+            error=row["error"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"]
+        )
+
+    def list_events(self, job_id: str, after_seq: int = 0) -> List[JobEvent]:
+        """Возвращает события задания после указанного номера."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after_seq)
+            ).fetchall()
+        return [JobEvent(r["job_id"], r["seq"], r["logs"], r["markdown"], r["filepath"]) for r in rows]
+
+    def subscribe(
+        self,
+        job_id: str,
+        poll_interval: float = 0.5
+    ) -> Generator[Tuple[str, Optional[str], Optional[str]], None, None]:
+        """
+        Стримит события задания до его завершения.
+
+        # START_CONTRACT_subscribe
+        # Input: job_id (str), poll_interval (float)
+        # Russian Intent: Отдавать подписчику события прогресса в формате pipeline, в том числе после рестарта сервера
+        # Output: Generator - стрим логов, markdown, filepath
+        # END_CONTRACT_subscribe
+        """
+        logger.debug(f"[Jobs][subscribe] Belief: Подписка на задание | Input: job_id={job_id} | Expected: Generator")
+
+        last_seq = 0
+        while True:
+            job = self.get_job(job_id)
+            if job is None:
+                raise ValueError(f"Unknown job: {job_id}")
+
+            for event in self.list_events(job_id, last_seq):
+                last_seq = event.seq
+                yield (event.logs or "", event.markdown, event.filepath)
+
+            if job.status in TERMINAL_JOB_STATUSES:
+                # Догоняем события, записанные между чтением статуса и событий
+                for event in self.list_events(job_id, last_seq):
+                    last_seq = event.seq
+                    yield (event.logs or "", event.markdown, event.filepath)
+                if job.status == JOB_STATUS_FAILED:
+                    yield (f"❌ {job.error}", None, None)
+                elif job.status == JOB_STATUS_CANCELLED:
+                    yield (f"⏹ Задание отменено: {job.error}", None, None)
+                return
+
+            time.sleep(poll_interval)
+
+
+def execute_job(
+    queue: JobQueue,
+    job: JobRecord,
+    llm_client,
+    tavily_client,
+    app_config,
+    cancel_poll_interval: float = 1.0
+) -> None:
+    """
+    Исполняет одно задание через GenerationOrchestrator.
+
+    # START_CONTRACT_execute_job
+    # Input: queue (JobQueue), job (JobRecord), llm_client, tavily_client, app_config (AppConfig), cancel_poll_interval (float)
+    # Russian Intent: Прогнать pipeline задания и записать события и итог в очередь; отмена задания прерывает вызовы провайдеров
+    # Output: None
+    # END_CONTRACT_execute_job
+    """
+    from src.cancellation import CancelToken
+    from src.errors import RunCancelledError, StageError, format_ui_error
+    from src.orchestrator import GenerationOrchestrator
+
+    logger.debug(f"[Jobs][execute_job] Belief: Исполнение задания | Input: job_id={job.job_id} | Expected: None")
+
+    worker_id = job.worker_id
+    if job.attempts > 1:
+        queue.append_event(job.job_id, f"♻️ Повторный запуск задания (попытка {job.attempts})", worker_id=worker_id)
+
+    cancel_token = CancelToken(name=f"job-{job.job_id[:8]}")
+    finished = threading.Event()
+    threading.Thread(
+        target=_watch_job,
+        args=(queue, job.job_id, worker_id, cancel_token, finished, cancel_poll_interval),
+        name=f"job-watch-{job.job_id[:8]}",
+        daemon=True
+    ).start()
+
+    orchestrator = GenerationOrchestrator(app_config, job.settings, llm_client, tavily_client)
+    pipeline = orchestrator.run_pipeline(job.topic, cancel_token=cancel_token)
+    result_path = None
+    partial_path = None
+    try:
+        for logs, markdown, filepath in pipeline:
+            queue.append_event(job.job_id, logs, markdown, filepath, worker_id=worker_id)
+            if filepath is not None:
+                result_path = filepath
+            # Частичный документ доступен для скачивания через API, пока задание выполняется
+            current = getattr(orchestrator, "partial_path", None)
+            current_partial = str(current) if current is not None else None
+            if current_partial != partial_path:
+                partial_path = current_partial
+                queue.set_partial_path(job.job_id, partial_path, worker_id)
+    except JobLeaseLostError:
+        # Задание отменено или принадлежит другому worker: запуск останавливается, итог не записывается
+        logger.warning(f"[Jobs] Worker {worker_id} lost the lease of job {job.job_id}, stopping the run")
+        cancel_token.cancel("job lease lost")
+        return
+    except StageError as e:
+        queue.fail(job.job_id, format_ui_error(e), worker_id=worker_id)
+        return
+    except RunCancelledError as e:
+        # Отмена через cancel() уже записана; иначе истек дедлайн запуска
+        queue.fail(job.job_id, f"Run cancelled: {e.reason}", worker_id=worker_id)
+        return
+    except Exception as e:
+        logger.error(f"[Jobs][execute_job] Unexpected error: {e}")
+        queue.fail(job.job_id, f"Unexpected error: {type(e).__name__}", worker_id=worker_id)
+        return
+    finally:
+        pipeline.close()
+        finished.set()
+
+    queue.complete(job.job_id, result_path, worker_id=worker_id)
+
+
+def _watch_job(
+    queue: JobQueue,
+    job_id: str,
+    worker_id: Optional[str],
+    cancel_token,
+    finished: threading.Event,
+    poll_interval: float
+) -> None:
+    """Продлевает аренду, пока задание выполняется, и отменяет токен при отмене задания или потере аренды."""
+    heartbeat_interval = queue.lease_seconds / 4
+    last_heartbeat = time.monotonic()
+    while not finished.wait(poll_interval):
+        job = queue.get_job(job_id)
+        if job is None or job.status == JOB_STATUS_CANCELLED:
+            cancel_token.cancel(job.error if job is not None and job.error else "job cancelled")
+            return
+        if worker_id is None or time.monotonic() - last_heartbeat < heartbeat_interval:
+            continue
+        try:
+            renewed = queue.heartbeat(job_id, worker_id)
+        except sqlite3.Error as e:
+            # Временная ошибка БД: следующая попытка до истечения аренды
+            logger.warning(f"[Jobs] Heartbeat for job {job_id} failed: {e}")
+            continue
+        last_heartbeat = time.monotonic()
+        if not renewed:
+            # Аренду перехватил другой worker: второй параллельный запуск недопустим
+            logger.warning(f"[Jobs] Worker {worker_id} lost the lease of job {job_id}, stopping the run")
+            cancel_token.cancel("job lease lost")
+            return
+
+
+def run_worker(
+    db_path: str,
+    worker_id: Optional[str] = None,
+    poll_interval: float = 1.0,
+    stop_event=None,
+    metrics_port: int = 0
+) -> None:
+    """
+    Цикл worker-процесса: забирает задания и исполняет их.
+
+    # START_CONTRACT_run_worker
+    # Input: db_path (str), worker_id (Optional[str]), poll_interval (float), stop_event (Optional[Event]), metrics_port (int) - порт /metrics этого worker, 0 = не отдавать
+    # Russian Intent: Исполнять задания из общей очереди до сигнала остановки; метрики запусков отдавать из процесса, где они выполняются
+    # Output: None (блокирующий цикл)
+    # END_CONTRACT_run_worker
+    """
+    from src.config import load_env_config
+    from src.clients import build_clients
+    from src.metrics import start_metrics_server
+    from src.tracing import configure_tracing
+    from src.warmup import warm_up
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    logger.info(f"[Jobs] Worker {worker_id} started on {db_path}")
+
+    # Занятый порт метрик не должен останавливать исполнение заданий
+    if metrics_port:
+        try:
+            start_metrics_server(metrics_port)
+        except OSError as e:
+            logger.warning(f"[Jobs] Worker {worker_id} metrics server on port {metrics_port} failed: {e}")
+
+    queue = JobQueue(db_path)
+    app_config = load_env_config()
+    configure_tracing(app_config)
+    llm_client, tavily_client = build_clients(app_config)
+    warm_up(llm_client, tavily_client, mode=app_config.warmup_mode, timeout=app_config.warmup_timeout_seconds)
+
+    while stop_event is None or not stop_event.is_set():
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        execute_job(queue, job, llm_client, tavily_client, app_config)
+
+    logger.info(f"[Jobs] Worker {worker_id} stopped")
+
+
+def worker_metrics_port(metrics_port: int, index: int) -> int:
+    """Порт /metrics worker с номером index: следующие за METRICS_PORT, 0 - метрики отключены."""
+    return metrics_port + 1 + index if metrics_port else 0
+
+
+def start_worker_pool(db_path: str, worker_count: int, metrics_port: int = 0) -> List[multiprocessing.Process]:
+    """
+    Запускает пул worker-процессов.
+
+    # START_CONTRACT_start_worker_pool
+    # Input: db_path (str), worker_count (int), metrics_port (int) - METRICS_PORT процесса; worker i отдает /metrics на metrics_port + 1 + i
+    # Russian Intent: Масштабировать исполнение заданий на несколько ядер
+    # Output: List[Process] - запущенные daemon-процессы
+    # END_CONTRACT_start_worker_pool
+    """
+    logger.debug("[Jobs][start_worker_pool] Belief: Запуск пула worker-процессов | Input: db_path, worker_count | Expected: List[Process]")
+
+    if worker_count < 1:
+        raise ValueError("worker_count must be >= 1")
+
+    # Уникальные id пула: второй пул на той же машине не трогает чужие задания; задания упавших worker возвращает истечение аренды
+    pool_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    worker_ids = [f"{pool_id}-w{i}" for i in range(worker_count)]
+
+    processes = []
+    for i, worker_id in enumerate(worker_ids):
+        process = multiprocessing.Process(
+            target=run_worker,
+            kwargs={"db_path": db_path, "worker_id": worker_id, "metrics_port": worker_metrics_port(metrics_port, i)},
+            name=f"lead-magnet-worker-{i}",
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    logger.info(f"[Jobs] Started {worker_count} workers on {db_path}")
+    return processes
+
+
+def main() -> None:
+    """
+    CLI для запуска worker-процессов на отдельной машине с общим файлом очереди.
+
+    # START_CONTRACT_jobs_main
+    # Input: None (аргументы командной строки)
+    # Russian Intent: Запустить N worker-процессов вне Gradio-сервера
+    # Output: None (блокирующий запуск)
+    # END_CONTRACT_jobs_main
+    """
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Lead magnet generation workers")
+    parser.add_argument("--db", default=os.getenv("JOB_QUEUE_PATH") or "jobs.sqlite3")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--metrics-port", type=int, default=None, help="worker i отдает /metrics на порту + 1 + i (по умолчанию METRICS_PORT)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    metrics_port = args.metrics_port if args.metrics_port is not None else int(os.getenv("METRICS_PORT") or 0)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    processes = start_worker_pool(args.db, args.workers, metrics_port)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Load Test Module
+Нагрузочный прогон события генерации Gradio через gradio_client с нарастающим числом одновременных сессий.
+
+Запуск против локальных заглушек провайдеров (приложение и заглушка поднимаются в процессе):
+    python -m src.loadtest --users 1,4,8 --runs-per-user 2 --gradio-concurrency 4
+Против уже запущенного инстанса:
+    python -m src.loadtest --url http://127.0.0.1:7861 --users 1,4,8
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+API_NAME = "/generate"
+POLL_INTERVAL = 0.02
+
+
+@dataclass
+class SessionResult:
+    """Замеры одной генерации, секунды от отправки запроса."""
+    succeeded: bool
+    queue_wait: Optional[float] = None
+    first_log: Optional[float] = None
+    first_preview: Optional[float] = None
+    final_document: Optional[float] = None
+    total: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class LevelReport:
+    """Итог одного уровня нагрузки."""
+    users: int
+    completed: int
+    failed: int
+    wall_seconds: float
+    throughput_per_minute: float
+    queue_wait_p50: Optional[float]
+    queue_wait_p95: Optional[float]
+    first_log_p50: Optional[float]
+    first_log_p95: Optional[float]
+    first_preview_p50: Optional[float]
+    first_preview_p95: Optional[float]
+    final_document_p50: Optional[float]
+    final_document_p95: Optional[float]
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Перцентиль по методу ближайшего ранга (None для пустой выборки)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q * len(ordered)))
+    return round(ordered[rank - 1], 3)
+
+
+def run_session(client, topic: str, chapters: int, words: int, preset: str) -> SessionResult:
+    """
+    Выполняет одну генерацию через API Gradio и замеряет этапы.
+
+    # START_CONTRACT_run_session
+    # Input: client (gradio_client.Client), topic (str), chapters (int), words (int), preset (str)
+    # Russian Intent: Замерить ожидание в очереди, время до первого лога, первого предпросмотра и итогового документа одной сессии
+    # Output: SessionResult
+    # END_CONTRACT_run_session
+    """
+    from gradio_client.utils import Status
+
+    started_at = time.monotonic()
+    result = SessionResult(succeeded=False)
+    job = client.submit(topic, words, chapters, 0.7, 0.2, True, True, preset, api_name=API_NAME)
+
+    while True:
+        now = time.monotonic() - started_at
+        code = job.status().code
+        outputs = job.outputs()
+        if result.queue_wait is None and (code in (Status.PROCESSING, Status.ITERATING) or outputs):
+            result.queue_wait = now
+        if result.first_log is None and any(output and output[0] for output in outputs):
+            result.first_log = now
+        if result.first_preview is None and any(output and output[1] for output in outputs):
+            result.first_preview = now
+        if code == Status.QUEUE_FULL:
+            result.error = "queue full"
+            break
+        if job.done():
+            # Итоговый документ приходит последним обновлением; предпросмотры ошибочного запуска он сбрасывает
+            outputs = job.outputs()
+            if outputs and outputs[-1] and outputs[-1][1]:
+                result.final_document = round(time.monotonic() - started_at, 3)
+            break
+        time.sleep(POLL_INTERVAL)
+
+    result.total = round(time.monotonic() - started_at, 3)
+    if result.error is None:
+        try:
+            job.result()
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+    # Ошибки pipeline приходят логом без документа
+    if result.error is None and result.final_document is None:
+        result.error = "no document in outputs"
+    result.succeeded = result.error is None
+    return result
+
+
+def run_level(url: str, users: int, runs_per_user: int, chapters: int, words: int, preset: str) -> LevelReport:
+    """
+    Прогоняет один уровень нагрузки: users сессий по runs_per_user генераций подряд.
+
+    # START_CONTRACT_run_level
+    # Input: url (str), users (int), runs_per_user (int), chapters (int), words (int), preset (str)
+    # Russian Intent: Измерить пропускную способность и перцентили задержек при фиксированном числе одновременных пользователей
+    # Output: LevelReport
+    # END_CONTRACT_run_level
+    """
+    from gradio_client import Client
+
+    logger.debug(f"[LoadTest][run_level] Belief: Прогон уровня нагрузки | Input: users={users}, runs_per_user={runs_per_user} | Expected: LevelReport")
+
+    def user(index: int) -> List[SessionResult]:
+        # Отдельный клиент = отдельная сессия Gradio; уникальные темы исключают объединение идентичных запусков
+        client = Client(url, verbose=False, download_files=False)
+        try:
+            return [
+                run_session(client, f"Нагрузочный тест {users}-{index}-{run}", chapters, words, preset)
+                for run in range(runs_per_user)
+            ]
+        finally:
+            client.close()
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        sessions = [result for results in pool.map(user, range(users)) for result in results]
+    wall_seconds = time.monotonic() - started_at
+
+    completed = [s for s in sessions if s.succeeded]
+    return LevelReport(
+        users=users,
+        completed=len(completed),
+        failed=len(sessions) - len(completed),
+        wall_seconds=round(wall_seconds, 3),
+        throughput_per_minute=round(len(completed) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        queue_wait_p50=percentile([s.queue_wait for s in completed], 0.5),
+        queue_wait_p95=percentile([s.queue_wait for s in completed], 0.95),
+        first_log_p50=percentile([s.first_log for s in completed], 0.5),
+        first_log_p95=percentile([s.first_log for s in completed], 0.95),
+        first_preview_p50=percentile([s.first_preview for s in completed], 0.5),
+        first_preview_p95=percentile([s.first_preview for s in completed], 0.95),
+        final_document_p50=percentile([s.final_document for s in completed], 0.5),
+        final_document_p95=percentile([s.final_document for s in completed], 0.95),
+    )
+
+
+def format_reports(reports: List[LevelReport]) -> str:
+    """Таблица уровней нагрузки для консоли."""
+    def cell(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.2f}"
+
+    header = (
+        f"{'users':>5} {'ok':>4} {'fail':>4} {'runs/min':>8} {'queue p50':>9} {'queue p95':>9} "
+        f"{'log p50':>8} {'log p95':>8} {'prev p50':>8} {'prev p95':>8} {'doc p50':>8} {'doc p95':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in reports:
+        lines.append(
+            f"{r.users:>5} {r.completed:>4} {r.failed:>4} {r.throughput_per_minute:>8.2f} "
+            f"{cell(r.queue_wait_p50):>9} {cell(r.queue_wait_p95):>9} {cell(r.first_log_p50):>8} {cell(r.first_log_p95):>8} "
+            f"{cell(r.first_preview_p50):>8} {cell(r.first_preview_p95):>8} {cell(r.final_document_p50):>8} {cell(r.final_document_p95):>8}"
+        )
+    return "\n".join(lines)
+
+
+@contextmanager
+def _patched_environ(values: Dict[str, str]) -> Iterator[None]:
+    """Временно задает переменные окружения, которые читает load_env_config на каждый запрос."""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextmanager
+def local_target(concurrency_limit: int, queue_max_size: int, stub_args: Optional[Dict[str, float]] = None) -> Iterator[str]:
+    """
+    Поднимает в процессе заглушку провайдеров и приложение Gradio, направленное на нее.
+
+    # START_CONTRACT_local_target
+    # Input: concurrency_limit (int), queue_max_size (int), stub_args (Optional[Dict]) - поля StubConfig
+    # Russian Intent: Нагрузить настоящий HTTP-путь приложения без внешних провайдеров и сравнить настройки очереди Gradio
+    # Output: Iterator[str] - URL приложения
+    # END_CONTRACT_local_target
+    """
+    from src.benchmark import working_directory
+    from src.stub_server import StubConfig, start_stub_server
+    from src.ui import build_ui, configure_queue
+
+    config = StubConfig()
+    config.update(stub_args or {})
+    stub = start_stub_server(config)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    environ = {
+        "LLM_API_KEY": "stub",
+        "LLM_BASE_URL": f"{stub_url}/v1",
+        "LLM_MODEL": "stub-model",
+        "TAVILY_API_KEY": "stub",
+        "TAVILY_BASE_URL": stub_url,
+        "JOB_QUEUE_PATH": "",
+        "CASSETTE_MODE": "off",
+        "NO_PROXY": "localhost,127.0.0.1,::1",
+        "no_proxy": "localhost,127.0.0.1,::1",
+    }
+    with ExitStack() as stack:
+        workdir = stack.enter_context(tempfile.TemporaryDirectory())
+        stack.enter_context(working_directory(workdir))
+        stack.enter_context(_patched_environ(environ))
+        stack.callback(stub.shutdown)
+        demo = configure_queue(build_ui(), concurrency_limit, queue_max_size)
+        _, local_url, _ = demo.launch(server_name="127.0.0.1", prevent_thread_lock=True, quiet=True)
+        stack.callback(demo.close)
+        yield local_url
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    CLI нагрузочного теста.
+
+    # START_CONTRACT_loadtest_main
+    # Input: argv (Optional[Sequence[str]])
+    # Russian Intent: Прогнать нарастающие уровни одновременных сессий и вывести пропускную способность и перцентили
+    # Output: int - код выхода (1, если были неуспешные генерации)
+    # END_CONTRACT_loadtest_main
+    """
+    parser = argparse.ArgumentParser(description="Load test of the Gradio generate endpoint")
+    parser.add_argument("--url", default="", help="URL запущенного приложения; пусто = поднять приложение и заглушки в процессе")
+    parser.add_argument("--users", type=lambda v: [int(p) for p in v.split(",") if p.strip()], default=[1, 2, 4])
+    parser.add_argument("--runs-per-user", type=int, default=2)
+    parser.add_argument("--chapters", type=int, default=3)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--preset", default="custom", help="speed | balanced | thorough | custom")
+    parser.add_argument("--gradio-concurrency", type=int, default=4, help="default_concurrency_limit очереди (локальный режим)")
+    parser.add_argument("--queue-size", type=int, default=0, help="max_size очереди, 0 = без ограничения (локальный режим)")
+    parser.add_argument("--ttft", type=float, default=0.2, help="TTFT заглушки LLM, с (локальный режим)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="скорость токенов заглушки (локальный режим)")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="доля 429 заглушки LLM (локальный режим)")
+    parser.add_argument("--json", dest="json_path", default="", help="сохранить отчет в JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    with ExitStack() as stack:
+        url = args.url or stack.enter_context(local_target(
+            args.gradio_concurrency,
+            args.queue_size,
+            {
+                "ttft": {"median_seconds": args.ttft},
+                "tokens_per_second": args.tokens_per_second,
+                "llm_429_rate": args.llm_429_rate,
+            }
+        ))
+        reports = []
+        print(format_reports([]), flush=True)
+        for users in args.users:
+            reports.append(run_level(url, users, args.runs_per_user, args.chapters, args.words, args.preset))
+            print(format_reports(reports[-1:]).splitlines()[-1], flush=True)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump([asdict(report) for report in reports], f, ensure_ascii=False, indent=2)
+
+    return 0 if all(report.failed == 0 for report in reports) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,326 @@
+"""
+Metrics Module
+Счетчики и гистограммы запусков, стадий и вызовов провайдеров с HTTP-эндпоинтом в формате Prometheus.
+"""
+
+import bisect
+import logging
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы гистограмм длительности (секунды): от быстрых поисковых вызовов до многоминутных стадий
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """Экранирует значение метки по правилам text exposition format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Строит блок меток {a="x",b="y"}."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Число без лишней дробной части."""
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(ABC):
+    """Общая часть метрик: имя, описание, метки и потокобезопасное хранилище значений."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        """Значения меток в порядке объявления; лишние или недостающие метки - ошибка."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Строки значений метрики в text exposition format."""
+
+    def render(self) -> str:
+        """Блок метрики в text exposition format."""
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self._samples())
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        """Увеличивает счетчик; отрицательный шаг запрещен."""
+        if amount < 0:
+            raise ValueError(f"Counter {self.name} can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        """Текущее значение для набора меток."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Значение, которое может расти и убывать."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        """Увеличивает значение."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        """Уменьшает значение."""
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: object) -> None:
+        """Задает значение."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: object) -> float:
+        """Текущее значение для набора меток."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Распределение значений по кумулятивным корзинам (для p95 через histogram_quantile)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> (счетчики по корзинам, +Inf последним; сумма)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        """Добавляет одно наблюдение."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels: object) -> int:
+        """Число наблюдений для набора меток."""
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+            return sum(counts)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса."""
+
+    def __init__(self):
+        """
+        Инициализация реестра.
+
+        # START_CONTRACT_MetricsRegistry_init
+        # Input: None
+        # Russian Intent: Хранить метрики процесса в одном месте для отдачи скрейперу
+        # Output: None
+        # END_CONTRACT_MetricsRegistry_init
+        """
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        """Регистрирует метрику; повторная регистрация возвращает существующую того же типа."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+            raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+        return existing
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Возвращает счетчик с данным именем."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Возвращает gauge с данным именем."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Возвращает гистограмму с данным именем."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Отдает все метрики в текстовом формате Prometheus.
+
+        # START_CONTRACT_render
+        # Input: None
+        # Russian Intent: Сформировать ответ эндпоинта /metrics
+        # Output: str - text exposition format 0.0.4
+        # END_CONTRACT_render
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return "".join(metric.render() for metric in metrics)
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Возвращает реестр метрик процесса."""
+    return _registry
+
+
+# Метрики pipeline и провайдеров
+RUNS_IN_FLIGHT = _registry.gauge("lead_magnet_runs_in_flight", "Runs currently executing in this process")
+RUNS_TOTAL = _registry.counter("lead_magnet_runs_total", "Finished runs by outcome", ("status",))
+RUN_SECONDS = _registry.histogram("lead_magnet_run_duration_seconds", "Run wall time by outcome", ("status",))
+STAGE_SECONDS = _registry.histogram("lead_magnet_stage_duration_seconds", "Stage wall time", ("stage", "status"))
+PROVIDER_CALLS_TOTAL = _registry.counter(
+    "lead_magnet_provider_calls_total", "Provider calls by outcome", ("provider", "operation", "status")
+)
+PROVIDER_CALL_SECONDS = _registry.histogram(
+    "lead_magnet_provider_call_duration_seconds", "Provider call wall time including retries", ("provider", "operation")
+)
+PROVIDER_RETRIES_TOTAL = _registry.counter("lead_magnet_provider_retries_total", "Provider call retries", ("provider",))
+LLM_TOKENS_TOTAL = _registry.counter("lead_magnet_llm_tokens_total", "LLM tokens reported by usage", ("model", "direction"))
+COALESCED_REQUESTS_TOTAL = _registry.counter(
+    "lead_magnet_coalesced_requests_total", "Generation requests by single-flight outcome", ("result",)
+)
+RATE_LIMIT_WAIT_SECONDS = _registry.histogram(
+    "lead_magnet_ratelimit_wait_seconds", "Time a provider call waited in the rate limiter queue", ("provider", "model")
+)
+CONCURRENCY_LIMIT = _registry.gauge("lead_magnet_concurrency_limit", "Current AIMD concurrency limit by provider", ("provider",))
+CONCURRENCY_INFLIGHT = _registry.gauge("lead_magnet_concurrency_inflight", "Provider calls holding a concurrency slot", ("provider",))
+CONCURRENCY_DECISIONS_TOTAL = _registry.counter(
+    "lead_magnet_concurrency_decisions_total", "AIMD limit changes by provider and direction", ("provider", "action")
+)
+WARMUP_SECONDS = _registry.gauge("lead_magnet_warmup_seconds", "Last startup warm-up duration by step", ("target",))
+
+
+def record_provider_call(provider: str, operation: str, status: str, seconds: float, retries: int = 0) -> None:
+    """Учитывает один вызов провайдера (включая все его повторы)."""
+    PROVIDER_CALLS_TOTAL.inc(provider=provider, operation=operation, status=status)
+    PROVIDER_CALL_SECONDS.observe(seconds, provider=provider, operation=operation)
+    if retries:
+        PROVIDER_RETRIES_TOTAL.inc(retries, provider=provider)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Отдает /metrics; остальные пути - 404."""
+
+    registry: MetricsRegistry = _registry
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        """Скрейпы раз в несколько секунд не должны засорять лог."""
+
+
+def start_metrics_server(
+    port: int,
+    host: str = "127.0.0.1",
+    registry: Optional[MetricsRegistry] = None
+) -> ThreadingHTTPServer:
+    """
+    Запускает HTTP-эндпоинт /metrics в фоновом потоке.
+
+    # START_CONTRACT_start_metrics_server
+    # Input: port (int) - 0 = свободный порт, host (str), registry (Optional[MetricsRegistry]) - по умолчанию реестр процесса
+    # Russian Intent: Отдавать метрики скрейперу Prometheus рядом с Gradio, не блокируя UI
+    # Output: ThreadingHTTPServer - server_address содержит фактический порт; shutdown() останавливает
+    # END_CONTRACT_start_metrics_server
+    """
+    logger.debug(f"[Metrics][start_metrics_server] Belief: Запуск эндпоинта метрик | Input: host={host}, port={port} | Expected: ThreadingHTTPServer")
+
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or _registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"[Metrics] Serving /metrics on http://{host}:{server.server_address[1]}")
+    return server
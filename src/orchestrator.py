@@ -3,8 +3,13 @@ Lead Magnet Orchestrator Module
 Управляет полным конвейером генерации (FIFO Pipeline).
 """
 
+import hashlib
 import logging
-from typing import Generator, Tuple, Optional
+import math
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Generator, Iterator, List, Tuple, Optional
 
 from src.config import AppConfig, UiSettings
 from src.clients import LlmClient, TavilyClientWrapper
@@ -18,16 +23,47 @@ from src.schemas import (
     build_section_editor_prompt
 )
 from src.research import (
-    run_sequential_search,
+    ResearchAggregate,
+    run_parallel_search,
+    run_batch_search,
+    plan_batch_queries,
     merge_research_items,
     format_research_context,
     check_search_failure
 )
-from src.export import export_lead_magnet
+from src.export import (
+    StreamingMarkdownWriter,
+    assemble_document,
+    build_output_filename,
+    document_chunk,
+    document_chunks,
+    header_chunk,
+    render_preview
+)
+from src.artifacts import Artifact, ArtifactStore, LocalArtifactBackend
+from src.catalog import KIND_DOCUMENT, KIND_DRAFT, OutputCatalog, get_output_catalog, retention_policy_from
+from src.concurrency import fan_out, FanOutError
+from src.cancellation import CancelToken, use_cancel_token
+from src.tracing import Span, get_tracer, use_span
+from src.metrics import RUNS_IN_FLIGHT, RUNS_TOTAL, RUN_SECONDS, STAGE_SECONDS
+from src.usage import UsageLedger, usage_path_for, use_usage_ledger
+from src.planner import (
+    StageTimingStore,
+    get_timing_store,
+    manual_plan,
+    plan_run,
+    TIMING_CHAPTER,
+    TIMING_FINAL_EDITOR,
+    TIMING_QUERY_BUILDER,
+    TIMING_SEARCH_WAVE,
+    TIMING_SECTION_EDIT,
+    TIMING_STRUCTURE
+)
 from src.errors import (
     emit_log,
     handle_stage_failure,
     PipelineStage,
+    RunCancelledError,
     StageError
 )
 
@@ -42,13 +78,16 @@ class GenerationOrchestrator:
         app_config: AppConfig,
         ui_settings: UiSettings,
         llm_client: LlmClient,
-        tavily_client: TavilyClientWrapper
+        tavily_client: TavilyClientWrapper,
+        timing_store: Optional[StageTimingStore] = None,
+        artifact_store: Optional[ArtifactStore] = None,
+        catalog: Optional[OutputCatalog] = None
     ):
         """
         Инициализация оркестратора.
 
         # START_CONTRACT_GenerationOrchestrator_init
-        # Input: app_config, ui_settings, llm_client, tavily_client
+        # Input: app_config, ui_settings, llm_client, tavily_client, timing_store (Optional[StageTimingStore]) - по умолчанию общий для процесса, artifact_store (Optional[ArtifactStore]) - по умолчанию каталог outputs, catalog (Optional[OutputCatalog]) - по умолчанию из OUTPUT_CATALOG_PATH
         # Russian Intent: Инициализировать оркестратор с клиентами и настройками
         # Output: None
         # END_CONTRACT_GenerationOrchestrator_init
@@ -59,45 +98,278 @@ class GenerationOrchestrator:
         self.ui_settings = ui_settings
         self.llm_client = llm_client
         self.tavily_client = tavily_client
+        self._run_token = CancelToken()
+        self.tracer = get_tracer()
+        self.run_id: Optional[str] = None
+        self._run_span: Optional[Span] = None
+        self._run_status = "ok"
+        self._stage_span: Optional[Span] = None
+        self._stage_name = "run"
+        self.usage = UsageLedger(app_config.llm_prices)
+        self.timing_store = timing_store or get_timing_store(app_config)
+        self.artifact_store = artifact_store or ArtifactStore(LocalArtifactBackend("outputs"))
+        self.catalog = catalog or get_output_catalog(app_config)
+        # Частичный документ (итог или черновик для финального редактора), пока он пишется по секциям (None - не пишется)
+        self.partial_path: Optional[Path] = None
+        self._topic = ""
+        # Итог пакетного запуска: тема -> путь документа или None, если тема не удалась
+        self.batch_results: Dict[str, Optional[str]] = {}
+        # Usage общего этапа пакета (запросы всех тем и поиск)
+        self.batch_usage: Optional[UsageLedger] = None
+        self.plan = manual_plan(ui_settings, app_config)
 
         logger.debug("[Orchestrator][init] Belief: Оркестратор инициализирован | Input: app_config, ui_settings | Expected: Оркестратор готов")
 
-    def run_pipeline(self, topic: str) -> Generator[Tuple[str, Optional[str], Optional[str]], None, None]:
+    def run_pipeline(
+        self,
+        topic: str,
+        cancel_token: Optional[CancelToken] = None
+    ) -> Generator[Tuple[str, Optional[str], Optional[str]], None, None]:
         """
         Запускает полный pipeline генерации.
 
         # START_CONTRACT_run_pipeline
-        # Input: topic (str)
-        # Russian Intent: Запустить полный pipeline генерации лид-магнита
-        # Output: Generator - стрим логов, markdown, filepath
+        # Input: topic (str), cancel_token (Optional[CancelToken]) - отмена извне (Stop, отключение клиента, отмена задания)
+        # Russian Intent: Запустить полный pipeline генерации лид-магнита в пределах дедлайна запуска
+        # Output: Generator - стрим логов, markdown, filepath; отмена -> RunCancelledError
         # END_CONTRACT_run_pipeline
         """
         logger.debug(f"[Orchestrator][run_pipeline] Belief: Запуск pipeline | Input: topic={topic} | Expected: Generator")
 
+        self._start_run(cancel_token, topic=topic)
+        self._topic = topic
         try:
+            yield (emit_log(PipelineStage.PLANNER.value, f"Запуск {self.run_id}: {self.plan.describe()}"), None, None)
+
             # Stage 1: Query Builder
-            yield from self._run_query_builder(topic)
+            yield from self._traced_stage("query_builder", self._run_query_builder(topic))
 
             # Stage 2: Search
-            research_context = yield from self._run_search()
+            research_context = yield from self._traced_stage("search", self._run_search())
 
             # Stage 3: Structure Planner
-            structure = yield from self._run_structure_planner(research_context)
+            structure = yield from self._traced_stage("structure_planner", self._run_structure_planner(research_context))
 
             # Stage 4: Chapter Writer
-            chapters = yield from self._run_chapter_writer(structure, research_context)
+            chapters = yield from self._traced_stage("chapter_writer", self._run_chapter_writer(structure, research_context))
 
             # Stage 5: Assembly + Final Editor
-            yield from self._run_assembly_and_editor(structure, chapters)
+            yield from self._traced_stage("assembly", self._run_assembly_and_editor(structure, chapters))
 
+            self._run_status = "ok"
             logger.debug("[Orchestrator][run_pipeline] Belief: Pipeline завершен успешно | Input: topic | Expected: Generator")
 
         except StageError as e:
             logger.error(f"[Orchestrator][run_pipeline] Stage error: {e}")
+            self._run_span.fail(e)
+            self._run_status = "error"
+            raise
+        except RunCancelledError as e:
+            logger.info(f"[Orchestrator][run_pipeline] Run cancelled: {e.reason}")
+            self._run_span.fail(e)
             raise
         except Exception as e:
             logger.error(f"[Orchestrator][run_pipeline] Unexpected error: {e}")
-            raise handle_stage_failure("Pipeline", e, recoverable=False)
+            self._run_span.fail(e)
+            self._run_status = "error"
+            raise self._stage_failure("Pipeline", e, recoverable=False)
+        finally:
+            self._finish_run()
+
+    def run_batch_pipeline(
+        self,
+        topics: List[str],
+        cancel_token: Optional[CancelToken] = None
+    ) -> Generator[Tuple[str, Optional[str], Optional[str]], None, None]:
+        """
+        Запускает pipeline для пакета тем с общим поиском.
+
+        # START_CONTRACT_run_batch_pipeline
+        # Input: topics (List[str]), cancel_token (Optional[CancelToken])
+        # Russian Intent: Сгенерировать запросы всех тем, выполнить общий дедуплицированный поиск и собрать документы по очереди; у каждой темы свои журнал usage, спан и run id, общий этап учитывается в batch_usage; сбой одной темы логируется и не прерывает остальные, отмена прерывает весь пакет
+        # Output: Generator - стрим логов, markdown, filepath для каждой темы; итог по темам - в batch_results
+        # END_CONTRACT_run_batch_pipeline
+        """
+        logger.debug(f"[Orchestrator][run_batch_pipeline] Belief: Запуск пакетного pipeline | Input: topics={len(topics)} | Expected: Generator")
+
+        self._start_run(cancel_token, topic=f"batch of {len(topics)}")
+        self.batch_results = {topic: None for topic in topics}
+        try:
+            yield (emit_log(PipelineStage.PLANNER.value, f"Запуск {self.run_id}: {self.plan.describe()}"), None, None)
+
+            # Stage 1: Query Builder для всех тем
+            topic_queries: Dict[str, List[str]] = {}
+            for topic in self.batch_results:
+                try:
+                    yield from self._traced_stage("query_builder", self._run_query_builder(topic))
+                    topic_queries[topic] = self._queries
+                except RunCancelledError:
+                    raise
+                except Exception as e:
+                    yield self._batch_topic_failed(topic, e)
+
+            # Stage 2: общий поиск по уникальным запросам, план строится один раз
+            if topic_queries:
+                stage = PipelineStage.SEARCH.value
+                plan = plan_batch_queries(topic_queries)
+                yield (emit_log(stage, f"Общий поиск: {len(plan.unique_queries)} уникальных запросов из {plan.total_queries}"), None, None)
+                with self._scope(self._stage_token("SEARCH")), self.tracer.span("stage.batch_search", **{"search.unique_queries": len(plan.unique_queries)}):
+                    aggregates = run_batch_search(
+                        topic_queries,
+                        self.tavily_client,
+                        max_results=self.plan.search_max_results,
+                        max_workers=self.app_config.search_max_concurrency,
+                        plan=plan
+                    )
+
+            # Общий этап (запросы всех тем и поиск) учитывается отдельно от тем
+            self.batch_usage = self.usage
+            self._run_span.set(**{f"batch.shared_{key}": value for key, value in self.usage.totals().items() if value is not None})
+            yield (emit_log(PipelineStage.SEARCH.value, f"Usage общего этапа: {self.usage.summary()}"), None, None)
+
+            # Stages 3-5 для каждой темы
+            for index, (topic, queries) in enumerate(topic_queries.items(), 1):
+                self._queries = queries
+                try:
+                    with self._topic_run(topic, index):
+                        research_context = yield from self._traced_stage("search", self._run_search(aggregates[topic]))
+                        structure = yield from self._traced_stage("structure_planner", self._run_structure_planner(research_context))
+                        chapters = yield from self._traced_stage("chapter_writer", self._run_chapter_writer(structure, research_context))
+                        self.batch_results[topic] = yield from self._traced_stage("assembly", self._run_assembly_and_editor(structure, chapters))
+                except RunCancelledError:
+                    raise
+                except Exception as e:
+                    yield self._batch_topic_failed(topic, e)
+
+            failed = [topic for topic, filepath in self.batch_results.items() if filepath is None]
+            self._run_status = "error" if failed else "ok"
+            yield (emit_log(PipelineStage.ASSEMBLY.value, f"Пакет завершен: {len(self.batch_results) - len(failed)} из {len(self.batch_results)} тем"), None, None)
+            logger.debug(f"[Orchestrator][run_batch_pipeline] Belief: Пакетный pipeline завершен | Input: topics | Expected: Generator, Failed: {len(failed)}")
+
+        except RunCancelledError as e:
+            logger.info(f"[Orchestrator][run_batch_pipeline] Run cancelled: {e.reason}")
+            self._run_span.fail(e)
+            raise
+        except Exception as e:
+            logger.error(f"[Orchestrator][run_batch_pipeline] Unexpected error: {e}")
+            self._run_span.fail(e)
+            self._run_status = "error"
+            raise self._stage_failure("Pipeline", e, recoverable=False)
+        finally:
+            self._finish_run()
+
+    @contextmanager
+    def _topic_run(self, topic: str, index: int) -> Iterator[Span]:
+        """Свои журнал usage, дочерний спан и run id темы пакета: отчет usage и запись каталога темы не включают другие темы и общий этап."""
+        batch_span, batch_usage, batch_run_id = self._run_span, self.usage, self.run_id
+        span = self.tracer.start_span("pipeline.topic", parent=batch_span, **{"run.topic": topic, "run.batch_id": batch_run_id})
+        self._run_span = self._stage_span = span
+        self.usage = UsageLedger(self.app_config.llm_prices)
+        self.run_id = f"{batch_run_id}-{index}"
+        self._topic = topic
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            span.end()
+            self._run_span = self._stage_span = batch_span
+            self.usage, self.run_id = batch_usage, batch_run_id
+
+    def _batch_topic_failed(self, topic: str, error: Exception) -> Tuple[str, None, None]:
+        """Событие о сбое темы пакета; остальные темы продолжаются."""
+        stage_error = error if isinstance(error, StageError) else self._stage_failure("Pipeline", error, recoverable=False)
+        logger.error(f"[Orchestrator][run_batch_pipeline] Topic failed: {topic}: {stage_error}")
+        return (emit_log(stage_error.stage, f"❌ Тема «{topic}» пропущена: {stage_error.message}"), None, None)
+
+    def _start_run(self, cancel_token: Optional[CancelToken], topic: str = "") -> None:
+        """Создает токен запуска с общим дедлайном, план по пресету и корневой спан с run id."""
+        parent = cancel_token or CancelToken()
+        deadline = self.app_config.run_deadline_seconds or None
+        self._run_token = parent.child(deadline, "run")
+        self.plan = plan_run(self.ui_settings, self.app_config, self.timing_store)
+        self.usage = UsageLedger(self.app_config.llm_prices)
+        self._run_span = self.tracer.start_span(
+            "pipeline.run",
+            **{
+                "run.topic": topic,
+                "run.preset": self.plan.preset,
+                "gen_ai.request.model": self.app_config.llm_model,
+                "run.chapter_count": self.ui_settings.chapter_count,
+                "run.words_per_chapter": self.ui_settings.words_per_chapter,
+            }
+        )
+        self._stage_span = self._run_span
+        self.run_id = self._run_span.trace_id
+        # Генератор, закрытый потребителем (Stop, отключение клиента), не доходит до except-веток
+        self._run_status = "cancelled"
+        RUNS_IN_FLIGHT.inc()
+
+    def _finish_run(self) -> None:
+        """Закрывает корневой спан и учитывает исход запуска (вызывается из finally)."""
+        self._run_span.end()
+        RUNS_IN_FLIGHT.dec()
+        RUNS_TOTAL.inc(status=self._run_status)
+        RUN_SECONDS.observe(self._run_span.duration, status=self._run_status)
+
+    def _traced_stage(self, name: str, stage: Generator) -> Generator:
+        """
+        Оборачивает генератор стадии в спан.
+
+        # START_CONTRACT__traced_stage
+        # Input: name (str), stage (Generator) - генератор стадии
+        # Russian Intent: Измерить стадию целиком (включая yield в UI) и сделать ее спан родителем вызовов провайдеров
+        # Output: Generator - события стадии; возвращает результат стадии
+        # END_CONTRACT__traced_stage
+        """
+        span = self.tracer.start_span(f"stage.{name}", parent=self._run_span, **{"run.id": self.run_id})
+        self._stage_span = span
+        self._stage_name = name
+        try:
+            return (yield from stage)
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            self._stage_span = self._run_span
+            self._stage_name = "run"
+            span.end()
+            STAGE_SECONDS.observe(span.duration, stage=name, status=span.status)
+
+    @contextmanager
+    def _scope(self, token: CancelToken) -> Iterator[None]:
+        """Делает токен, спан и журнал usage текущей стадии контекстом вызовов провайдеров (блок без yield)."""
+        with use_cancel_token(token), use_span(self._stage_span), use_usage_ledger(self.usage, self._stage_name):
+            yield
+
+    def _measure(self, timing_key: str, units: float = 1.0):
+        """Измеряет блок и пополняет историю таймингов текущей модели."""
+        return self.timing_store.measure(self.app_config.llm_model, timing_key, units)
+
+    def _stage_token(self, stage_key: str) -> CancelToken:
+        """
+        Создает токен стадии с ее бюджетом.
+
+        # START_CONTRACT__stage_token
+        # Input: stage_key (str) - имя PipelineStage
+        # Russian Intent: Ограничить стадию бюджетом, не выходящим за дедлайн запуска, и не начинать отмененный запуск
+        # Output: CancelToken
+        # END_CONTRACT__stage_token
+        """
+        budget = self.app_config.stage_budgets.get(stage_key) or None
+        token = self._run_token.child(budget, stage_key)
+        token.raise_if_cancelled()
+        logger.debug(f"[Orchestrator][_stage_token] Belief: Бюджет стадии | Input: stage={stage_key}, budget={budget} | Expected: CancelToken, Remaining: {token.remaining()}")
+        return token
+
+    def _stage_failure(self, stage: str, error: Exception, recoverable: bool) -> Exception:
+        """Преобразует ошибку стадии в StageError; отмена запуска пробрасывается как есть."""
+        if isinstance(error, FanOutError):
+            error = error.error
+        if isinstance(error, RunCancelledError):
+            return error
+        return handle_stage_failure(stage, error, recoverable=recoverable)
 
     def _count_words(self, text: str) -> int:
         """
@@ -148,11 +420,13 @@ class GenerationOrchestrator:
             max_words,
             keep_links=self.ui_settings.keep_links
         )
-        edited = self.llm_client.generate_markdown(
-            system_prompt,
-            user_prompt,
-            temperature=self.ui_settings.editor_temperature
-        )
+        with self.tracer.span("section.edit", **{"section.name": section_name}), \
+                self._measure(TIMING_SECTION_EDIT, max(1, self._count_words(section_markdown)) / 100.0):
+            edited = self.llm_client.generate_markdown(
+                system_prompt,
+                user_prompt,
+                temperature=self.ui_settings.editor_temperature
+            )
         edited_count = self._count_words(edited)
         if min_words <= edited_count <= max_words:
             logger.debug("[Orchestrator][_edit_section_with_length_guard] Belief: Секция прошла контроль длины | Input: section_name, min_words, max_words | Expected: str")
@@ -185,9 +459,11 @@ class GenerationOrchestrator:
         yield (emit_log(stage, "Генерация поисковых запросов..."), None, None)
 
         try:
-            system_prompt, user_prompt = build_query_prompt(topic, query_count=5)
-            raw_output = self.llm_client.generate_json(system_prompt, user_prompt, temperature=0.3)
-            query_model = parse_query_output(raw_output, expected_count=5, llm_client=self.llm_client)
+            query_count = self.plan.query_count
+            system_prompt, user_prompt = build_query_prompt(topic, query_count=query_count)
+            with self._scope(self._stage_token("QUERY_BUILDER")), self._measure(TIMING_QUERY_BUILDER):
+                raw_output = self.llm_client.generate_json(system_prompt, user_prompt, temperature=0.3, hedge=True)
+                query_model = parse_query_output(raw_output, expected_count=query_count, llm_client=self.llm_client)
 
             logger.debug(f"[Orchestrator][_run_query_builder] Belief: Запросы сгенерированы | Input: topic | Expected: List[str], Count: {len(query_model.queries)}")
 
@@ -195,15 +471,24 @@ class GenerationOrchestrator:
             yield (emit_log(stage, f"Сгенерировано {len(query_model.queries)} поисковых запросов"), None, None)
 
         except Exception as e:
-            raise handle_stage_failure(stage, e, recoverable=False)
+            raise self._stage_failure(stage, e, recoverable=False)
 
-    def _run_search(self) -> Generator[Tuple[str, Optional[str], Optional[str]], None, str]:
-        """Stage 2: Search."""
+    def _run_search(self, aggregate: Optional[ResearchAggregate] = None) -> Generator[Tuple[str, Optional[str], Optional[str]], None, str]:
+        """Stage 2: Search (или готовый агрегат из общего пакетного поиска)."""
         stage = PipelineStage.SEARCH.value
         yield (emit_log(stage, "Поиск исследовательских данных..."), None, None)
 
         try:
-            aggregate = run_sequential_search(self._queries, self.tavily_client)
+            if aggregate is None:
+                search_workers = self.app_config.search_max_concurrency
+                waves = math.ceil(len(self._queries) / max(1, search_workers))
+                with self._scope(self._stage_token("SEARCH")), self._measure(TIMING_SEARCH_WAVE, waves):
+                    aggregate = run_parallel_search(
+                        self._queries,
+                        self.tavily_client,
+                        max_results=self.plan.search_max_results,
+                        max_workers=search_workers
+                    )
 
             if check_search_failure(aggregate):
                 error_msg = f"Все {len(self._queries)} поисковых запросов не удались"
@@ -221,7 +506,7 @@ class GenerationOrchestrator:
         except StageError:
             raise
         except Exception as e:
-            raise handle_stage_failure(stage, e, recoverable=True)
+            raise self._stage_failure(stage, e, recoverable=True)
 
     def _run_structure_planner(self, research_context: str) -> Generator[Tuple[str, Optional[str], Optional[str]], None, dict]:
         """Stage 3: Structure Planner."""
@@ -230,115 +515,231 @@ class GenerationOrchestrator:
 
         try:
             system_prompt, user_prompt = build_structure_prompt(research_context, self.ui_settings.chapter_count)
-            raw_output = self.llm_client.generate_json(system_prompt, user_prompt, temperature=0.5)
-            structure = parse_structure_output(raw_output, expected_chapters=self.ui_settings.chapter_count, llm_client=self.llm_client)
+            with self._scope(self._stage_token("STRUCTURE_PLANNER")), self._measure(TIMING_STRUCTURE):
+                raw_output = self.llm_client.generate_json(system_prompt, user_prompt, temperature=0.5, hedge=True)
+                structure = parse_structure_output(raw_output, expected_chapters=self.ui_settings.chapter_count, llm_client=self.llm_client)
 
             logger.debug(f"[Orchestrator][_run_structure_planner] Belief: Структура спланирована | Input: research_context | Expected: dict, Chapters: {len(structure.chapters)}")
 
-            yield (emit_log(stage, f"Запланировано {len(structure.chapters)} глав"), None, None)
+            yield (emit_log(stage, f"Запланировано {len(structure.chapters)} глав"), self._preview(structure, [None] * len(structure.chapters)), None)
             return structure
 
         except Exception as e:
-            raise handle_stage_failure(stage, e, recoverable=False)
+            raise self._stage_failure(stage, e, recoverable=False)
+
+    def _preview(
+        self,
+        structure: dict,
+        chapters: List[Optional[str]],
+        introduction: Optional[str] = None,
+        conclusions: Optional[str] = None
+    ) -> str:
+        """Предпросмотр документа по уже готовым секциям (ненаписанные главы - заглушки)."""
+        return render_preview(
+            structure.title,
+            structure.subtitle,
+            introduction or structure.introduction,
+            chapters,
+            conclusions or structure.conclusions,
+            [chapter_plan.title for chapter_plan in structure.chapters]
+        )
+
+    def _in_stage(self, token: CancelToken, fn, *args):
+        """Выполняет fn в потоке fan-out с токеном и спаном стадии."""
+        with self._scope(token):
+            return fn(*args)
+
+    def _write_chapter(self, structure: dict, chapter_plan, research_context: str) -> str:
+        """Пишет одну главу по плану."""
+        system_prompt, user_prompt = build_chapter_writer_prompt(
+            main_title=structure.title,
+            chapter_title=chapter_plan.title,
+            chapter_prompt=chapter_plan.prompt,
+            research_context=research_context,
+            word_limit=self.ui_settings.words_per_chapter,
+            keep_links=self.ui_settings.keep_links
+        )
+        with self.tracer.span("chapter.write", **{"chapter.title": chapter_plan.title}), \
+                self._measure(TIMING_CHAPTER, self.ui_settings.words_per_chapter / 100.0):
+            chapter_text = self.llm_client.generate_markdown(
+                system_prompt,
+                user_prompt,
+                temperature=self.ui_settings.temperature
+            )
+        logger.debug(f"[Orchestrator][_write_chapter] Belief: Глава написана | Input: chapter_title={chapter_plan.title} | Expected: str")
+        return chapter_text
 
     def _run_chapter_writer(self, structure: dict, research_context: str) -> Generator[Tuple[str, Optional[str], Optional[str]], None, list]:
-        """Stage 4: Chapter Writer."""
+        """Stage 4: Chapter Writer (главы пишутся параллельно в пределах лимита LLM)."""
         stage = PipelineStage.CHAPTER_WRITER.value
-        chapters = []
-
-        for i, chapter_plan in enumerate(structure.chapters, 1):
-            yield (emit_log(stage, f"Написание главы {i}/{len(structure.chapters)}..."), None, None)
-
-            try:
-                system_prompt, user_prompt = build_chapter_writer_prompt(
-                    main_title=structure.title,
-                    chapter_title=chapter_plan.title,
-                    chapter_prompt=chapter_plan.prompt,
-                    research_context=research_context,
-                    word_limit=self.ui_settings.words_per_chapter,
-                    keep_links=self.ui_settings.keep_links
-                )
-                chapter_text = self.llm_client.generate_markdown(
-                    system_prompt,
-                    user_prompt,
-                    temperature=self.ui_settings.temperature
-                )
-                chapters.append(chapter_text)
+        total = len(structure.chapters)
+        chapters: List[Optional[str]] = [None] * total
 
-                logger.debug(f"[Orchestrator][_run_chapter_writer] Belief: Глава написана | Input: chapter_title={chapter_plan.title} | Expected: str")
+        yield (emit_log(stage, f"Написание {total} глав..."), None, None)
 
-            except Exception as e:
-                raise handle_stage_failure(f"{stage} (Глава {i})", e, recoverable=False)
+        token = self._stage_token("CHAPTER_WRITER")
+        try:
+            written = fan_out(
+                structure.chapters,
+                lambda chapter_plan: self._in_stage(token, self._write_chapter, structure, chapter_plan, research_context),
+                self.plan.chapter_concurrency
+            )
+            for done, (index, chapter_text) in enumerate(written, 1):
+                chapters[index] = chapter_text
+                yield (emit_log(stage, f"Глава {index + 1} написана ({done}/{total})"), self._preview(structure, chapters), None)
+        except FanOutError as e:
+            raise self._stage_failure(f"{stage} (Глава {e.index + 1})", e, recoverable=False)
 
         yield (emit_log(stage, f"Все {len(chapters)} глав написаны"), None, None)
         return chapters
 
+    def _open_document_stream(self, name: str, structure, chapter_count: int) -> Optional[StreamingMarkdownWriter]:
+        """Потоковая запись публикуемого документа; None для нефайлового хранилища."""
+        path = self.artifact_store.local_path(name)
+        if path is None:
+            return None
+        writer = StreamingMarkdownWriter(path, sections=chapter_count + 3)
+        writer.put(0, header_chunk(structure.title, structure.subtitle))
+        self.partial_path = writer.partial_path
+        return writer
+
+    def _catalog_document(self, title: str, artifact: Artifact, kind: str = KIND_DOCUMENT) -> None:
+        """Вносит документ или черновик в каталог и применяет политику хранения; сбой каталога не отменяет сохраненный файл."""
+        if self.catalog is None:
+            return
+        try:
+            self.catalog.backfill(self.artifact_store)
+            self.catalog.add(
+                artifact.key,
+                artifact.location,
+                title,
+                self._topic,
+                artifact.sha256,
+                artifact.size,
+                settings=self.ui_settings,
+                run_id=self.run_id,
+                usage_totals=self.usage.totals(),
+                duration_seconds=time.time() - self._run_span.start_time,
+                kind=kind
+            )
+            self.catalog.enforce_retention(retention_policy_from(self.app_config), self.artifact_store)
+        except Exception as e:
+            logger.warning(f"[Orchestrator] Failed to update output catalog: {e}")
+
+    def _save_draft(self, name: str, title: str, content: str) -> None:
+        """Сохраняет черновик в фоне и после записи вносит его в каталог, чтобы черновики вытеснялись вместе с документами."""
+        data = content.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+
+        def on_saved(future) -> None:
+            if future.exception() is None:
+                self._catalog_document(title, Artifact(name, future.result(), sha256, len(data), False), kind=KIND_DRAFT)
+
+        self.artifact_store.save_text_async(name, content).add_done_callback(on_saved)
+
     def _run_assembly_and_editor(self, structure: dict, chapters: list) -> Generator[Tuple[str, Optional[str], Optional[str]], None, str]:
         """Stage 5: Assembly + Final Editor."""
         stage = PipelineStage.ASSEMBLY.value
         yield (emit_log(stage, "Сборка документа..."), None, None)
 
+        token = self._stage_token("ASSEMBLY")
+        document_name = build_output_filename(run_id=self.run_id)
+        draft_name = build_output_filename("draft", self.run_id)
+        writer: Optional[StreamingMarkdownWriter] = None
         try:
-            if self.ui_settings.enable_section_editors:
-                yield (emit_log(stage, "Редактирование введения с контролем длины..."), None, None)
-                edited_intro = self._edit_section_with_length_guard("Introduction", structure.introduction)
-
-                edited_chapters = []
-                for i, chapter_text in enumerate(chapters, 1):
-                    yield (emit_log(stage, f"Редактирование главы {i}/{len(chapters)} с контролем длины..."), None, None)
-                    edited_chapter = self._edit_section_with_length_guard(f"Chapter {i}", chapter_text)
-                    edited_chapters.append(edited_chapter)
-
-                yield (emit_log(stage, "Редактирование заключения с контролем длины..."), None, None)
-                edited_conclusions = self._edit_section_with_length_guard("Conclusion", structure.conclusions)
+            # По секциям пишется только публикуемый документ; с финальным редактором им станет ответ редактора
+            if not self.plan.final_editor:
+                writer = self._open_document_stream(document_name, structure, len(chapters))
+            if writer is not None:
+                yield (emit_log(stage, f"Документ пишется по секциям: {writer.partial_path}"), None, None)
+
+            if self.plan.section_editors:
+                sections = [("Introduction", structure.introduction)]
+                sections += [(f"Chapter {i}", chapter_text) for i, chapter_text in enumerate(chapters, 1)]
+                sections.append(("Conclusion", structure.conclusions))
+                edited_sections: List[Optional[str]] = [None] * len(sections)
+
+                yield (emit_log(stage, f"Редактирование {len(sections)} секций с контролем длины..."), None, None)
+                edited = fan_out(
+                    sections,
+                    lambda section: self._in_stage(token, self._edit_section_with_length_guard, *section),
+                    self.plan.chapter_concurrency
+                )
+                for done, (index, edited_text) in enumerate(edited, 1):
+                    edited_sections[index] = edited_text
+                    if writer is not None:
+                        writer.put(index + 1, document_chunk(sections[index][0], edited_text))
+                    preview = self._preview(
+                        structure,
+                        [edited_text or chapter_text for edited_text, chapter_text in zip(edited_sections[1:-1], chapters)],
+                        edited_sections[0],
+                        edited_sections[-1]
+                    )
+                    yield (emit_log(stage, f"Секция {sections[index][0]} отредактирована ({done}/{len(sections)})"), preview, None)
+
+                edited_intro = edited_sections[0]
+                edited_chapters = edited_sections[1:-1]
+                edited_conclusions = edited_sections[-1]
             else:
                 yield (emit_log(stage, "Промежуточные редакторы отключены: используем исходные секции"), None, None)
                 edited_intro = structure.introduction
                 edited_chapters = chapters
                 edited_conclusions = structure.conclusions
-
-            # Assembly
-            draft = export_lead_magnet(
+                if writer is not None:
+                    chunks = document_chunks(structure.title, structure.subtitle, edited_intro, edited_chapters, edited_conclusions)
+                    for index, chunk in enumerate(chunks):
+                        if index:
+                            writer.put(index, chunk)
+
+            # Assembly: документ в памяти - промпт редактора и итог для UI без чтения файла обратно
+            draft_content = assemble_document(
                 title=structure.title,
                 subtitle=structure.subtitle,
                 introduction=edited_intro,
                 chapters=edited_chapters,
                 conclusions=edited_conclusions
-            )
-
-            yield (emit_log(stage, "Запуск легкого финального редактора..."), None, None)
-
-            # Final Editor - читаем содержимое файла вместо пути
-            from pathlib import Path
-            draft_path = Path(draft)
-            if draft_path.exists():
-                with open(draft_path, "r", encoding="utf-8") as f:
-                    draft_content = f.read()
+            ).markdown
+            if self.app_config.save_drafts:
+                # Черновик пишется в фоне и не задерживает редактор
+                self._save_draft(draft_name, structure.title, draft_content)
+
+            if self.plan.final_editor:
+                yield (emit_log(stage, "Запуск легкого финального редактора..."), draft_content, None)
+                editor_system_prompt, editor_user_prompt = build_final_editor_prompt(
+                    draft_content,
+                    keep_links=self.ui_settings.keep_links
+                )
+                with self._scope(token), self._measure(TIMING_FINAL_EDITOR, max(1, self._count_words(draft_content)) / 100.0):
+                    final_markdown = self.llm_client.generate_markdown(
+                        editor_system_prompt,
+                        editor_user_prompt,
+                        temperature=self.ui_settings.editor_temperature
+                    )
+                artifact = self.artifact_store.save_document(document_name, final_markdown)
             else:
-                draft_content = draft  # Если файл не существует, используем как есть
-
-            editor_system_prompt, editor_user_prompt = build_final_editor_prompt(
-                draft_content,
-                keep_links=self.ui_settings.keep_links
-            )
-            final_markdown = self.llm_client.generate_markdown(
-                editor_system_prompt,
-                editor_user_prompt,
-                temperature=self.ui_settings.editor_temperature
-            )
-
-            # Save final version
-            from src.export import save_markdown_file, ensure_outputs_dir, build_output_filename
-            dir_path = ensure_outputs_dir()
-            filename = build_output_filename()
-            filepath = dir_path / filename
-            save_markdown_file(final_markdown, filepath)
+                yield (emit_log(stage, "Финальный редактор пропущен планировщиком: используем собранный документ"), None, None)
+                final_markdown = draft_content
+                # Save final version: потоковый файл публикуется без повторной записи
+                if writer is not None:
+                    writer.commit()
+                    artifact = self.artifact_store.register_document(document_name, writer.sha256, writer.size)
+                else:
+                    artifact = self.artifact_store.save_document(document_name, final_markdown)
+            filepath = artifact.location
+            self.artifact_store.save_text(str(usage_path_for(Path(artifact.key))), self.usage.to_json(self.run_id))
+            self._catalog_document(structure.title, artifact)
 
             logger.debug(f"[Orchestrator][_run_assembly_and_editor] Belief: Документ собран и отредактирован | Input: structure, chapters | Expected: str, Filepath: {filepath}")
 
+            yield (emit_log(stage, f"Usage запуска: {self.usage.summary()}"), None, None)
             yield (emit_log(stage, f"Документ сохранен в {filepath}"), final_markdown, str(filepath))
 
             return str(filepath)
 
         except Exception as e:
-            raise handle_stage_failure(stage, e, recoverable=False)
+            raise self._stage_failure(stage, e, recoverable=False)
+        finally:
+            # Незавершенный (отмена, ошибка) документ удаляется
+            if writer is not None:
+                writer.abort()
+            self.partial_path = None
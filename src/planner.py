@@ -0,0 +1,296 @@
+"""
+Run Planner Module
+Подбирает объем работы запуска под целевую латентность или бюджет вызовов по истории таймингов стадий.
+"""
+
+import logging
+import math
+import sqlite3
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from src.config import AppConfig, UiSettings
+
+logger = logging.getLogger(__name__)
+
+# Ключи таймингов: секунды на единицу работы (единицы указаны в комментариях)
+TIMING_QUERY_BUILDER = "QUERY_BUILDER"      # запуск
+TIMING_SEARCH_WAVE = "SEARCH_WAVE"          # волна параллельных запросов
+TIMING_STRUCTURE = "STRUCTURE_PLANNER"      # запуск
+TIMING_CHAPTER = "CHAPTER"                  # 100 слов главы
+TIMING_SECTION_EDIT = "SECTION_EDIT"        # 100 слов секции
+TIMING_FINAL_EDITOR = "FINAL_EDITOR"        # 100 слов документа
+
+# Оценки по умолчанию, пока истории для модели нет
+DEFAULT_SECONDS_PER_UNIT: Dict[str, float] = {
+    TIMING_QUERY_BUILDER: 6.0,
+    TIMING_SEARCH_WAVE: 4.0,
+    TIMING_STRUCTURE: 15.0,
+    TIMING_CHAPTER: 8.0,
+    TIMING_SECTION_EDIT: 6.0,
+    TIMING_FINAL_EDITOR: 3.0,
+}
+
+
+@dataclass
+class PlanBudget:
+    """Бюджет запуска; None означает отсутствие ограничения."""
+    target_seconds: Optional[float] = None
+    max_llm_calls: Optional[int] = None
+
+
+# Пресет -> бюджет и самый полный допустимый план (запросы, результаты, редакторы секций)
+PRESET_BUDGETS: Dict[str, PlanBudget] = {
+    "speed": PlanBudget(target_seconds=60.0),
+    "balanced": PlanBudget(target_seconds=180.0),
+    "thorough": PlanBudget(),
+}
+PRESET_CEILINGS: Dict[str, Tuple[int, int, bool]] = {
+    "speed": (3, 3, False),
+    "balanced": (5, 5, True),
+    "thorough": (7, 7, True),
+}
+
+
+@dataclass
+class RunPlan:
+    """Решение планировщика об опциональной работе запуска."""
+    preset: str
+    query_count: int = 5
+    search_max_results: int = 5
+    section_editors: bool = True
+    final_editor: bool = True
+    chapter_concurrency: int = 1
+    estimated_seconds: float = 0.0
+    estimated_llm_calls: int = 0
+    within_budget: bool = True
+    notes: List[str] = field(default_factory=list)
+
+    # START_CONTRACT_RunPlan
+    # Input: preset, query_count, search_max_results, section_editors, final_editor, chapter_concurrency, estimated_seconds, estimated_llm_calls, within_budget, notes
+    # Russian Intent: Описать ширину поиска, включенные редакторы и параллелизм глав одного запуска
+    # Output: RunPlan
+    # END_CONTRACT_RunPlan
+
+    def describe(self) -> str:
+        """Краткое описание плана для лога UI."""
+        return (
+            f"Пресет {self.preset}: {self.query_count} запросов x {self.search_max_results} результатов, "
+            f"редакторы секций: {'да' if self.section_editors else 'нет'}, "
+            f"финальный редактор: {'да' if self.final_editor else 'нет'}, "
+            f"параллелизм глав: {self.chapter_concurrency}, оценка ~{self.estimated_seconds:.0f} с"
+        )
+
+
+class StageTimingStore:
+    """История таймингов стадий по модели (в памяти или в SQLite-файле)."""
+
+    def __init__(self, db_path: str = "", window: int = 50):
+        """
+        Инициализация хранилища.
+
+        # START_CONTRACT_StageTimingStore_init
+        # Input: db_path (str) - файл для истории между рестартами и процессами, пусто = только в памяти; window (int)
+        # Russian Intent: Хранить последние тайминги каждой стадии для каждой модели
+        # Output: None
+        # END_CONTRACT_StageTimingStore_init
+        """
+        self.db_path = db_path
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+        if db_path:
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS stage_timings ("
+                    "model TEXT NOT NULL, stage TEXT NOT NULL, seconds_per_unit REAL NOT NULL, recorded_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_stage_timings ON stage_timings (model, stage, recorded_at)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Открывает соединение в autocommit-режиме."""
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=30000")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def record(self, model: str, stage: str, seconds: float, units: float = 1.0) -> None:
+        """Сохраняет одно измерение стадии, нормированное на единицы работы."""
+        if units <= 0:
+            return
+        per_unit = seconds / units
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO stage_timings (model, stage, seconds_per_unit, recorded_at) VALUES (?, ?, ?, ?)",
+                    (model, stage, per_unit, time.time())
+                )
+            return
+        with self._lock:
+            self._samples.setdefault((model, stage), deque(maxlen=self.window)).append(per_unit)
+
+    def seconds_per_unit(self, model: str, stage: str) -> Optional[float]:
+        """Медиана последних измерений или None, если истории нет."""
+        if self.db_path:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT seconds_per_unit FROM stage_timings WHERE model = ? AND stage = ? ORDER BY recorded_at DESC LIMIT ?",
+                    (model, stage, self.window)
+                ).fetchall()
+            samples = [row[0] for row in rows]
+        else:
+            with self._lock:
+                samples = list(self._samples.get((model, stage), ()))
+        return statistics.median(samples) if samples else None
+
+    @contextmanager
+    def measure(self, model: str, stage: str, units: float = 1.0) -> Iterator[None]:
+        """Измеряет успешно завершенный блок и сохраняет тайминг."""
+        started_at = time.monotonic()
+        yield
+        self.record(model, stage, time.monotonic() - started_at, units)
+
+
+_shared_store: Optional[StageTimingStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def get_timing_store(config: AppConfig) -> StageTimingStore:
+    """
+    Возвращает хранилище таймингов, общее для процесса.
+
+    # START_CONTRACT_get_timing_store
+    # Input: config (AppConfig)
+    # Russian Intent: Разделять одну историю таймингов между всеми сессиями процесса
+    # Output: StageTimingStore
+    # END_CONTRACT_get_timing_store
+    """
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = StageTimingStore(config.stage_timings_path)
+        return _shared_store
+
+
+def _per_unit(store: Optional[StageTimingStore], model: str, stage: str) -> float:
+    """Тайминг из истории или оценка по умолчанию."""
+    value = store.seconds_per_unit(model, stage) if store is not None else None
+    return value if value is not None else DEFAULT_SECONDS_PER_UNIT[stage]
+
+
+def estimate_plan(
+    plan: RunPlan,
+    settings: UiSettings,
+    store: Optional[StageTimingStore],
+    model: str,
+    search_concurrency: int
+) -> Tuple[float, int]:
+    """
+    Оценивает длительность и число LLM-вызовов плана.
+
+    # START_CONTRACT_estimate_plan
+    # Input: plan (RunPlan), settings (UiSettings), store (Optional[StageTimingStore]), model (str), search_concurrency (int)
+    # Russian Intent: Сложить ожидаемые длительности стадий с учетом параллелизма глав и поиска
+    # Output: Tuple[float, int] - (секунды, LLM-вызовы)
+    # END_CONTRACT_estimate_plan
+    """
+    chapters = settings.chapter_count
+    chapter_units = settings.words_per_chapter / 100.0
+    waves = math.ceil(chapters / plan.chapter_concurrency)
+
+    seconds = _per_unit(store, model, TIMING_QUERY_BUILDER)
+    seconds += math.ceil(plan.query_count / max(1, search_concurrency)) * _per_unit(store, model, TIMING_SEARCH_WAVE)
+    seconds += _per_unit(store, model, TIMING_STRUCTURE)
+    seconds += waves * chapter_units * _per_unit(store, model, TIMING_CHAPTER)
+    calls = 2 + chapters
+
+    if plan.section_editors:
+        section_waves = math.ceil((chapters + 2) / plan.chapter_concurrency)
+        seconds += section_waves * chapter_units * _per_unit(store, model, TIMING_SECTION_EDIT)
+        calls += chapters + 2
+    if plan.final_editor:
+        seconds += chapters * chapter_units * _per_unit(store, model, TIMING_FINAL_EDITOR)
+        calls += 1
+
+    return seconds, calls
+
+
+def _fits(seconds: float, calls: int, budget: PlanBudget) -> bool:
+    """Проверяет, укладывается ли оценка в бюджет."""
+    if budget.target_seconds is not None and seconds > budget.target_seconds:
+        return False
+    if budget.max_llm_calls is not None and calls > budget.max_llm_calls:
+        return False
+    return True
+
+
+def manual_plan(settings: UiSettings, app_config: AppConfig) -> RunPlan:
+    """План без планировщика: полный объем работы с ручным флагом редакторов секций."""
+    return RunPlan(
+        preset="custom",
+        section_editors=settings.enable_section_editors,
+        chapter_concurrency=app_config.llm_max_concurrency
+    )
+
+
+def plan_run(
+    settings: UiSettings,
+    app_config: AppConfig,
+    store: Optional[StageTimingStore] = None,
+    budget: Optional[PlanBudget] = None
+) -> RunPlan:
+    """
+    Подбирает план запуска под бюджет пресета.
+
+    # START_CONTRACT_plan_run
+    # Input: settings (UiSettings), app_config (AppConfig), store (Optional[StageTimingStore]), budget (Optional[PlanBudget]) - по умолчанию бюджет пресета
+    # Russian Intent: Начать с самого полного плана пресета и отключать опциональную работу (редакторы секций, ширину поиска, финальный редактор), пока оценка не уложится в бюджет; параллелизм глав - минимальный достаточный, чтобы не занимать общие слоты провайдера
+    # Output: RunPlan
+    # END_CONTRACT_plan_run
+    """
+    logger.debug(f"[Planner][plan_run] Belief: Планирование запуска | Input: preset={settings.preset}, chapters={settings.chapter_count} | Expected: RunPlan")
+
+    if settings.preset not in PRESET_BUDGETS:
+        return manual_plan(settings, app_config)
+
+    budget = budget or PRESET_BUDGETS[settings.preset]
+    model = app_config.llm_model
+    max_concurrency = app_config.llm_max_concurrency
+    query_count, max_results, section_editors = PRESET_CEILINGS[settings.preset]
+
+    # Кандидаты от самого полного к самому легкому
+    candidates = [RunPlan(settings.preset, query_count, max_results, section_editors, True)]
+    if section_editors:
+        candidates.append(replace(candidates[-1], section_editors=False))
+    if query_count > 3:
+        candidates.append(replace(candidates[-1], query_count=3, search_max_results=3))
+    candidates.append(replace(candidates[-1], final_editor=False))
+
+    for candidate in candidates:
+        for concurrency in range(1, max_concurrency + 1):
+            candidate.chapter_concurrency = concurrency
+            seconds, calls = estimate_plan(candidate, settings, store, model, app_config.search_max_concurrency)
+            if _fits(seconds, calls, budget):
+                candidate.estimated_seconds, candidate.estimated_llm_calls = seconds, calls
+                logger.debug(f"[Planner][plan_run] Belief: План укладывается в бюджет | Input: preset={settings.preset} | Expected: RunPlan, Estimate: {seconds:.1f}s, {calls} calls")
+                return candidate
+
+    leanest = candidates[-1]
+    leanest.chapter_concurrency = max_concurrency
+    leanest.estimated_seconds, leanest.estimated_llm_calls = estimate_plan(
+        leanest, settings, store, model, app_config.search_max_concurrency
+    )
+    leanest.within_budget = False
+    leanest.notes.append("бюджет недостижим, выбран самый легкий план")
+    logger.info(f"[Planner] Budget unattainable for preset {settings.preset}: ~{leanest.estimated_seconds:.0f}s")
+    return leanest
@@ -0,0 +1,238 @@
+"""
+Progress Events Module
+Структурированные события прогресса запуска (стадия, шаг, процент, ETA, частичный markdown) и ограниченный журнал сессии.
+"""
+
+import logging
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Generator, Iterable, Optional, Tuple
+
+from src.errors import PipelineStage, RunCancelledError
+
+logger = logging.getLogger(__name__)
+
+LEVEL_INFO = "info"
+LEVEL_STOPPED = "stopped"
+LEVEL_ERROR = "error"
+
+# Доля запуска, выполненная к началу стадии (оценка по типичному распределению времени)
+STAGE_PROGRESS = {
+    PipelineStage.PLANNER.value: 0.0,
+    PipelineStage.QUERY_BUILDER.value: 0.02,
+    PipelineStage.SEARCH.value: 0.08,
+    PipelineStage.STRUCTURE_PLANNER.value: 0.2,
+    PipelineStage.CHAPTER_WRITER.value: 0.3,
+    PipelineStage.ASSEMBLY.value: 0.7,
+}
+_STAGE_ORDER = list(STAGE_PROGRESS)
+
+DEFAULT_MAX_EVENTS = 500
+# Минимальный интервал между перерисовками лога в UI (секунды)
+DEFAULT_RENDER_INTERVAL = 0.5
+
+_LOG_LINE = re.compile(r"^📍 (?P<stage>[^:]+): (?P<message>.*)$", re.DOTALL)
+_STEP = re.compile(r"\((?P<step>\d+)/(?P<total>\d+)\)")
+
+
+@dataclass
+class ProgressEvent:
+    """Одно событие прогресса запуска."""
+    seq: int
+    message: str
+    stage: Optional[str] = None
+    step: Optional[int] = None
+    total_steps: Optional[int] = None
+    percent: float = 0.0
+    eta_seconds: Optional[float] = None
+    markdown: Optional[str] = None
+    filepath: Optional[str] = None
+    level: str = LEVEL_INFO
+
+    def status(self) -> str:
+        """Строка состояния: стадия, процент и оставшееся время."""
+        parts = [self.stage or "Подготовка", f"{self.percent:.0f}%"]
+        if self.step is not None and self.total_steps:
+            parts.insert(1, f"шаг {self.step}/{self.total_steps}")
+        if self.eta_seconds is not None:
+            parts.append(f"осталось ~{self.eta_seconds:.0f} с")
+        if self.level == LEVEL_STOPPED:
+            parts = [self.stage or "Запуск", "остановлен"]
+        elif self.level == LEVEL_ERROR:
+            parts = [self.stage or "Запуск", "ошибка"]
+        return " · ".join(parts)
+
+
+class ProgressTracker:
+    """Превращает кортежи (logs, markdown, filepath) pipeline в события с процентом и ETA."""
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self._seq = 0
+        self._stage: Optional[str] = None
+        self._percent = 0.0
+
+    def _next(self, message: str, **fields) -> ProgressEvent:
+        self._seq += 1
+        return ProgressEvent(seq=self._seq, message=message, stage=self._stage, percent=self._percent, **fields)
+
+    def event(self, logs: str, markdown: Optional[str] = None, filepath: Optional[str] = None) -> ProgressEvent:
+        """
+        Событие из одного кортежа pipeline.
+
+        # START_CONTRACT_ProgressTracker_event
+        # Input: logs (str) - строка emit_log или произвольный текст, markdown (Optional[str]), filepath (Optional[str])
+        # Russian Intent: Определить стадию и шаг по логу, монотонно продвинуть процент и экстраполировать оставшееся время
+        # Output: ProgressEvent
+        # END_CONTRACT_ProgressTracker_event
+        """
+        step = total = None
+        match = _LOG_LINE.match(logs or "")
+        if match and match.group("stage") in STAGE_PROGRESS:
+            self._stage = match.group("stage")
+            stage_start = STAGE_PROGRESS[self._stage]
+            index = _STAGE_ORDER.index(self._stage)
+            stage_end = STAGE_PROGRESS[_STAGE_ORDER[index + 1]] if index + 1 < len(_STAGE_ORDER) else 1.0
+            step_match = _STEP.search(match.group("message"))
+            fraction = 0.0
+            if step_match and int(step_match.group("total")):
+                step, total = int(step_match.group("step")), int(step_match.group("total"))
+                fraction = min(1.0, step / total)
+            self._percent = max(self._percent, 100 * (stage_start + (stage_end - stage_start) * fraction))
+        if filepath is not None:
+            self._percent = 100.0
+
+        eta = None
+        elapsed = time.monotonic() - self.started_at
+        if 0 < self._percent < 100:
+            eta = round(elapsed * (100 - self._percent) / self._percent, 1)
+        elif self._percent >= 100:
+            eta = 0.0
+        return self._next(logs or "", step=step, total_steps=total, eta_seconds=eta, markdown=markdown, filepath=filepath)
+
+    def stopped(self, reason: str) -> ProgressEvent:
+        """Событие остановки запуска."""
+        return self._next(f"⏹ Генерация остановлена: {reason}", level=LEVEL_STOPPED)
+
+    def failed(self, message: str) -> ProgressEvent:
+        """Событие непредвиденной ошибки запуска."""
+        return self._next(message, level=LEVEL_ERROR)
+
+
+def progress_events(
+    generator: Iterable[Tuple[str, Optional[str], Optional[str]]],
+    tracker: Optional[ProgressTracker] = None
+) -> Generator[ProgressEvent, None, None]:
+    """
+    Поток событий прогресса из генератора pipeline.
+
+    # START_CONTRACT_progress_events
+    # Input: generator (Iterable) - кортежи (logs, markdown, filepath), tracker (Optional[ProgressTracker])
+    # Russian Intent: Отдавать по одному событию на обновление вместо накопленного текста; отмену и ошибку завершать событием
+    # Output: Generator[ProgressEvent]
+    # END_CONTRACT_progress_events
+    """
+    logger.debug("[Progress][progress_events] Belief: Начало потока событий прогресса | Input: generator | Expected: Generator[ProgressEvent]")
+
+    tracker = tracker or ProgressTracker()
+    try:
+        for logs, markdown, filepath in generator:
+            yield tracker.event(logs, markdown, filepath)
+    except RunCancelledError as e:
+        logger.info(f"[Progress][progress_events] Run cancelled: {e.reason}")
+        yield tracker.stopped(e.reason)
+    except Exception as e:
+        logger.error(f"[Progress][progress_events] Error during streaming: {e}")
+        yield tracker.failed(f"❌ Unexpected error: {type(e).__name__}")
+
+
+class ProgressLog:
+    """Ограниченный журнал событий сессии; текст лога - представление поверх него, перерисовываемое не чаще render_interval."""
+
+    def __init__(
+        self,
+        max_events: int = DEFAULT_MAX_EVENTS,
+        render_interval: float = DEFAULT_RENDER_INTERVAL,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Инициализация журнала.
+
+        # START_CONTRACT_ProgressLog_init
+        # Input: max_events (int) - размер кольцевого буфера строк, render_interval (float) - минимальный интервал перерисовки лога (с), clock (Callable)
+        # Russian Intent: Держать в памяти сессии не больше max_events строк и не пересылать весь лог в UI на каждое событие
+        # Output: None
+        # END_CONTRACT_ProgressLog_init
+        """
+        if max_events < 1:
+            raise ValueError("max_events must be >= 1")
+        if render_interval < 0:
+            raise ValueError("render_interval must be >= 0")
+        self._lines: Deque[str] = deque(maxlen=max_events)
+        self.dropped = 0
+        self.last: Optional[ProgressEvent] = None
+        self.markdown: Optional[str] = None
+        self.filepath: Optional[str] = None
+        self.render_interval = render_interval
+        self._clock = clock
+        self._text: Optional[str] = ""
+        self._dirty = False
+        self._render_due = True
+        self._rendered_at: Optional[float] = None
+
+    def append(self, event: ProgressEvent) -> None:
+        """Добавляет событие: строку лога в буфер (без сборки текста), markdown и путь - последние значения."""
+        previous = self.last
+        self.last = event
+        if event.markdown is not None:
+            self.markdown = event.markdown
+        if event.filepath is not None:
+            self.filepath = event.filepath
+        if event.level == LEVEL_ERROR:
+            self.markdown = None
+        if event.level != LEVEL_INFO:
+            self.filepath = None
+        # Смена стадии, превью, результат и остановка показываются сразу, остальное - не чаще render_interval
+        if (event.level != LEVEL_INFO or event.markdown is not None or event.filepath is not None
+                or previous is None or previous.stage != event.stage):
+            self._render_due = True
+        if not event.message:
+            return
+
+        if len(self._lines) == self._lines.maxlen:
+            self.dropped += 1
+        self._lines.append(event.message)
+        self._text = None
+        self._dirty = True
+
+    def text(self) -> str:
+        """Текст лога (собирается по запросу и кэшируется до следующей строки)."""
+        if self._text is None:
+            header = f"… пропущено строк: {self.dropped}\n" if self.dropped else ""
+            self._text = header + "\n".join(self._lines)
+        return self._text
+
+    def render(self) -> Optional[str]:
+        """
+        Текст лога для перерисовки в UI.
+
+        # START_CONTRACT_ProgressLog_render
+        # Input: None
+        # Russian Intent: Собирать и отдавать лог только при новых строках и не чаще render_interval, кроме значимых событий
+        # Output: Optional[str] - текст лога или None, если представление перерисовывать не нужно
+        # END_CONTRACT_ProgressLog_render
+        """
+        now = self._clock()
+        due = self._render_due or self._rendered_at is None or now - self._rendered_at >= self.render_interval
+        if not self._dirty or not due:
+            return None
+        self._dirty = False
+        self._render_due = False
+        self._rendered_at = now
+        return self.text()
+
+    def status(self) -> str:
+        """Строка состояния последнего события."""
+        return self.last.status() if self.last is not None else ""
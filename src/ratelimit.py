@@ -0,0 +1,283 @@
+"""
+Provider Rate Limiting Module
+Глобальный token-bucket лимитер запросов и токенов в минуту для LLM и Tavily.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from src.cancellation import current_cancel_token
+from src.config import AppConfig
+from src.metrics import RATE_LIMIT_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RateLimitConfig:
+    """Лимиты провайдера; 0 означает отсутствие лимита."""
+    requests_per_minute: float = 0.0
+    tokens_per_minute: float = 0.0
+
+
+class TokenBucket:
+    """Token bucket с резервированием: долг выплачивается ожиданием."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Инициализация bucket.
+
+        # START_CONTRACT_TokenBucket_init
+        # Input: rate_per_minute (float), capacity (Optional[float]), clock (Callable)
+        # Russian Intent: Создать bucket, пополняемый равномерно со скоростью rate_per_minute
+        # Output: None
+        # END_CONTRACT_TokenBucket_init
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be > 0")
+
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Пополняет bucket за прошедшее время."""
+        elapsed = max(0.0, now - self._updated_at)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate_per_second)
+        self._updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Резервирует amount токенов.
+
+        # START_CONTRACT_reserve
+        # Input: amount (float)
+        # Russian Intent: Списать токены сразу (возможно в долг) и вернуть время ожидания до погашения долга
+        # Output: float - секунды ожидания
+        # END_CONTRACT_reserve
+        """
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+    def adjust(self, delta: float) -> None:
+        """Корректирует баланс после фактического расхода (delta > 0 возвращает токены)."""
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens = min(self.capacity, self._tokens + delta)
+
+
+class SqliteTokenBucket:
+    """Token bucket, разделяемый между процессами через SQLite-файл."""
+
+    def __init__(self, db_path: str, key: str, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Инициализация межпроцессного bucket.
+
+        # START_CONTRACT_SqliteTokenBucket_init
+        # Input: db_path (str), key (str), rate_per_minute (float), capacity (Optional[float])
+        # Russian Intent: Создать bucket, общий для всех процессов с тем же файлом
+        # Output: None
+        # END_CONTRACT_SqliteTokenBucket_init
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be > 0")
+
+        self.db_path = db_path
+        self.key = key
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO token_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, self.capacity, time.time())
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает соединение в autocommit-режиме."""
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _update(self, delta: float) -> float:
+        """Атомарно пополняет bucket, применяет delta и возвращает новый баланс."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated_at = conn.execute(
+                    "SELECT tokens, updated_at FROM token_buckets WHERE key = ?", (self.key,)
+                ).fetchone()
+                now = time.time()
+                tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate_per_second)
+                tokens = min(self.capacity, tokens + delta)
+                conn.execute(
+                    "UPDATE token_buckets SET tokens = ?, updated_at = ? WHERE key = ?",
+                    (tokens, now, self.key)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return tokens
+
+    def reserve(self, amount: float) -> float:
+        """Резервирует amount токенов; возвращает секунды ожидания."""
+        tokens = self._update(-amount)
+        if tokens >= 0:
+            return 0.0
+        return -tokens / self.rate_per_second
+
+    def adjust(self, delta: float) -> None:
+        """Корректирует баланс после фактического расхода."""
+        self._update(delta)
+
+
+class RateLimiter:
+    """Лимитер запросов/мин и токенов/мин по провайдеру и модели."""
+
+    def __init__(
+        self,
+        limits: Dict[str, RateLimitConfig],
+        db_path: str = "",
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Инициализация лимитера.
+
+        # START_CONTRACT_RateLimiter_init
+        # Input: limits (Dict[str, RateLimitConfig]) - лимиты по провайдеру, db_path (str) - файл для межпроцессного режима, sleep (Callable)
+        # Russian Intent: Держать отдельные bucket для каждой пары провайдер/модель
+        # Output: None
+        # END_CONTRACT_RateLimiter_init
+        """
+        self.limits = limits
+        self.db_path = db_path
+        self._sleep = sleep
+        self._buckets: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, kind: str, provider: str, model: str, rate: float):
+        """Возвращает (создавая при необходимости) bucket для ключа."""
+        key = f"{provider}:{model}:{kind}"
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if self.db_path:
+                    bucket = SqliteTokenBucket(self.db_path, key, rate)
+                else:
+                    bucket = TokenBucket(rate)
+                self._buckets[key] = bucket
+        return bucket
+
+    def acquire(self, provider: str, model: str, tokens: int = 0) -> float:
+        """
+        Ждет разрешения на один вызов провайдера.
+
+        # START_CONTRACT_acquire
+        # Input: provider (str), model (str), tokens (int) - оценка токенов запроса
+        # Russian Intent: Выдержать лимиты rpm/tpm до отправки запроса вместо получения 429; ожидание прерывается токеном отмены запуска, резерв при этом возвращается
+        # Output: float - фактическое время ожидания в секундах или RunCancelledError
+        # END_CONTRACT_acquire
+        """
+        limit = self.limits.get(provider)
+        wait = 0.0
+        if limit is not None:
+            if limit.requests_per_minute > 0:
+                wait = max(wait, self._bucket("rpm", provider, model, limit.requests_per_minute).reserve(1))
+            if limit.tokens_per_minute > 0 and tokens > 0:
+                wait = max(wait, self._bucket("tpm", provider, model, limit.tokens_per_minute).reserve(tokens))
+
+        if wait > 0:
+            logger.debug(f"[RateLimit][acquire] Belief: Ожидание лимита | Input: provider={provider}, model={model}, tokens={tokens} | Expected: wait={wait:.2f}s")
+            cancel_token = current_cancel_token()
+            try:
+                if cancel_token is not None:
+                    cancel_token.sleep(wait)
+                else:
+                    self._sleep(wait)
+            except BaseException:
+                # Запрос так и не ушел: резерв не должен задерживать следующие вызовы
+                self._release(provider, model, tokens)
+                raise
+
+        RATE_LIMIT_WAIT_SECONDS.observe(wait, provider=provider, model=model)
+        return wait
+
+    def _release(self, provider: str, model: str, tokens: int) -> None:
+        """Возвращает в bucket резерв вызова, который не был отправлен."""
+        limit = self.limits[provider]
+        if limit.requests_per_minute > 0:
+            self._bucket("rpm", provider, model, limit.requests_per_minute).adjust(1)
+        if limit.tokens_per_minute > 0 and tokens > 0:
+            self._bucket("tpm", provider, model, limit.tokens_per_minute).adjust(tokens)
+
+    def reconcile(self, provider: str, model: str, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        Корректирует tpm-bucket по фактическому usage ответа.
+
+        # START_CONTRACT_reconcile
+        # Input: provider (str), model (str), estimated_tokens (int), actual_tokens (int)
+        # Russian Intent: Списать недооцененные токены или вернуть переоцененные
+        # Output: None
+        # END_CONTRACT_reconcile
+        """
+        limit = self.limits.get(provider)
+        if limit is None or limit.tokens_per_minute <= 0:
+            return
+        delta = estimated_tokens - actual_tokens
+        if delta:
+            self._bucket("tpm", provider, model, limit.tokens_per_minute).adjust(delta)
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (≈4 символа на токен)."""
+    return max(1, len(text) // 4)
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(config: AppConfig) -> RateLimiter:
+    """
+    Возвращает лимитер, общий для всех сессий и стадий процесса.
+
+    # START_CONTRACT_get_rate_limiter
+    # Input: config (AppConfig)
+    # Russian Intent: Создать один process-wide лимитер по лимитам из конфигурации
+    # Output: RateLimiter
+    # END_CONTRACT_get_rate_limiter
+    """
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            logger.debug("[RateLimit][get_rate_limiter] Belief: Создание общего лимитера | Input: config | Expected: RateLimiter")
+            _shared_limiter = RateLimiter(
+                {
+                    "llm": RateLimitConfig(config.llm_requests_per_minute, config.llm_tokens_per_minute),
+                    "tavily": RateLimitConfig(config.search_requests_per_minute),
+                },
+                db_path=config.rate_limit_db_path
+            )
+        return _shared_limiter
@@ -4,10 +4,12 @@ Research Aggregator Module
 """
 
 import logging
-from typing import List, Dict, Any
+import re
+from typing import List, Dict, Any, Optional
 from dataclasses import dataclass, field
 
 from src.clients import TavilyClientWrapper
+from src.concurrency import fan_out
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +31,42 @@ class ResearchAggregate:
     fail_count: int = 0
 
 
+@dataclass
+class BatchQueryPlan:
+    """План общего поиска для пакета тем."""
+    unique_queries: List[str] = field(default_factory=list)
+    topic_keys: Dict[str, List[str]] = field(default_factory=dict)
+    total_queries: int = 0
+
+
+def _search_item(query: str, tavily_client: TavilyClientWrapper, max_results: int) -> ResearchItem:
+    """Выполняет один запрос и превращает ответ в ResearchItem."""
+    response = tavily_client.search_once(query, max_results)
+
+    if response and "results" in response:
+        return ResearchItem(
+            query=query,
+            success=True,
+            results=response["results"]
+        )
+    return ResearchItem(
+        query=query,
+        success=False,
+        error="Search failed or returned no results"
+    )
+
+
+def _add_item(aggregate: ResearchAggregate, item: ResearchItem, position: int, total: int) -> None:
+    """Добавляет элемент в агрегат и обновляет счетчики."""
+    if item.success:
+        aggregate.success_count += 1
+        logger.info(f"[Research] Query {position} succeeded: {len(item.results)} results")
+    else:
+        aggregate.fail_count += 1
+        logger.warning(f"[Research] Query {position} failed")
+    aggregate.items.append(item)
+
+
 def run_sequential_search(
     queries: List[str],
     tavily_client: TavilyClientWrapper,
@@ -49,32 +87,130 @@ def run_sequential_search(
 
     for i, query in enumerate(queries, 1):
         logger.info(f"[Research] Searching query {i}/{len(queries)}: {query}")
-
-        response = tavily_client.search_once(query, max_results)
-
-        if response and "results" in response:
-            item = ResearchItem(
-                query=query,
-                success=True,
-                results=response["results"]
-            )
-            aggregate.success_count += 1
-            logger.info(f"[Research] Query {i} succeeded: {len(response['results'])} results")
-        else:
-            item = ResearchItem(
-                query=query,
-                success=False,
-                error="Search failed or returned no results"
-            )
-            aggregate.fail_count += 1
-            logger.warning(f"[Research] Query {i} failed")
-
-        aggregate.items.append(item)
+        _add_item(aggregate, _search_item(query, tavily_client, max_results), i, len(queries))
 
     logger.debug(f"[Research][run_sequential_search] Belief: Поиск завершен | Input: queries, max_results | Expected: ResearchAggregate, Success: {aggregate.success_count}, Failed: {aggregate.fail_count}")
     return aggregate
 
 
+def run_parallel_search(
+    queries: List[str],
+    tavily_client: TavilyClientWrapper,
+    max_results: int = 5,
+    max_workers: int = 4
+) -> ResearchAggregate:
+    """
+    Выполняет поиск по списку query параллельно.
+
+    # START_CONTRACT_run_parallel_search
+    # Input: queries (List[str]), tavily_client (TavilyClientWrapper), max_results (int), max_workers (int)
+    # Russian Intent: Выполнить поиск с fan-out (в полете не больше лимита AIMD-контроллера клиента), сохранив порядок запросов
+    # Output: ResearchAggregate - агрегированные результаты в порядке queries
+    # END_CONTRACT_run_parallel_search
+    """
+    logger.debug("[Research][run_parallel_search] Belief: Начало параллельного поиска | Input: queries, max_results, max_workers | Expected: ResearchAggregate")
+
+    if max_workers <= 1:
+        return run_sequential_search(queries, tavily_client, max_results)
+
+    items: List[ResearchItem] = [None] * len(queries)
+    for index, item in fan_out(queries, lambda query: _search_item(query, tavily_client, max_results), max_workers):
+        items[index] = item
+
+    aggregate = ResearchAggregate()
+    for i, item in enumerate(items, 1):
+        _add_item(aggregate, item, i, len(items))
+
+    logger.debug(f"[Research][run_parallel_search] Belief: Поиск завершен | Input: queries, max_results, max_workers | Expected: ResearchAggregate, Success: {aggregate.success_count}, Failed: {aggregate.fail_count}")
+    return aggregate
+
+
+def normalize_query(query: str) -> str:
+    """
+    Приводит поисковый запрос к канонической форме для дедупликации.
+
+    # START_CONTRACT_normalize_query
+    # Input: query (str)
+    # Russian Intent: Нормализовать регистр, пунктуацию и пробелы запроса
+    # Output: str - ключ дедупликации
+    # END_CONTRACT_normalize_query
+    """
+    lowered = query.casefold()
+    without_punctuation = re.sub(r"[^\w\s]", " ", lowered)
+    return " ".join(without_punctuation.split())
+
+
+def plan_batch_queries(topic_queries: Dict[str, List[str]]) -> BatchQueryPlan:
+    """
+    Строит общий план поиска для пакета тем.
+
+    # START_CONTRACT_plan_batch_queries
+    # Input: topic_queries (Dict[str, List[str]]) - запросы каждой темы
+    # Russian Intent: Дедуплицировать запросы всех тем до выполнения поиска
+    # Output: BatchQueryPlan - уникальные запросы и ключи каждой темы
+    # END_CONTRACT_plan_batch_queries
+    """
+    logger.debug("[Research][plan_batch_queries] Belief: Планирование общего поиска | Input: topic_queries | Expected: BatchQueryPlan")
+
+    plan = BatchQueryPlan()
+    seen = set()
+
+    for topic, queries in topic_queries.items():
+        keys = []
+        for query in queries:
+            plan.total_queries += 1
+            key = normalize_query(query)
+            if not key:
+                continue
+            if key not in seen:
+                seen.add(key)
+                plan.unique_queries.append(query)
+            if key not in keys:
+                keys.append(key)
+        plan.topic_keys[topic] = keys
+
+    logger.debug(f"[Research][plan_batch_queries] Belief: План построен | Input: topic_queries | Expected: BatchQueryPlan, Unique: {len(plan.unique_queries)}, Total: {plan.total_queries}")
+    return plan
+
+
+def run_batch_search(
+    topic_queries: Dict[str, List[str]],
+    tavily_client: TavilyClientWrapper,
+    max_results: int = 5,
+    max_workers: int = 1,
+    plan: Optional[BatchQueryPlan] = None
+) -> Dict[str, ResearchAggregate]:
+    """
+    Выполняет общий поиск для пакета тем и раздает результаты по темам.
+
+    # START_CONTRACT_run_batch_search
+    # Input: topic_queries (Dict[str, List[str]]), tavily_client (TavilyClientWrapper), max_results (int), max_workers (int), plan (Optional[BatchQueryPlan]) - уже построенный план этих тем
+    # Russian Intent: Выполнить каждый уникальный запрос один раз и раздать результат всем темам
+    # Output: Dict[str, ResearchAggregate] - агрегаты по каждой теме
+    # END_CONTRACT_run_batch_search
+    """
+    logger.debug("[Research][run_batch_search] Belief: Начало общего поиска | Input: topic_queries, max_results | Expected: Dict[str, ResearchAggregate]")
+
+    plan = plan or plan_batch_queries(topic_queries)
+    shared = run_parallel_search(plan.unique_queries, tavily_client, max_results, max_workers)
+    items_by_key = {normalize_query(item.query): item for item in shared.items}
+
+    aggregates = {}
+    for topic, keys in plan.topic_keys.items():
+        aggregate = ResearchAggregate()
+        for key in keys:
+            item = items_by_key[key]
+            aggregate.items.append(item)
+            if item.success:
+                aggregate.success_count += 1
+            else:
+                aggregate.fail_count += 1
+        aggregates[topic] = aggregate
+
+    logger.info(f"[Research] Batch search: {len(plan.unique_queries)} unique of {plan.total_queries} queries for {len(plan.topic_keys)} topics")
+    return aggregates
+
+
 def merge_research_items(aggregate: ResearchAggregate) -> List[Dict[str, Any]]:
     """
     Объединяет все успешные результаты исследования.
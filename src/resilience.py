@@ -0,0 +1,215 @@
+"""
+Provider Resilience Module
+Повторы с экспоненциальной задержкой, классификация ошибок, дедлайны вызовов и hedged-запросы.
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional, TypeVar
+
+from src.cancellation import AbortScope, current_abort_scope, use_abort_scope
+from src.concurrency import is_overload_error
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+ERROR_RETRYABLE = "retryable"
+ERROR_FATAL = "fatal"
+
+_CONNECTION_ERROR_NAMES = ("APIConnectionError", "ConnectionError", "ConnectTimeout", "ReadTimeout", "RemoteDisconnected")
+
+
+@dataclass
+class RetryPolicy:
+    """Политика повторов вызова провайдера."""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    attempt_timeout: Optional[float] = None
+    deadline_seconds: Optional[float] = None
+
+    # START_CONTRACT_RetryPolicy
+    # Input: max_attempts, base_delay, max_delay, attempt_timeout, deadline_seconds
+    # Russian Intent: Описать число попыток, jittered backoff, таймаут попытки и общий дедлайн вызова
+    # Output: Валидный RetryPolicy
+    # END_CONTRACT_RetryPolicy
+
+    def __post_init__(self):
+        """Валидация политики."""
+        if self.max_attempts < 1:
+            raise ValueError("max_attempts must be >= 1")
+        if self.base_delay < 0 or self.max_delay < self.base_delay:
+            raise ValueError("Delays must satisfy 0 <= base_delay <= max_delay")
+
+
+class DeadlineExceededError(TimeoutError):
+    """Истек общий дедлайн вызова провайдера."""
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Классифицирует ошибку провайдера.
+
+    # START_CONTRACT_classify_error
+    # Input: error (BaseException)
+    # Russian Intent: Повторять только транзиентные ошибки (429, 5xx, таймауты, сетевые сбои); ошибки запроса и авторизации фатальны
+    # Output: str - ERROR_RETRYABLE | ERROR_FATAL
+    # END_CONTRACT_classify_error
+    """
+    if isinstance(error, DeadlineExceededError):
+        return ERROR_FATAL
+    if is_overload_error(error):
+        return ERROR_RETRYABLE
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int) and status_code in (408, 409):
+        return ERROR_RETRYABLE
+    if any(cls.__name__ in _CONNECTION_ERROR_NAMES for cls in type(error).__mro__):
+        return ERROR_RETRYABLE
+    return ERROR_FATAL
+
+
+def backoff_delay(attempt: int, policy: RetryPolicy, rng: Callable[[], float] = random.random) -> float:
+    """Full-jitter задержка перед повтором номер attempt (с 1)."""
+    ceiling = min(policy.max_delay, policy.base_delay * (2 ** (attempt - 1)))
+    return ceiling * rng()
+
+
+def call_with_retry(
+    fn: Callable[[Optional[float]], R],
+    policy: RetryPolicy,
+    operation: str = "call",
+    on_retry: Optional[Callable[[int, BaseException, float], None]] = None,
+    sleep: Callable[[float], None] = time.sleep,
+    clock: Callable[[], float] = time.monotonic
+) -> R:
+    """
+    Выполняет вызов с повторами транзиентных ошибок.
+
+    # START_CONTRACT_call_with_retry
+    # Input: fn (Callable[[timeout], R]) - вызов, получающий таймаут попытки, policy (RetryPolicy), operation (str), on_retry, sleep, clock
+    # Russian Intent: Повторять транзиентные сбои с jittered backoff, не выходя за общий дедлайн
+    # Output: R - результат первой успешной попытки; иначе последняя ошибка
+    # END_CONTRACT_call_with_retry
+    """
+    deadline = clock() + policy.deadline_seconds if policy.deadline_seconds else None
+    attempt = 0
+
+    while True:
+        attempt += 1
+        timeout = policy.attempt_timeout
+        if deadline is not None:
+            remaining = deadline - clock()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"{operation}: deadline of {policy.deadline_seconds}s exceeded")
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        try:
+            return fn(timeout)
+        except Exception as e:
+            if classify_error(e) == ERROR_FATAL or attempt >= policy.max_attempts:
+                raise
+            delay = backoff_delay(attempt, policy)
+            if deadline is not None and clock() + delay >= deadline:
+                raise
+            logger.warning(f"[Resilience] {operation}: attempt {attempt}/{policy.max_attempts} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            sleep(delay)
+
+
+class LatencyTracker:
+    """Скользящее окно латентностей для оценки перцентилей."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """
+        Инициализация трекера.
+
+        # START_CONTRACT_LatencyTracker_init
+        # Input: window (int), min_samples (int)
+        # Russian Intent: Хранить последние латентности вызовов для вычисления p95
+        # Output: None
+        # END_CONTRACT_LatencyTracker_init
+        """
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        """Добавляет измерение."""
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Возвращает перцентиль q (0..1) или None, пока измерений недостаточно."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+def hedged_call(fn: Callable[[], R], hedge_after: Optional[float], executor: ThreadPoolExecutor = _hedge_executor) -> R:
+    """
+    Выполняет вызов с дублирующим запросом после hedge_after секунд.
+
+    # START_CONTRACT_hedged_call
+    # Input: fn (Callable[[], R]), hedge_after (Optional[float]) - обычно p95 латентности, executor (ThreadPoolExecutor)
+    # Russian Intent: Срезать хвост латентности: если первый запрос не уложился в p95, отправить дубликат, взять первый успешный ответ и прервать проигравший
+    # Output: R - результат быстрейшего успешного запроса
+    # END_CONTRACT_hedged_call
+    """
+    if hedge_after is None:
+        return fn()
+
+    scopes: Dict[Future, AbortScope] = {}
+    primary = _submit_hedge(executor, fn, scopes)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    logger.info(f"[Resilience] Hedging request after {hedge_after:.2f}s")
+    secondary = _submit_hedge(executor, fn, scopes)
+    pending = {primary, secondary}
+    last_error: Optional[BaseException] = None
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is None:
+                for loser in pending:
+                    _abandon(loser, scopes[loser])
+                return future.result()
+            last_error = error
+
+    raise last_error
+
+
+def _submit_hedge(executor: ThreadPoolExecutor, fn: Callable[[], R], scopes: Dict[Future, AbortScope]) -> Future:
+    """Запускает копию запроса в собственной области прерывания (дочерней к области вызывающего)."""
+    scope = AbortScope(parent=current_abort_scope())
+
+    def run() -> R:
+        with use_abort_scope(scope):
+            return fn()
+
+    future = executor.submit(contextvars.copy_context().run, run)
+    scopes[future] = scope
+    return future
+
+
+def _abandon(future: Future, scope: AbortScope) -> None:
+    """Прерывает проигравший запрос: еще не начатый отменяется, идущий закрывает стрим и возвращает слот и токены."""
+    future.cancel()
+    scope.abort()
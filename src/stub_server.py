@@ -0,0 +1,332 @@
+"""
+Provider Stub Server Module
+Локальный HTTP-сервер, совместимый с OpenAI Chat Completions и Tavily Search, для нагрузочных тестов реального HTTP-пути.
+
+Запуск: python -m src.stub_server --port 8900 --ttft 0.3 --tokens-per-second 80 --llm-429-rate 0.05
+Затем: LLM_BASE_URL=http://127.0.0.1:8900/v1 и TAVILY_BASE_URL=http://127.0.0.1:8900
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Sequence
+
+from src.benchmark import LatencyProfile, simulated_reply, simulated_search_results
+
+logger = logging.getLogger(__name__)
+
+# Размер чанка SSE-стрима в токенах (~4 символа на токен)
+STREAM_CHUNK_TOKENS = 8
+
+
+@dataclass
+class StubConfig:
+    """Поведение заглушки; меняется на лету через POST /_stub/config."""
+    ttft: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_seconds=0.2))
+    tokens_per_second: float = 0.0
+    llm_429_rate: float = 0.0
+    search: LatencyProfile = field(default_factory=lambda: LatencyProfile(median_seconds=0.1))
+    search_429_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    size_factor: float = 1.0
+    raw_content_chars: int = 4000
+
+    # START_CONTRACT_StubConfig
+    # Input: ttft (LatencyProfile) - время до первого токена, tokens_per_second (float) - скорость генерации (0 = мгновенно), llm_429_rate, search (LatencyProfile), search_429_rate, retry_after_seconds, size_factor, raw_content_chars
+    # Russian Intent: Описать латентность, скорость токенов и долю 429 заглушки провайдеров
+    # Output: StubConfig
+    # END_CONTRACT_StubConfig
+
+    def update(self, values: Dict[str, object]) -> None:
+        """Применяет частичное обновление из JSON (профили задаются словарями)."""
+        known = {f.name for f in fields(self)}
+        for name, value in values.items():
+            if name not in known:
+                raise ValueError(f"Unknown stub setting {name!r}")
+            if name in ("ttft", "search"):
+                value = LatencyProfile(**{**asdict(getattr(self, name)), **value})
+            setattr(self, name, value)
+
+
+class StubStats:
+    """Счетчики запросов заглушки."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def inc(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Маршруты: /v1/chat/completions, /search, /_stub/config, /_stub/stats, /health."""
+
+    protocol_version = "HTTP/1.1"
+    config: StubConfig
+    stats: StubStats
+    rng: random.Random
+    rng_lock: threading.Lock
+
+    def log_message(self, format: str, *args) -> None:
+        """Логи на каждый запрос под нагрузкой только мешают."""
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chance(self, rate: float) -> bool:
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def _sample(self, profile: LatencyProfile) -> float:
+        with self.rng_lock:
+            return profile.sample(self.rng)
+
+    def _rate_limited(self, rate: float, key: str) -> bool:
+        """Отвечает 429 с Retry-After с заданной вероятностью."""
+        if not self._chance(rate):
+            return False
+        self.stats.inc(f"{key}_429")
+        self._send_json(
+            429,
+            {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+            {"Retry-After": f"{self.config.retry_after_seconds:g}"}
+        )
+        return True
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/_stub/stats":
+            self._send_json(200, self.stats.snapshot())
+        elif path == "/_stub/config":
+            self._send_json(200, asdict(self.config))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+
+    def do_POST(self) -> None:
+        path = self.path.split("?", 1)[0]
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        if path in ("/v1/chat/completions", "/chat/completions"):
+            self._chat_completions(payload)
+        elif path == "/search":
+            self._search(payload)
+        elif path == "/_stub/config":
+            try:
+                self.config.update(payload)
+            except (TypeError, ValueError) as e:
+                self._send_json(400, {"error": {"message": str(e)}})
+                return
+            self._send_json(200, asdict(self.config))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+
+    def _chat_completions(self, payload: dict) -> None:
+        """Chat Completions: обычный ответ или SSE-стрим, JSON mode через response_format."""
+        self.stats.inc("chat_completions")
+        if self._rate_limited(self.config.llm_429_rate, "chat_completions"):
+            return
+
+        messages = payload.get("messages") or [{"content": ""}]
+        system_prompt = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        content = simulated_reply(system_prompt, messages[-1].get("content", ""), self.config.size_factor)
+        if (payload.get("response_format") or {}).get("type") == "json_object":
+            try:
+                json.loads(content)
+            except ValueError:
+                content = json.dumps({"content": content}, ensure_ascii=False)
+
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion_tokens = max(1, len(content) // 4)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = payload.get("model", "stub-model")
+        time.sleep(self._sample(self.config.ttft))
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if payload.get("stream"):
+            include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+            self._stream(completion_id, model, content, usage if include_usage else None)
+            return
+
+        if self.config.tokens_per_second > 0:
+            time.sleep(completion_tokens / self.config.tokens_per_second)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id: str, model: str, content: str, usage: Optional[dict] = None) -> None:
+        """SSE-стрим чанков chat.completion.chunk со скоростью tokens_per_second; usage - финальным чанком (stream_options.include_usage)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: dict, finish_reason: Optional[str] = None) -> bytes:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        chunk_chars = STREAM_CHUNK_TOKENS * 4
+        delay = STREAM_CHUNK_TOKENS / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0.0
+        try:
+            self.wfile.write(event({"role": "assistant", "content": ""}))
+            for start in range(0, len(content), chunk_chars):
+                if delay:
+                    time.sleep(delay)
+                self.wfile.write(event({"content": content[start:start + chunk_chars]}))
+                self.wfile.flush()
+            self.wfile.write(event({}, "stop"))
+            if usage is not None:
+                final = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент закрыл стрим (отмена запуска) - генерация прекращается
+            self.stats.inc("stream_aborted")
+
+    def _search(self, payload: dict) -> None:
+        """Tavily Search: results с raw_content заданного объема."""
+        self.stats.inc("search")
+        if self._rate_limited(self.config.search_429_rate, "search"):
+            return
+        time.sleep(self._sample(self.config.search))
+        started_at = time.monotonic()
+        response = simulated_search_results(
+            payload.get("query", ""),
+            int(payload.get("max_results") or 5),
+            self.config.raw_content_chars
+        )
+        response["response_time"] = round(time.monotonic() - started_at, 3)
+        self._send_json(200, response)
+
+
+def start_stub_server(
+    config: Optional[StubConfig] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    seed: int = 0
+) -> ThreadingHTTPServer:
+    """
+    Запускает заглушку провайдеров в фоновом потоке.
+
+    # START_CONTRACT_start_stub_server
+    # Input: config (Optional[StubConfig]), host (str), port (int) - 0 = свободный порт, seed (int)
+    # Russian Intent: Поднять локальные OpenAI- и Tavily-совместимые эндпоинты для тестов через настоящие SDK и HTTP-пулы
+    # Output: ThreadingHTTPServer - атрибуты stub_config и stub_stats; shutdown() останавливает
+    # END_CONTRACT_start_stub_server
+    """
+    logger.debug(f"[StubServer][start_stub_server] Belief: Запуск заглушки провайдеров | Input: host={host}, port={port} | Expected: ThreadingHTTPServer")
+
+    config = config or StubConfig()
+    stats = StubStats()
+    handler = type("StubHandler", (_StubHandler,), {
+        "config": config,
+        "stats": stats,
+        "rng": random.Random(seed),
+        "rng_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stub_config = config
+    server.stub_stats = stats
+    threading.Thread(target=server.serve_forever, name="provider-stub", daemon=True).start()
+    logger.info(f"[StubServer] Listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    CLI заглушки провайдеров.
+
+    # START_CONTRACT_stub_main
+    # Input: argv (Optional[Sequence[str]])
+    # Russian Intent: Запустить заглушку с латентностью, скоростью токенов и долей 429 из аргументов и работать до Ctrl+C
+    # Output: int - код выхода
+    # END_CONTRACT_stub_main
+    """
+    parser = argparse.ArgumentParser(description="OpenAI/Tavily-compatible stub server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ttft", type=float, default=0.2, help="медиана времени до первого токена, с")
+    parser.add_argument("--ttft-jitter", type=float, default=0.3, help="sigma логнормального разброса TTFT")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="скорость генерации (0 = мгновенно)")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="доля ответов 429 для chat completions")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="медиана латентности поиска, с")
+    parser.add_argument("--search-jitter", type=float, default=0.3)
+    parser.add_argument("--search-429-rate", type=float, default=0.0, help="доля ответов 429 для поиска")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="значение Retry-After в ответах 429, с")
+    parser.add_argument("--size-factor", type=float, default=1.0, help="объем глав относительно лимита слов")
+    parser.add_argument("--raw-content-chars", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = StubConfig(
+        ttft=LatencyProfile(args.ttft, args.ttft_jitter),
+        tokens_per_second=args.tokens_per_second,
+        llm_429_rate=args.llm_429_rate,
+        search=LatencyProfile(args.search_latency, args.search_jitter),
+        search_429_rate=args.search_429_rate,
+        retry_after_seconds=args.retry_after,
+        size_factor=args.size_factor,
+        raw_content_chars=args.raw_content_chars
+    )
+    server = start_stub_server(config, args.host, args.port, args.seed)
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"LLM_BASE_URL={base}/v1\nTAVILY_BASE_URL={base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
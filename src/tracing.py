@@ -0,0 +1,352 @@
+"""
+Tracing Module
+Структурные спаны стадий pipeline и вызовов провайдеров с экспортом в JSONL и OTLP/HTTP JSON.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+SPAN_STATUS_OK = "ok"
+SPAN_STATUS_ERROR = "error"
+
+_STOP = object()
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    """Случайный 128-битный идентификатор трассы (hex)."""
+    return os.urandom(16).hex()
+
+
+def _new_span_id() -> str:
+    """Случайный 64-битный идентификатор спана (hex)."""
+    return os.urandom(8).hex()
+
+
+@dataclass
+class Span:
+    """Один завершенный или выполняющийся участок работы."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_time: float = 0.0
+    end_time: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = SPAN_STATUS_OK
+    error: Optional[str] = None
+    _tracer: Optional["Tracer"] = field(default=None, repr=False, compare=False)
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Длительность в секундах для завершенного спана."""
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set(self, **attributes: Any) -> None:
+        """Добавляет атрибуты спана."""
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException) -> None:
+        """Отмечает спан ошибкой."""
+        self.status = SPAN_STATUS_ERROR
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        """Завершает спан и передает его экспортерам (повторный вызов игнорируется)."""
+        if self.end_time is not None:
+            return
+        self.end_time = time.time()
+        if self._tracer is not None:
+            self._tracer._export(self)
+
+    def to_dict(self) -> dict:
+        """Сериализация для JSONL."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class JsonlSpanExporter:
+    """Дописывает завершенные спаны в JSONL-файл."""
+
+    def __init__(self, path: str):
+        """
+        Инициализация экспортера.
+
+        # START_CONTRACT_JsonlSpanExporter_init
+        # Input: path (str)
+        # Russian Intent: Сохранять спаны построчно для профилирования медленных запусков задним числом
+        # Output: None
+        # END_CONTRACT_JsonlSpanExporter_init
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+
+    def export(self, spans: List[Span]) -> None:
+        """Дописывает спаны в файл."""
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def shutdown(self) -> None:
+        """Нечего сбрасывать: запись синхронная."""
+
+
+def _otlp_value(value: Any) -> dict:
+    """Преобразует значение атрибута в OTLP AnyValue."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp_json(spans: List[Span], service_name: str = "lead-magnet-generator") -> dict:
+    """
+    Преобразует спаны в тело запроса OTLP/HTTP JSON.
+
+    # START_CONTRACT_to_otlp_json
+    # Input: spans (List[Span]), service_name (str)
+    # Russian Intent: Экспортировать спаны в формате, который принимает OpenTelemetry Collector (POST /v1/traces)
+    # Output: dict - ExportTraceServiceRequest
+    # END_CONTRACT_to_otlp_json
+    """
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(span.start_time * 1e9)),
+            "endTimeUnixNano": str(int((span.end_time or span.start_time) * 1e9)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error or ""} if span.status == SPAN_STATUS_ERROR else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "src.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+class OtlpHttpSpanExporter:
+    """Пакетно отправляет спаны в локальный OpenTelemetry Collector по OTLP/HTTP JSON."""
+
+    def __init__(self, endpoint: str, batch_size: int = 100, flush_interval: float = 2.0, timeout: float = 5.0):
+        """
+        Инициализация экспортера.
+
+        # START_CONTRACT_OtlpHttpSpanExporter_init
+        # Input: endpoint (str) - например http://localhost:4318, batch_size (int), flush_interval (float), timeout (float)
+        # Russian Intent: Отправлять спаны в фоне, не задерживая pipeline сетевыми вызовами коллектора
+        # Output: None
+        # END_CONTRACT_OtlpHttpSpanExporter_init
+        """
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._worker.start()
+
+    def export(self, spans: List[Span]) -> None:
+        """Ставит спаны в очередь отправки."""
+        for span in spans:
+            self._queue.put(span)
+
+    def _run(self) -> None:
+        """Фоновый цикл: копит пакет и отправляет по размеру или по таймеру."""
+        batch: List[Span] = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._send(batch)
+                return
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                self._send(batch)
+                batch = []
+                last_flush = time.monotonic()
+
+    def _send(self, batch: List[Span]) -> None:
+        """POST пакета; ошибки коллектора только логируются."""
+        if not batch:
+            return
+        body = json.dumps(to_otlp_json(batch)).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except Exception as e:
+            logger.warning(f"[Tracing] OTLP export of {len(batch)} spans failed: {e}")
+
+    def shutdown(self) -> None:
+        """Отправляет накопленные спаны и останавливает фоновый поток."""
+        self._queue.put(_STOP)
+        self._worker.join(self.timeout + 1.0)
+
+
+class Tracer:
+    """Создает спаны и передает завершенные экспортерам."""
+
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        """
+        Инициализация трассировщика.
+
+        # START_CONTRACT_Tracer_init
+        # Input: exporters (Optional[List]) - объекты с методами export(spans) и shutdown()
+        # Russian Intent: Единая точка создания спанов для оркестратора и клиентов
+        # Output: None
+        # END_CONTRACT_Tracer_init
+        """
+        self.exporters = list(exporters or [])
+
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[Span] = None,
+        trace_id: Optional[str] = None,
+        **attributes: Any
+    ) -> Span:
+        """
+        Открывает спан.
+
+        # START_CONTRACT_start_span
+        # Input: name (str), parent (Optional[Span]) - по умолчанию текущий спан контекста, trace_id (Optional[str]) - для корневого спана запуска, attributes
+        # Russian Intent: Создать спан, привязанный к трассе запуска; завершается явным end()
+        # Output: Span
+        # END_CONTRACT_start_span
+        """
+        parent = parent or _current_span.get()
+        if parent is not None:
+            trace_id = parent.trace_id
+        return Span(
+            name=name,
+            trace_id=trace_id or new_trace_id(),
+            span_id=_new_span_id(),
+            parent_id=parent.span_id if parent is not None else None,
+            start_time=time.time(),
+            attributes=dict(attributes),
+            _tracer=self
+        )
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Спан на время блока, дочерний к текущему (блок не должен содержать yield генератора).
+
+        # START_CONTRACT_span
+        # Input: name (str), attributes
+        # Russian Intent: Измерить вызов провайдера или участок стадии и отметить ошибку
+        # Output: Iterator[Span]
+        # END_CONTRACT_span
+        """
+        span = self.start_span(name, **attributes)
+        with use_span(span):
+            try:
+                yield span
+            except BaseException as e:
+                span.fail(e)
+                raise
+            finally:
+                span.end()
+
+    def _export(self, span: Span) -> None:
+        """Передает завершенный спан экспортерам, не роняя pipeline."""
+        for exporter in self.exporters:
+            try:
+                exporter.export([span])
+            except Exception as e:
+                logger.warning(f"[Tracing] Span export failed: {e}")
+
+    def shutdown(self) -> None:
+        """Сбрасывает экспортеры."""
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+def current_span() -> Optional[Span]:
+    """Возвращает спан текущего контекста."""
+    return _current_span.get()
+
+
+@contextmanager
+def use_span(span: Optional[Span]) -> Iterator[Optional[Span]]:
+    """Делает спан текущим (родителем) для вложенных вызовов внутри блока."""
+    reset_token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(reset_token)
+
+
+_tracer = Tracer()
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Возвращает трассировщик процесса (без экспортеров, пока не вызван configure_tracing)."""
+    return _tracer
+
+
+def configure_tracing(config: AppConfig) -> Tracer:
+    """
+    Настраивает экспортеры трассировщика процесса по конфигурации.
+
+    # START_CONTRACT_configure_tracing
+    # Input: config (AppConfig)
+    # Russian Intent: Включить экспорт спанов в JSONL и/или OTLP-коллектор; повторный вызов не дублирует экспортеры
+    # Output: Tracer
+    # END_CONTRACT_configure_tracing
+    """
+    logger.debug("[Tracing][configure_tracing] Belief: Настройка экспорта спанов | Input: config | Expected: Tracer")
+
+    with _tracer_lock:
+        if _tracer.exporters:
+            return _tracer
+        if config.trace_jsonl_path:
+            _tracer.exporters.append(JsonlSpanExporter(config.trace_jsonl_path))
+        if config.otlp_endpoint:
+            _tracer.exporters.append(OtlpHttpSpanExporter(config.otlp_endpoint))
+    return _tracer
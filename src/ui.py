@@ -5,18 +5,48 @@ Gradio Presentation & Streaming UX Module
 
 import logging
 import os
-from typing import Generator, Tuple, Optional
+import shutil
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, Tuple, Optional
 
 import gradio as gr
 from dotenv import load_dotenv
 
-from src.config import load_env_config, UiSettings, save_ui_settings, validate_ui_settings
-from src.clients import LlmClient, TavilyClientWrapper
+from src.config import UiSettings, validate_ui_settings
+from src.app_context import get_app_context
+from src.artifacts import ArtifactStore, LocalArtifactBackend
+from src.catalog import OutputCatalog, get_output_catalog
 from src.orchestrator import GenerationOrchestrator
-from src.errors import format_ui_error, stream_logs, StageError
+from src.jobs import start_worker_pool
+from src.coalescing import SingleFlight, build_run_key
+from src.cancellation import CancelToken
+from src.tracing import configure_tracing
+from src.metrics import start_metrics_server
+from src.warmup import warm_up
+from src.errors import format_ui_error, StageError
+from src.progress import ProgressLog, ProgressTracker, progress_events
 
 logger = logging.getLogger(__name__)
 
+# Общий для всех сессий реестр выполняющихся запусков
+GENERATION_FLIGHTS = SingleFlight()
+
+# Остановка текущей генерации сессии: session_hash -> stop(user_requested)
+_SESSION_STOPS: Dict[str, Callable[[bool], None]] = {}
+_SESSION_STOPS_LOCK = threading.Lock()
+
+# Путь частичного документа текущей генерации сессии: session_hash -> partial_path()
+_SESSION_PARTIALS: Dict[str, Callable[[], Optional[str]]] = {}
+
+# Оркестраторы выполняющихся запусков по ключу запуска (живут, пока идет pipeline)
+_RUN_ORCHESTRATORS: "weakref.WeakValueDictionary[str, GenerationOrchestrator]" = weakref.WeakValueDictionary()
+
+# Пул worker не запустился: генерация идет в обработчике, а не в очереди без исполнителей
+_JOB_QUEUE_UNAVAILABLE = threading.Event()
+
 
 def build_ui() -> gr.Blocks:
     """
@@ -41,9 +71,23 @@ def build_ui() -> gr.Blocks:
                     placeholder="Введите тему для генерации...",
                     lines=2
                 )
-                generate_btn = gr.Button("Сгенерировать", variant="primary", size="lg")
+                with gr.Row():
+                    generate_btn = gr.Button("Сгенерировать", variant="primary", size="lg")
+                    stop_btn = gr.Button("Остановить", variant="stop", size="lg")
+                partial_btn = gr.Button("Скачать частичный документ", size="sm")
+                partial_file = gr.File(label="Частичный документ", interactive=False)
 
                 with gr.Accordion("Настройки", open=True):
+                    preset_radio = gr.Radio(
+                        choices=[
+                            ("Быстро (~1 мин)", "speed"),
+                            ("Сбалансированно", "balanced"),
+                            ("Максимальное качество", "thorough"),
+                            ("Вручную", "custom")
+                        ],
+                        value="balanced",
+                        label="Режим генерации"
+                    )
                     words_slider = gr.Slider(
                         minimum=100,
                         maximum=1000,
@@ -78,9 +122,18 @@ def build_ui() -> gr.Blocks:
                     )
                     section_editors_checkbox = gr.Checkbox(
                         value=True,
-                        label="Промежуточные редакторы глав"
+                        label="Промежуточные редакторы глав (режим «Вручную»)"
+                    )
+
+                with gr.Accordion("Готовые документы", open=False):
+                    library_search = gr.Textbox(
+                        label="Поиск по заголовку и теме",
+                        placeholder="Слова заголовка или темы..."
                     )
+                    library_list = gr.Dropdown(label="Документы", choices=[], interactive=True)
+                    open_btn = gr.Button("Открыть")
 
+                progress_status = gr.Markdown(elem_id="progress-status")
                 logs_output = gr.Textbox(
                     label="Логи выполнения",
                     lines=10,
@@ -92,7 +145,7 @@ def build_ui() -> gr.Blocks:
             with gr.Column(scale=2):
                 markdown_output = gr.Markdown(label="Статья", elem_id="article-preview")
 
-        generate_btn.click(
+        generate_event = generate_btn.click(
             fn=on_generate_click,
             inputs=[
                 topic_input,
@@ -101,15 +154,38 @@ def build_ui() -> gr.Blocks:
                 temp_slider,
                 editor_temp_slider,
                 keep_links_checkbox,
-                section_editors_checkbox
+                section_editors_checkbox,
+                preset_radio
             ],
-            outputs=[logs_output, markdown_output]
+            outputs=[logs_output, markdown_output, progress_status],
+            api_name="generate"
         )
+        stop_btn.click(fn=on_stop_click, inputs=None, outputs=None, cancels=[generate_event])
+        partial_btn.click(fn=on_partial_download, inputs=None, outputs=[partial_file])
+        generate_event.then(fn=on_library_search, inputs=[library_search], outputs=[library_list])
+        library_search.change(fn=on_library_search, inputs=[library_search], outputs=[library_list])
+        open_btn.click(fn=on_open_document, inputs=[library_list], outputs=[logs_output, markdown_output, progress_status])
+        demo.load(fn=on_library_search, inputs=[library_search], outputs=[library_list])
+        demo.unload(on_session_unload)
 
     logger.debug("[UI][build_ui] Belief: Gradio UI построен | Input: None | Expected: gr.Blocks")
     return demo
 
 
+def configure_queue(demo: gr.Blocks, concurrency_limit: int = 4, max_size: int = 0) -> gr.Blocks:
+    """
+    Настраивает очередь Gradio.
+
+    # START_CONTRACT_configure_queue
+    # Input: demo (gr.Blocks), concurrency_limit (int) - одновременных генераций на инстанс, max_size (int) - мест в очереди, 0 = без ограничения
+    # Russian Intent: Разрешить параллельные генерации (по умолчанию Gradio выполняет событие по одному) и ограничить очередь, чтобы отказывать сразу, а не копить ожидание
+    # Output: gr.Blocks
+    # END_CONTRACT_configure_queue
+    """
+    logger.debug(f"[UI][configure_queue] Belief: Настройка очереди Gradio | Input: concurrency_limit={concurrency_limit}, max_size={max_size} | Expected: gr.Blocks")
+    return demo.queue(default_concurrency_limit=concurrency_limit, max_size=max_size or None)
+
+
 def on_generate_click(
     topic: str,
     words_per_chapter: int,
@@ -117,15 +193,17 @@ def on_generate_click(
     temperature: float,
     editor_temperature: float,
     keep_links: bool,
-    enable_section_editors: bool
-) -> Generator[Tuple[str, Optional[str]], None, None]:
+    enable_section_editors: bool,
+    preset: str = "balanced",
+    request: Optional[gr.Request] = None
+) -> Generator[Tuple[Any, Any, str], None, None]:
     """
     Обработчик клика на кнопку генерации.
 
     # START_CONTRACT_on_generate_click
-    # Input: topic, words_per_chapter, chapter_count, temperature, editor_temperature, keep_links, enable_section_editors
-    # Russian Intent: Запустить генерацию и стримить прогресс в UI
-    # Output: Generator - стрим обновлений (logs, markdown)
+    # Input: topic, words_per_chapter, chapter_count, temperature, editor_temperature, keep_links, enable_section_editors, preset, request (Optional[gr.Request])
+    # Russian Intent: Запустить генерацию и стримить прогресс в UI; Stop и закрытие вкладки отписывают сессию и отменяют осиротевший запуск
+    # Output: Generator - стрим обновлений (logs, markdown, status); logs перерисовывается не чаще ProgressLog.render_interval, неизменившиеся поля - gr.skip()
     # END_CONTRACT_on_generate_click
     """
     logger.debug(
@@ -133,51 +211,252 @@ def on_generate_click(
         f"Input: topic={topic}, settings | Expected: Generator"
     )
 
-    # Инициализация
+    session_id = getattr(request, "session_hash", None)
+
+    # Журнал событий сессии; поле логов - его представление, неизменившиеся поля не пересылаются (gr.skip)
+    tracker = ProgressTracker()
+    progress = ProgressLog()
+    # Первое обновление всегда очищает markdown предыдущего запуска
+    shown_markdown: Any = object()
+
+    def view(event) -> Tuple[Any, Any, str]:
+        nonlocal shown_markdown
+        progress.append(event)
+        text = progress.render()
+        markdown_update = gr.skip() if progress.markdown is shown_markdown else progress.markdown
+        shown_markdown = progress.markdown
+        return (gr.skip() if text is None else text, markdown_update, progress.status())
+
+    # Инициализация: конфигурация и клиенты общие для процесса
     try:
-        app_config = load_env_config()
+        app_context = get_app_context()
+        app_config = app_context.config
         ui_settings = UiSettings(
             words_per_chapter=words_per_chapter,
             chapter_count=chapter_count,
             temperature=temperature,
             editor_temperature=editor_temperature,
             keep_links=keep_links,
-            enable_section_editors=enable_section_editors
+            enable_section_editors=enable_section_editors,
+            preset=preset
         )
 
         if not validate_ui_settings(ui_settings):
-            yield ("❌ Invalid settings", None)
+            yield view(tracker.failed("❌ Invalid settings"))
             return
 
-        # Сохранение настроек
-        save_ui_settings(ui_settings)
+        # Сохранение настроек сессии в фоне
+        app_context.settings_store.save_async(session_id, ui_settings)
 
-        # Инициализация клиентов
-        llm_client = LlmClient(app_config)
-        tavily_client = TavilyClientWrapper(app_config.tavily_api_key)
+        # Режим очереди: задание переживает рестарт сервера, UI только подписан на события
+        if app_context.job_queue is not None and not _JOB_QUEUE_UNAVAILABLE.is_set():
+            queue = app_context.job_queue
+            job_id = queue.submit(topic, ui_settings)
 
-        # Оркестратор
-        orchestrator = GenerationOrchestrator(
-            app_config,
-            ui_settings,
-            llm_client,
-            tavily_client
-        )
+            # Закрытие вкладки не отменяет долговечное задание, отменяет только Stop
+            def stop_job(user_requested: bool) -> None:
+                if user_requested:
+                    queue.cancel(job_id)
+
+            _register_session_stop(session_id, stop_job)
+            _register_session_partial(session_id, lambda: getattr(queue.get_job(job_id), "partial_path", None))
+            yield view(tracker.event(f"🗂️ Задание {job_id} поставлено в очередь"))
+            for event in progress_events(queue.subscribe(job_id), tracker):
+                yield view(event)
+            return
+
+        cancel_token = CancelToken(name="ui-run")
+        detach = threading.Event()
+        _register_session_stop(session_id, lambda user_requested: detach.set())
+
+        def start_run():
+            llm_client, tavily_client = app_context.clients()
+
+            # Оркестратор
+            orchestrator = GenerationOrchestrator(
+                app_config,
+                ui_settings,
+                llm_client,
+                tavily_client
+            )
+            _RUN_ORCHESTRATORS[run_key] = orchestrator
+            return orchestrator.run_pipeline(topic, cancel_token=cancel_token)
+
+        # Идентичные одновременные запросы присоединяются к одному запуску
+        run_key = build_run_key(topic, ui_settings)
+        _register_session_partial(session_id, lambda: _orchestrator_partial(run_key))
+        if GENERATION_FLIGHTS.in_flight(run_key):
+            yield view(tracker.event("🔗 Идентичная генерация уже выполняется, подключаемся к ней"))
 
         # Запуск pipeline (без file output в UI)
-        for logs, markdown, _ in stream_logs(orchestrator.run_pipeline(topic)):
-            yield (logs, markdown)
+        flight = GENERATION_FLIGHTS.subscribe(
+            run_key,
+            start_run,
+            on_abandon=lambda: cancel_token.cancel("all subscribers left"),
+            detach=detach
+        )
+        for event in progress_events(flight, tracker):
+            yield view(event)
 
     except StageError as e:
         error_msg = format_ui_error(e)
-        yield (error_msg, None)
+        yield view(tracker.failed(error_msg))
     except ValueError as e:
         error_msg = f"❌ Configuration Error: {e}"
-        yield (error_msg, None)
+        yield view(tracker.failed(error_msg))
     except Exception as e:
         logger.error(f"[UI][on_generate_click] Unexpected error: {e}")
         error_msg = f"❌ Unexpected error: {type(e).__name__}"
-        yield (error_msg, None)
+        yield view(tracker.failed(error_msg))
+    finally:
+        _unregister_session_stop(session_id)
+        with _SESSION_STOPS_LOCK:
+            _SESSION_PARTIALS.pop(session_id or "", None)
+
+
+def _output_catalog() -> Optional[OutputCatalog]:
+    """Каталог документов процесса или None, если он выключен или конфигурация невалидна."""
+    try:
+        catalog = get_output_catalog(get_app_context().config)
+    except ValueError:
+        return None
+    if catalog is not None:
+        # Документы, сохраненные до каталога, вносятся при первом обращении (один раз на процесс)
+        catalog.backfill(ArtifactStore(LocalArtifactBackend("outputs")))
+    return catalog
+
+
+def on_library_search(query: str = ""):
+    """
+    Обновляет список готовых документов.
+
+    # START_CONTRACT_on_library_search
+    # Input: query (str) - слова заголовка или темы; пусто = последние документы
+    # Russian Intent: Показать прошлые документы из каталога, чтобы открыть их вместо повторной генерации
+    # Output: gr.update для Dropdown (label, doc_id)
+    # END_CONTRACT_on_library_search
+    """
+    catalog = _output_catalog()
+    entries = catalog.search(query or "") if catalog is not None else []
+    return gr.update(choices=[(entry.label(), entry.doc_id) for entry in entries], value=None)
+
+
+def on_open_document(doc_id: Optional[str]) -> Tuple[str, Optional[str], str]:
+    """
+    Открывает документ из каталога.
+
+    # START_CONTRACT_on_open_document
+    # Input: doc_id (Optional[str])
+    # Russian Intent: Показать сохраненный документ сразу, без запуска pipeline
+    # Output: Tuple[str, Optional[str], str] - (logs, markdown, status)
+    # END_CONTRACT_on_open_document
+    """
+    logger.debug(f"[UI][on_open_document] Belief: Открытие документа из каталога | Input: doc_id={doc_id} | Expected: Tuple")
+
+    catalog = _output_catalog()
+    entry = catalog.get(doc_id) if catalog is not None and doc_id else None
+    if entry is None:
+        return ("❌ Документ не выбран или не найден в каталоге", None, "")
+    try:
+        markdown = Path(entry.location).read_text(encoding="utf-8")
+    except OSError:
+        return (f"❌ Файл документа недоступен: {entry.location}", None, "")
+    cost = "" if entry.cost_usd is None else f", ${entry.cost_usd:.4f}"
+    return (
+        f"📂 Открыт {entry.location} ({entry.input_tokens + entry.output_tokens} токенов{cost})",
+        markdown,
+        f"{entry.title} · из каталога"
+    )
+
+
+def _register_session_stop(session_id: Optional[str], stop: Callable[[bool], None]) -> None:
+    """Запоминает остановку текущей генерации сессии."""
+    if session_id:
+        with _SESSION_STOPS_LOCK:
+            _SESSION_STOPS[session_id] = stop
+
+
+def _unregister_session_stop(session_id: Optional[str]) -> Optional[Callable[[bool], None]]:
+    """Забывает остановку сессии и возвращает ее."""
+    if not session_id:
+        return None
+    with _SESSION_STOPS_LOCK:
+        return _SESSION_STOPS.pop(session_id, None)
+
+
+def _register_session_partial(session_id: Optional[str], partial_path: Callable[[], Optional[str]]) -> None:
+    """Запоминает, где искать частичный документ текущей генерации сессии."""
+    if session_id:
+        with _SESSION_STOPS_LOCK:
+            _SESSION_PARTIALS[session_id] = partial_path
+
+
+def _orchestrator_partial(run_key: str) -> Optional[str]:
+    """Частичный документ запуска в этом процессе."""
+    orchestrator = _RUN_ORCHESTRATORS.get(run_key)
+    partial_path = orchestrator.partial_path if orchestrator is not None else None
+    return str(partial_path) if partial_path is not None else None
+
+
+def on_partial_download(request: gr.Request) -> Optional[str]:
+    """
+    Обработчик кнопки скачивания частичного документа.
+
+    # START_CONTRACT_on_partial_download
+    # Input: request (gr.Request)
+    # Russian Intent: Отдать уже записанную часть документа до конца генерации (снимок, файл продолжает дописываться)
+    # Output: Optional[str] - путь снимка для gr.File или None, пока документ не пишется
+    # END_CONTRACT_on_partial_download
+    """
+    session_id = getattr(request, "session_hash", None)
+    logger.debug(f"[UI][on_partial_download] Belief: Снимок частичного документа | Input: session={session_id} | Expected: Optional[str]")
+
+    with _SESSION_STOPS_LOCK:
+        partial_path = _SESSION_PARTIALS.get(session_id or "")
+    source = partial_path() if partial_path is not None else None
+    if not source:
+        return None
+    snapshot = Path(tempfile.gettempdir()) / "lead_magnet_partials" / f"partial_{session_id}.md"
+    try:
+        snapshot.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, snapshot)
+    except OSError as e:
+        # Файл успел опубликоваться или удалиться между запросом пути и копированием
+        logger.info(f"[UI][on_partial_download] Partial document unavailable: {e}")
+        return None
+    return str(snapshot)
+
+
+def on_stop_click(request: gr.Request) -> None:
+    """
+    Обработчик кнопки остановки.
+
+    # START_CONTRACT_on_stop_click
+    # Input: request (gr.Request)
+    # Russian Intent: Немедленно отписать сессию от запуска (Gradio отменяет событие генерации через cancels) и отменить задание очереди
+    # Output: None
+    # END_CONTRACT_on_stop_click
+    """
+    logger.debug("[UI][on_stop_click] Belief: Остановка генерации | Input: session | Expected: None")
+    stop = _unregister_session_stop(getattr(request, "session_hash", None))
+    if stop is not None:
+        stop(True)
+
+
+def on_session_unload(request: gr.Request) -> None:
+    """
+    Обработчик закрытия вкладки.
+
+    # START_CONTRACT_on_session_unload
+    # Input: request (gr.Request)
+    # Russian Intent: Отписать ушедшего клиента, чтобы осиротевший запуск отменился и освободил слоты провайдеров
+    # Output: None
+    # END_CONTRACT_on_session_unload
+    """
+    logger.debug("[UI][on_session_unload] Belief: Клиент отключился | Input: session | Expected: None")
+    stop = _unregister_session_stop(getattr(request, "session_hash", None))
+    if stop is not None:
+        stop(False)
 
 
 def format_ui_state(
@@ -202,6 +481,47 @@ def format_ui_state(
     return logs, markdown, filepath
 
 
+def _startup_step(name: str, step: Callable[[], object]) -> bool:
+    """Выполняет шаг старта; ошибка шага логируется и не мешает остальным."""
+    try:
+        step()
+        return True
+    except (ValueError, OSError) as e:
+        logger.error(f"[UI][main] {name} not started: {e}")
+        return False
+
+
+def start_services(app_context) -> str:
+    """
+    Запускает фоновые службы процесса UI.
+
+    # START_CONTRACT_start_services
+    # Input: app_context (AppContext)
+    # Russian Intent: Запустить трассировку, /metrics, пул worker и прогрев независимо друг от друга: занятый порт метрик не должен отключать исполнение заданий
+    # Output: str - путь очереди заданий, если UI работает в режиме очереди
+    # END_CONTRACT_start_services
+    """
+    app_config = app_context.config
+    _startup_step("Tracing", lambda: configure_tracing(app_config))
+    if app_config.metrics_port:
+        _startup_step("Metrics server", lambda: start_metrics_server(app_config.metrics_port))
+
+    job_queue_path = ""
+    if app_config.job_queue_path:
+        workers_started = app_config.job_workers < 1 or _startup_step(
+            "Job workers", lambda: start_worker_pool(app_config.job_queue_path, app_config.job_workers, app_config.metrics_port)
+        )
+        if workers_started:
+            job_queue_path = app_config.job_queue_path
+        else:
+            _JOB_QUEUE_UNAVAILABLE.set()
+            logger.error("[UI][main] Job queue mode disabled: without workers queued runs would never start")
+
+    # Прогрев до открытия порта: первый пользователь получает уже открытые соединения
+    _startup_step("Warm-up", lambda: warm_up(*app_context.clients(), mode=app_config.warmup_mode, timeout=app_config.warmup_timeout_seconds))
+    return job_queue_path
+
+
 def main():
     """
     Запуск Gradio приложения.
@@ -245,7 +565,32 @@ def main():
         os.environ["NO_PROXY"] = no_proxy_hosts
     os.environ["no_proxy"] = os.environ["NO_PROXY"]
 
-    demo = build_ui()
+    # Контекст приложения создается при старте; пул worker-процессов для режима очереди заданий
+    queue_settings = {}
+    job_queue_path = ""
+    try:
+        app_context = get_app_context()
+    except ValueError as e:
+        logger.error(f"[UI][main] Configuration error, background services not started: {e}")
+    else:
+        queue_settings = {
+            "concurrency_limit": app_context.config.gradio_concurrency_limit,
+            "max_size": app_context.config.gradio_queue_max_size
+        }
+        job_queue_path = start_services(app_context)
+
+    demo = configure_queue(build_ui(), **queue_settings)
+
+    # HTTP API заданий доступен в режиме очереди: Gradio монтируется в то же FastAPI-приложение
+    if job_queue_path:
+        import uvicorn
+        from src.api import create_api
+
+        app = gr.mount_gradio_app(create_api(app_context.job_queue), demo, path="/")
+        logger.info("HTTP API available at http://127.0.0.1:7861/api/jobs")
+        uvicorn.run(app, host="127.0.0.1", port=7861)
+        return
+
     demo.launch(
         server_name="127.0.0.1",
         server_port=7861,
@@ -0,0 +1,150 @@
+"""
+Usage Accounting Module
+Учет токенов LLM по вызовам, стадиям и запуску с пересчетом в стоимость по таблице цен.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.artifacts import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+_current_usage: contextvars.ContextVar[Optional[Tuple["UsageLedger", str]]] = contextvars.ContextVar(
+    "current_usage", default=None
+)
+
+
+@dataclass
+class UsageRecord:
+    """Токены одного вызова LLM."""
+    stage: str
+    model: str
+    operation: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+def call_cost(model: str, input_tokens: int, output_tokens: int, prices: Dict[str, Tuple[float, float]]) -> Optional[float]:
+    """Стоимость в USD по ценам за 1M токенов или None, если цены модели неизвестны."""
+    if model not in prices:
+        return None
+    input_price, output_price = prices[model]
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class UsageLedger:
+    """Журнал usage одного запуска."""
+
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        Инициализация журнала.
+
+        # START_CONTRACT_UsageLedger_init
+        # Input: prices (Optional[Dict[str, Tuple[float, float]]]) - модель -> USD за 1M входных/выходных токенов
+        # Russian Intent: Копить usage вызовов запуска, в том числе из параллельных потоков глав
+        # Output: None
+        # END_CONTRACT_UsageLedger_init
+        """
+        self.prices = dict(prices or {})
+        self._records: List[UsageRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, model: str, operation: str, input_tokens: int, output_tokens: int) -> None:
+        """Добавляет usage одного вызова."""
+        with self._lock:
+            self._records.append(UsageRecord(stage, model, operation, input_tokens, output_tokens))
+
+    @property
+    def records(self) -> List[UsageRecord]:
+        """Копия записей журнала."""
+        with self._lock:
+            return list(self._records)
+
+    def _aggregate(self, records: List[UsageRecord]) -> dict:
+        """Сумма токенов и стоимость набора записей (cost = None, если у какой-то модели нет цены)."""
+        cost: Optional[float] = 0.0
+        for record in records:
+            record_cost = call_cost(record.model, record.input_tokens, record.output_tokens, self.prices)
+            cost = None if cost is None or record_cost is None else cost + record_cost
+        return {
+            "calls": len(records),
+            "input_tokens": sum(record.input_tokens for record in records),
+            "output_tokens": sum(record.output_tokens for record in records),
+            "cost_usd": None if cost is None else round(cost, 6),
+        }
+
+    def totals(self) -> dict:
+        """Итог по запуску."""
+        return self._aggregate(self.records)
+
+    def by_stage(self) -> Dict[str, dict]:
+        """Итоги по стадиям в порядке первого вызова."""
+        grouped: Dict[str, List[UsageRecord]] = {}
+        for record in self.records:
+            grouped.setdefault(record.stage, []).append(record)
+        return {stage: self._aggregate(records) for stage, records in grouped.items()}
+
+    def to_dict(self, run_id: Optional[str] = None) -> dict:
+        """Отчет для файла рядом с документом."""
+        return {
+            "run_id": run_id,
+            "prices_per_1m_tokens": {model: list(price) for model, price in self.prices.items()},
+            "total": self.totals(),
+            "stages": self.by_stage(),
+        }
+
+    def to_json(self, run_id: Optional[str] = None) -> str:
+        """Отчет в JSON."""
+        return json.dumps(self.to_dict(run_id), ensure_ascii=False, indent=2)
+
+    def summary(self) -> str:
+        """Одна строка для лога UI."""
+        totals = self.totals()
+        cost = "цена модели не задана" if totals["cost_usd"] is None else f"${totals['cost_usd']:.4f}"
+        return (
+            f"{totals['calls']} вызовов LLM, токены: {totals['input_tokens']} вход / "
+            f"{totals['output_tokens']} выход, стоимость: {cost}"
+        )
+
+
+def usage_path_for(document_path: Path) -> Path:
+    """Путь отчета usage рядом с документом: lead_magnet_X.md -> lead_magnet_X.usage.json."""
+    return document_path.with_suffix(".usage.json")
+
+
+def write_usage_report(ledger: UsageLedger, document_path: Path, run_id: Optional[str] = None) -> Path:
+    """
+    Сохраняет отчет usage рядом с экспортированным документом.
+
+    # START_CONTRACT_write_usage_report
+    # Input: ledger (UsageLedger), document_path (Path), run_id (Optional[str])
+    # Russian Intent: Сохранить токены и стоимость запуска по стадиям для сравнения оптимизаций между запусками
+    # Output: Path - путь к .usage.json
+    # END_CONTRACT_write_usage_report
+    """
+    logger.debug(f"[Usage][write_usage_report] Belief: Сохранение отчета usage | Input: document_path={document_path} | Expected: Path")
+
+    path = usage_path_for(Path(document_path))
+    return atomic_write_bytes(path, ledger.to_json(run_id).encode("utf-8"))
+
+
+def current_usage() -> Optional[Tuple[UsageLedger, str]]:
+    """Журнал и стадия текущего контекста."""
+    return _current_usage.get()
+
+
+@contextmanager
+def use_usage_ledger(ledger: Optional[UsageLedger], stage: str) -> Iterator[None]:
+    """Направляет usage вызовов LLM внутри блока в журнал под именем стадии."""
+    reset_token = _current_usage.set((ledger, stage) if ledger is not None else None)
+    try:
+        yield
+    finally:
+        _current_usage.reset(reset_token)
@@ -0,0 +1,110 @@
+"""
+Warm-up Module
+Прогрев соединений с провайдерами при старте процесса, чтобы первый запуск не платил за DNS, TCP и TLS.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from src.metrics import WARMUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupStep:
+    """Один шаг прогрева."""
+    target: str
+    seconds: float
+    status: str
+    error: Optional[str] = None
+
+
+@dataclass
+class WarmupReport:
+    """Итог прогрева."""
+    mode: str
+    steps: List[WarmupStep] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        """Одна строка для лога."""
+        parts = [f"{step.target} {step.seconds:.2f}s {step.status}" for step in self.steps]
+        return f"Warm-up ({self.mode}) {self.seconds:.2f}s: {', '.join(parts) or 'nothing to warm'}"
+
+
+def _status_error(error: Exception) -> bool:
+    """Ответ сервера с HTTP-ошибкой: соединение уже установлено."""
+    return isinstance(getattr(error, "status_code", None), int) or getattr(error, "response", None) is not None
+
+
+def _timed(target: str, fn: Callable[[], Any]) -> WarmupStep:
+    """Выполняет шаг и замеряет его; ошибка прогрева не останавливает старт."""
+    started_at = time.monotonic()
+    try:
+        fn()
+        status, error = "ok", None
+    except Exception as e:
+        status = "ok" if _status_error(e) else "error"
+        error = None if status == "ok" else f"{type(e).__name__}: {e}"
+    step = WarmupStep(target, round(time.monotonic() - started_at, 3), status, error)
+    WARMUP_SECONDS.set(step.seconds, target=target)
+    return step
+
+
+def warm_up(llm_client: Any, tavily_client: Any, mode: str = "connect", timeout: float = 10.0) -> WarmupReport:
+    """
+    Прогревает соединения клиентов провайдеров.
+
+    # START_CONTRACT_warm_up
+    # Input: llm_client (LlmClient), tavily_client (TavilyClientWrapper), mode (str) - off | connect | completion, timeout (float) - секунды на шаг
+    # Russian Intent: Открыть соединения пулов SDK (и при completion разбудить модель вызовом в 1 токен) до первого пользователя и замерить это
+    # Output: WarmupReport
+    # END_CONTRACT_warm_up
+    """
+    logger.debug(f"[Warmup][warm_up] Belief: Прогрев провайдеров | Input: mode={mode}, timeout={timeout} | Expected: WarmupReport")
+
+    report = WarmupReport(mode=mode)
+    if mode == "off":
+        return report
+
+    # Кассеты и имитаторы подменяют SDK-объекты: прогревать нечего
+    llm = getattr(llm_client, "client", None)
+    session = getattr(getattr(tavily_client, "client", None), "session", None)
+    base_url = getattr(getattr(tavily_client, "client", None), "base_url", None)
+
+    def warm_llm() -> List[WarmupStep]:
+        if not hasattr(llm, "models"):
+            return []
+        # Любой ответ сервера (в том числе 404 у провайдеров без /models) оставляет соединение в пуле
+        steps = [_timed("llm.connect", lambda: llm.models.list(timeout=timeout))]
+        if mode == "completion":
+            steps.append(_timed("llm.completion", lambda: llm.chat.completions.create(
+                model=llm_client.model,
+                messages=[{"role": "user", "content": "ping"}],
+                max_tokens=1,
+                temperature=0.0,
+                timeout=timeout
+            )))
+        return steps
+
+    def warm_search() -> List[WarmupStep]:
+        if session is None or not base_url:
+            return []
+        return [_timed("search.connect", lambda: session.head(base_url, timeout=timeout))]
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup") as pool:
+        futures = [pool.submit(warm_llm), pool.submit(warm_search)]
+        for future in futures:
+            report.steps.extend(future.result())
+    report.seconds = round(time.monotonic() - started_at, 3)
+
+    for step in report.steps:
+        if step.error:
+            logger.warning(f"[Warmup] {step.target} failed: {step.error}")
+    logger.info(f"[Warmup] {report.summary()}")
+    return report
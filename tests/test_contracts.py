@@ -1,3 +1,4 @@
+import hashlib
 import json
 import re
 from pathlib import Path
@@ -9,6 +10,9 @@ from src.research import (
     ResearchAggregate,
     ResearchItem,
     run_sequential_search,
+    run_batch_search,
+    plan_batch_queries,
+    normalize_query,
     merge_research_items,
     format_research_context,
     check_search_failure,
@@ -162,6 +166,92 @@ def test_run_sequential_search_all_failures():
     assert agg.fail_count == 2
 
 
+def test_plan_batch_queries_dedupes_normalized_queries():
+    plan = plan_batch_queries({
+        "CRM for dentists": ["CRM pricing 2024", "dental CRM trends"],
+        "CRM for clinics": ["crm  pricing 2024?", "clinic CRM trends"],
+    })
+    assert normalize_query("  CRM  Pricing, 2024? ") == "crm pricing 2024"
+    assert plan.total_queries == 4
+    assert plan.unique_queries == ["CRM pricing 2024", "dental CRM trends", "clinic CRM trends"]
+    assert plan.topic_keys["CRM for clinics"] == ["crm pricing 2024", "clinic crm trends"]
+
+
+def test_run_batch_search_fetches_once_and_fans_out():
+    calls = []
+
+    class CountingTavily:
+        def search_once(self, query, max_results=5):
+            calls.append(query)
+            if query == "broken":
+                return None
+            return {"results": [{"title": query}]}
+
+    aggregates = run_batch_search(
+        {"a": ["shared q", "only a", "broken"], "b": ["Shared Q!", "only b"]},
+        CountingTavily(),
+    )
+    assert calls == ["shared q", "only a", "broken", "only b"]
+    assert aggregates["a"].success_count == 2 and aggregates["a"].fail_count == 1
+    assert aggregates["b"].success_count == 2 and aggregates["b"].fail_count == 0
+    assert merge_research_items(aggregates["b"]) == [{"title": "shared q"}, {"title": "only b"}]
+
+
+def test_batch_pipeline_plans_once_and_isolates_topic_failures(app_config, tmp_path, monkeypatch):
+    from src import orchestrator as orchestrator_module, research
+    from src.artifacts import ArtifactStore, LocalArtifactBackend
+    from src.benchmark import FakeChatCompletions, FakeTavilySearch, LatencyProfile
+    from src.cli import read_batch_topics
+    from src.clients import LlmClient, TavilyClientWrapper
+    from src.orchestrator import GenerationOrchestrator
+    from src.ratelimit import RateLimitConfig, RateLimiter
+
+    plans = []
+
+    def counting_plan(topic_queries):
+        plans.append(list(topic_queries))
+        return plan_batch_queries(topic_queries)
+
+    monkeypatch.setattr(orchestrator_module, "plan_batch_queries", counting_plan)
+    monkeypatch.setattr(research, "plan_batch_queries", counting_plan)
+
+    limiter = RateLimiter({"llm": RateLimitConfig(), "tavily": RateLimitConfig()})
+    llm = LlmClient(app_config, rate_limiter=limiter)
+    tavily = TavilyClientWrapper(app_config, limiter)
+    llm.client, tavily.client = FakeChatCompletions(LatencyProfile(0.0)), FakeTavilySearch(LatencyProfile(0.0), raw_content_chars=20)
+    ui_settings = UiSettings(words_per_chapter=50, chapter_count=2, enable_section_editors=False, preset="custom")
+    store = ArtifactStore(LocalArtifactBackend(str(tmp_path / "outputs")))
+    orchestrator = GenerationOrchestrator(app_config, ui_settings, llm, tavily, artifact_store=store, catalog=None)
+
+    structure_planner = orchestrator._run_structure_planner
+
+    def failing_structure_planner(research_context):
+        if orchestrator._topic == "Сломанная тема":
+            raise ValueError("structure boom")
+        return structure_planner(research_context)
+
+    monkeypatch.setattr(orchestrator, "_run_structure_planner", failing_structure_planner)
+
+    topics = read_batch_topics(["CRM для клиник", "Сломанная тема"], None)
+    events = list(orchestrator.run_batch_pipeline(topics))
+
+    assert plans == [topics]
+    assert orchestrator.batch_results["Сломанная тема"] is None
+    assert Path(orchestrator.batch_results["CRM для клиник"]).exists()
+    assert [path for _, _, path in events if path] == [orchestrator.batch_results["CRM для клиник"]]
+    assert any("Сломанная тема" in logs and "structure boom" in logs for logs, _, _ in events)
+    assert orchestrator._run_status == "error"
+    # у темы свой отчет usage и run id; запросы всех тем учтены в общем этапе пакета
+    report = json.loads(Path(orchestrator.batch_results["CRM для клиник"]).with_suffix(".usage.json").read_text(encoding="utf-8"))
+    assert report["run_id"] == f"{orchestrator.run_id}-1" and report["total"]["calls"] > 0
+    assert "query_builder" not in report["stages"]
+    assert list(orchestrator.batch_usage.by_stage()) == ["query_builder"] and orchestrator.batch_usage.totals()["calls"] == 2
+
+    topics_file = tmp_path / "topics.txt"
+    topics_file.write_text("# пакет\nCRM для клиник\n\nВоронка продаж\n", encoding="utf-8")
+    assert read_batch_topics(["CRM для клиник"], str(topics_file)) == ["CRM для клиник", "Воронка продаж"]
+
+
 def test_merge_research_items_only_success_items():
     agg = ResearchAggregate(
         items=[
@@ -302,3 +392,1710 @@ def test_safe_log_error_redacts_keywords():
     msg = safe_log_error(Exception("token=abc123 and password=xyz"), "ctx")
     assert "ctx: Exception -" in msg
     assert "[REDACTED]" in msg
+
+
+def test_job_queue_submit_claim_events_and_subscribe(tmp_path):
+    from src.jobs import JobQueue, JOB_STATUS_RUNNING, JOB_STATUS_SUCCEEDED
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.submit("CRM for dentists", UiSettings(chapter_count=3))
+
+    job = queue.claim("w1")
+    assert job.job_id == job_id
+    assert job.status == JOB_STATUS_RUNNING
+    assert job.settings.chapter_count == 3
+    assert queue.claim("w2") is None
+
+    queue.append_event(job_id, "step 1")
+    queue.append_event(job_id, "done", "# Doc", "outputs/x.md")
+    queue.complete(job_id, "outputs/x.md")
+
+    assert queue.get_job(job_id).status == JOB_STATUS_SUCCEEDED
+    assert list(queue.subscribe(job_id, poll_interval=0.01)) == [
+        ("step 1", None, None),
+        ("done", "# Doc", "outputs/x.md"),
+    ]
+
+
+def test_job_queue_reclaims_expired_and_released_jobs(tmp_path):
+    from src.jobs import JobQueue, JOB_STATUS_FAILED
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.01, max_attempts=2)
+    job_id = queue.submit("topic", UiSettings())
+    assert queue.claim("dead-worker").attempts == 1
+
+    import time
+    time.sleep(0.02)
+    reclaimed = queue.claim("w2")
+    assert reclaimed.job_id == job_id and reclaimed.attempts == 2
+
+    assert queue.release_worker_jobs(["w2"]) == 0
+    assert queue.get_job(job_id).status == JOB_STATUS_FAILED
+
+    other = queue.submit("other", UiSettings())
+    queue.claim("w3")
+    assert queue.release_worker_jobs(["w3"]) == 1
+    assert queue.claim("w4").job_id == other
+
+
+def test_job_lease_is_renewed_by_owner_and_fences_a_worker_that_lost_it(tmp_path, app_config, monkeypatch):
+    import threading
+    import time
+    from src.errors import RunCancelledError
+    from src.jobs import JobQueue, JOB_STATUS_RUNNING, JOB_STATUS_SUCCEEDED, execute_job
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2)
+    job_id = queue.submit("topic", UiSettings())
+    first = queue.claim("w1")
+    assert queue.heartbeat(job_id, "w2") is False and queue.heartbeat(job_id, "w1") is True
+
+    # Задание перехвачено после истечения аренды: прежний владелец не может записать итог
+    time.sleep(0.25)
+    assert queue.claim("w2").worker_id == "w2"
+    assert queue.complete(job_id, "stale.md", worker_id="w1") is False
+    assert queue.get_job(job_id).status == JOB_STATUS_RUNNING
+    assert queue.complete(job_id, "fresh.md", worker_id="w2") is True
+    assert queue.get_job(job_id).result_path == "fresh.md"
+
+    class SlowOrchestrator:
+        def __init__(self, *args):
+            pass
+
+        def run_pipeline(self, topic, cancel_token=None):
+            yield ("started", None, None)
+            # Стадия без событий дольше аренды
+            deadline = time.monotonic() + 0.6
+            while time.monotonic() < deadline:
+                if cancel_token.cancelled:
+                    raise RunCancelledError(cancel_token.reason)
+                threading.Event().wait(0.01)
+            yield ("done", "# Doc", "doc.md")
+
+    monkeypatch.setattr("src.orchestrator.GenerationOrchestrator", SlowOrchestrator)
+    slow_id = queue.submit("slow", UiSettings())
+    job = queue.claim("w1")
+    assert job.job_id == slow_id
+    watcher = threading.Thread(target=lambda: execute_job(queue, job, None, None, app_config, cancel_poll_interval=0.02))
+    watcher.start()
+    time.sleep(0.4)
+    assert queue.claim("w3") is None
+    watcher.join(5)
+    assert queue.get_job(slow_id).status == JOB_STATUS_SUCCEEDED and first.worker_id == "w1"
+
+
+def test_worker_that_lost_the_lease_mid_run_stops_writing_events(tmp_path, app_config, monkeypatch):
+    import threading
+    import time
+    from src.jobs import JobLeaseLostError, JobQueue, JOB_STATUS_RUNNING, execute_job
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2)
+    stolen = threading.Event()
+    closed = threading.Event()
+
+    class StalledOrchestrator:
+        def __init__(self, *args):
+            pass
+
+        def run_pipeline(self, topic, cancel_token=None):
+            try:
+                yield ("w1 step 1", None, None)
+                # Worker завис дольше аренды, и задание перехватил другой worker
+                stolen.wait(5)
+                yield ("w1 step 2", "# Stale", None)
+                yield ("w1 done", "# Stale", "stale.md")
+            finally:
+                closed.set()
+
+    monkeypatch.setattr("src.orchestrator.GenerationOrchestrator", StalledOrchestrator)
+    job_id = queue.submit("topic", UiSettings())
+    job = queue.claim("w1")
+    # Watcher не успевает заметить потерю аренды: ограждение должно сработать в append_event
+    worker = threading.Thread(target=lambda: execute_job(queue, job, None, None, app_config, cancel_poll_interval=10.0))
+    worker.start()
+    deadline = time.monotonic() + 5
+    while not queue.list_events(job_id) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.25)
+    assert queue.claim("w2").worker_id == "w2"
+    queue.append_event(job_id, "w2 step 1", worker_id="w2")
+    stolen.set()
+    worker.join(5)
+
+    assert not worker.is_alive() and closed.is_set()
+    assert [event.logs for event in queue.list_events(job_id)] == ["w1 step 1", "w2 step 1"]
+    assert queue.get_job(job_id).status == JOB_STATUS_RUNNING and queue.get_job(job_id).worker_id == "w2"
+    with pytest.raises(JobLeaseLostError):
+        queue.append_event(job_id, "late", worker_id="w1")
+
+
+def test_worker_process_serves_metrics_of_runs_it_executes(tmp_path, monkeypatch):
+    import socket
+    import threading
+    import time
+    import urllib.request
+    from src.jobs import JobQueue, JOB_STATUS_SUCCEEDED, run_worker, worker_metrics_port
+    from src.metrics import RUNS_TOTAL
+
+    assert [worker_metrics_port(9464, i) for i in range(2)] == [9465, 9466]
+    assert worker_metrics_port(0, 1) == 0
+
+    for name, value in (("LLM_API_KEY", "k1"), ("LLM_BASE_URL", "https://x"), ("LLM_MODEL", "m"), ("TAVILY_API_KEY", "k2")):
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr("src.clients.build_clients", lambda config: (None, None))
+
+    class CountingOrchestrator:
+        def __init__(self, *args):
+            pass
+
+        def run_pipeline(self, topic, cancel_token=None):
+            # Как GenerationOrchestrator._finish_run: метрика пишется в процессе, который исполняет запуск
+            RUNS_TOTAL.inc(status="worker-metrics")
+            yield ("done", "# Doc", "doc.md")
+
+    monkeypatch.setattr("src.orchestrator.GenerationOrchestrator", CountingOrchestrator)
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.submit("topic", UiSettings())
+    stop = threading.Event()
+    worker = threading.Thread(target=run_worker, kwargs={"db_path": queue.db_path, "worker_id": "w1", "poll_interval": 0.01, "stop_event": stop, "metrics_port": port})
+    worker.start()
+    try:
+        deadline = time.monotonic() + 5
+        while queue.get_job(job_id).status != JOB_STATUS_SUCCEEDED and time.monotonic() < deadline:
+            time.sleep(0.01)
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode("utf-8")
+    finally:
+        stop.set()
+        worker.join(5)
+    assert 'lead_magnet_runs_total{status="worker-metrics"} 1' in body
+
+
+def test_execute_job_records_failure(tmp_path, monkeypatch, app_config):
+    from src.jobs import JobQueue, execute_job
+
+    class FailingOrchestrator:
+        def __init__(self, *args):
+            pass
+
+        def run_pipeline(self, topic, cancel_token=None):
+            yield ("started", None, None)
+            raise StageError("Поиск", "boom")
+
+    monkeypatch.setattr("src.orchestrator.GenerationOrchestrator", FailingOrchestrator)
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.submit("topic", UiSettings())
+    execute_job(queue, queue.claim("w1"), None, None, app_config)
+
+    events = list(queue.subscribe(job_id, poll_interval=0.01))
+    assert events[0] == ("started", None, None)
+    assert "boom" in events[-1][0]
+
+
+def test_build_run_key_normalizes_topic_and_distinguishes_settings():
+    from src.coalescing import build_run_key
+
+    assert build_run_key("CRM  for Dentists", UiSettings()) == build_run_key("crm for dentists ", UiSettings())
+    assert build_run_key("crm", UiSettings()) != build_run_key("crm", UiSettings(chapter_count=3))
+
+
+def test_single_flight_shares_one_run_between_concurrent_subscribers():
+    import threading
+    from src.coalescing import SingleFlight
+
+    flights = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def factory():
+        runs.append(1)
+        yield ("a", None, None)
+        release.wait(5)
+        yield ("b", "md", "file")
+
+    first = flights.subscribe("k", factory)
+    assert next(first) == ("a", None, None)
+    second = flights.subscribe("k", factory)
+    assert next(second) == ("a", None, None)
+
+    release.set()
+    assert list(first) == [("b", "md", "file")]
+    assert list(second) == [("b", "md", "file")]
+    assert len(runs) == 1
+    assert flights.in_flight("k") is False
+
+
+def test_single_flight_propagates_error_to_every_subscriber():
+    from src.coalescing import SingleFlight
+
+    def factory():
+        yield ("start", None, None)
+        raise StageError("Поиск", "boom")
+
+    flights = SingleFlight()
+    with pytest.raises(StageError):
+        list(flights.subscribe("k", factory))
+
+
+def test_job_queue_coalesces_identical_in_flight_submissions(tmp_path):
+    from src.jobs import JobQueue
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    first = queue.submit("CRM for dentists", UiSettings())
+    assert queue.submit("crm for dentists", UiSettings()) == first
+    assert queue.submit("CRM for dentists", UiSettings(chapter_count=2)) != first
+    assert queue.submit("CRM for dentists", UiSettings(), coalesce=False) != first
+
+    queue.claim("w1")
+    queue.complete(first, "x.md")
+    assert queue.submit("CRM for dentists", UiSettings()) != first
+
+
+def test_token_bucket_reserves_into_debt_and_refills():
+    from src.ratelimit import TokenBucket
+
+    now = [0.0]
+    bucket = TokenBucket(rate_per_minute=60, capacity=2, clock=lambda: now[0])
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)
+
+    now[0] = 10.0
+    assert bucket.reserve(2) == 0.0
+    bucket.adjust(5)
+    assert bucket.reserve(2) == 0.0
+
+
+def test_rate_limiter_waits_per_provider_and_model_and_records_wait_metric():
+    from src.metrics import RATE_LIMIT_WAIT_SECONDS, get_metrics
+    from src.ratelimit import RateLimiter, RateLimitConfig
+
+    before = {model: RATE_LIMIT_WAIT_SECONDS.count(provider="llm", model=model) for model in ("wait-m1", "wait-m2")}
+    sleeps = []
+    limiter = RateLimiter(
+        {"llm": RateLimitConfig(requests_per_minute=60, tokens_per_minute=600)},
+        sleep=sleeps.append,
+    )
+    assert limiter.acquire("llm", "wait-m1", tokens=600) == 0.0
+    assert limiter.acquire("llm", "wait-m1", tokens=60) > 0
+    assert limiter.acquire("llm", "wait-m2", tokens=60) == 0.0
+    assert limiter.acquire("tavily", "search") == 0.0
+
+    # каждое ожидание, включая нулевое, попадает в гистограмму
+    assert RATE_LIMIT_WAIT_SECONDS.count(provider="llm", model="wait-m1") == before["wait-m1"] + 2
+    assert RATE_LIMIT_WAIT_SECONDS.count(provider="llm", model="wait-m2") == before["wait-m2"] + 1
+    assert 'lead_magnet_ratelimit_wait_seconds_count{provider="llm",model="wait-m1"}' in get_metrics().render()
+    assert len(sleeps) == 1
+
+
+def test_rate_limiter_wait_is_interrupted_by_cancel_token_and_returns_reservation():
+    import threading
+    import time
+    from src.cancellation import CancelToken, use_cancel_token
+    from src.errors import RunCancelledError
+    from src.ratelimit import RateLimiter, RateLimitConfig
+
+    sleeps = []
+    limiter = RateLimiter({"llm": RateLimitConfig(requests_per_minute=1)}, sleep=sleeps.append)
+    assert limiter.acquire("llm", "cancel-m") == 0.0
+
+    token = CancelToken()
+    threading.Timer(0.05, lambda: token.cancel("stopped by user")).start()
+    started_at = time.monotonic()
+    with use_cancel_token(token), pytest.raises(RunCancelledError):
+        limiter.acquire("llm", "cancel-m")
+    assert time.monotonic() - started_at < 5 and sleeps == []
+
+    # Неотправленный вызов вернул резерв: следующий ждет одну минуту, а не две
+    assert 0 < limiter.acquire("llm", "cancel-m") <= 60.0 and len(sleeps) == 1
+
+
+def test_sqlite_token_bucket_is_shared_between_instances(tmp_path):
+    from src.ratelimit import SqliteTokenBucket
+
+    db = str(tmp_path / "limits.sqlite3")
+    first = SqliteTokenBucket(db, "llm:m:rpm", rate_per_minute=2)
+    second = SqliteTokenBucket(db, "llm:m:rpm", rate_per_minute=2)
+    assert first.reserve(1) == 0.0
+    assert second.reserve(1) == 0.0
+    assert first.reserve(1) > 0
+
+
+def test_llm_client_calls_go_through_rate_limiter(app_config, mock_openai_client, monkeypatch):
+    from src.clients import LlmClient
+
+    class RecordingLimiter:
+        def __init__(self):
+            self.calls = []
+
+        def acquire(self, provider, model, tokens=0):
+            self.calls.append(("acquire", provider, model, tokens))
+            return 0.0
+
+        def reconcile(self, provider, model, estimated, actual):
+            self.calls.append(("reconcile", provider, model, actual))
+
+    mock_openai_client.chat.completions.create.return_value.usage.total_tokens = 42
+    monkeypatch.setattr("src.clients.OpenAI", lambda **kwargs: mock_openai_client)
+    limiter = RecordingLimiter()
+    client = LlmClient(app_config, rate_limiter=limiter)
+
+    assert client.generate_json("sys", "user prompt") == "test response"
+    assert limiter.calls[0][:3] == ("acquire", "llm", "gpt-4")
+    assert limiter.calls[1] == ("reconcile", "llm", "gpt-4", 42)
+    kwargs = mock_openai_client.chat.completions.create.call_args.kwargs
+    assert kwargs["response_format"] == {"type": "json_object"}
+
+
+def test_adaptive_limiter_increases_additively_and_decreases_on_overload():
+    from src.concurrency import AdaptiveConcurrencyLimiter
+
+    now = [0.0]
+    limiter = AdaptiveConcurrencyLimiter("llm", initial_limit=2, max_limit=4, cooldown_seconds=1.0, clock=lambda: now[0])
+    for _ in range(6):
+        limiter.record(0.1)
+    assert limiter.limit == 4
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    limiter.record(0.1, RateLimited())
+    limiter.record(0.1, RateLimited())
+    assert limiter.limit == 2
+
+    now[0] = 2.0
+    limiter.record(0.1, ValueError("bad request"))
+    assert limiter.limit == 2
+    limiter.record(5.0)
+    assert limiter.limit == 1
+
+    snapshot = limiter.snapshot()
+    assert snapshot["limit"] == 1
+    assert [d["action"] for d in snapshot["decisions"]] == ["increase", "increase", "decrease", "decrease"]
+
+
+def test_adaptive_limiter_publishes_limit_inflight_and_decisions_as_metrics():
+    from src.concurrency import AdaptiveConcurrencyLimiter
+    from src.metrics import CONCURRENCY_DECISIONS_TOTAL, CONCURRENCY_INFLIGHT, CONCURRENCY_LIMIT, get_metrics
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    limiter = AdaptiveConcurrencyLimiter("metrics-provider", initial_limit=2, max_limit=3, cooldown_seconds=0.0)
+    assert CONCURRENCY_LIMIT.value(provider="metrics-provider") == 2
+    with limiter.slot(), limiter.slot():
+        assert CONCURRENCY_INFLIGHT.value(provider="metrics-provider") == 2
+    assert CONCURRENCY_INFLIGHT.value(provider="metrics-provider") == 0
+
+    limiter.record(0.1)
+    limiter.record(0.1, RateLimited())
+    assert CONCURRENCY_LIMIT.value(provider="metrics-provider") == limiter.limit == 1
+    assert CONCURRENCY_DECISIONS_TOTAL.value(provider="metrics-provider", action="increase") == 1
+    assert CONCURRENCY_DECISIONS_TOTAL.value(provider="metrics-provider", action="decrease") == 1
+    rendered = get_metrics().render()
+    assert 'lead_magnet_concurrency_limit{provider="metrics-provider"} 1' in rendered
+    assert 'lead_magnet_concurrency_decisions_total{provider="metrics-provider",action="decrease"} 1' in rendered
+
+
+def test_adaptive_limiter_keeps_latency_baseline_per_operation():
+    from src.concurrency import AdaptiveConcurrencyLimiter
+
+    limiter = AdaptiveConcurrencyLimiter("llm", initial_limit=4, max_limit=4, cooldown_seconds=0.0)
+    for _ in range(5):
+        limiter.record(1.0, operation="json")
+    for _ in range(5):
+        limiter.record(30.0, operation="markdown")
+    assert limiter.limit == 4
+
+    limiter.record(90.0, operation="markdown")
+    assert limiter.limit == 2
+    assert set(limiter.snapshot()["baseline_latency"]) == {"json", "markdown"}
+
+
+def test_adaptive_limiter_slot_blocks_above_limit():
+    import threading
+    from src.concurrency import AdaptiveConcurrencyLimiter
+
+    limiter = AdaptiveConcurrencyLimiter("search", initial_limit=1, max_limit=1)
+    entered = threading.Event()
+
+    def hold():
+        with limiter.slot():
+            entered.set()
+
+    with limiter.slot():
+        worker = threading.Thread(target=hold)
+        worker.start()
+        assert not entered.wait(0.05)
+        assert limiter.inflight == 1
+    worker.join(1)
+    assert entered.is_set()
+
+
+def test_fan_out_preserves_indices_and_reports_failed_item():
+    from src.concurrency import fan_out, FanOutError
+
+    results = dict(fan_out([1, 2, 3], lambda x: x * 10, max_workers=3))
+    assert results == {0: 10, 1: 20, 2: 30}
+
+    def fail_on_two(x):
+        if x == 2:
+            raise RuntimeError("boom")
+        return x
+
+    with pytest.raises(FanOutError) as e:
+        list(fan_out([1, 2, 3], fail_on_two, max_workers=1))
+    assert e.value.index == 1
+
+
+def test_orchestrator_writes_chapters_in_plan_order_with_fan_out(app_config, ui_settings, sample_structure):
+    from src.orchestrator import GenerationOrchestrator
+
+    class EchoLlm:
+        def generate_markdown(self, system_prompt, user_prompt, temperature=0.7):
+            for i in range(1, 6):
+                if f"Write about topic {i}" in user_prompt or f"Write about topic {i}" in system_prompt:
+                    return f"text {i}"
+            return "text ?"
+
+    orchestrator = GenerationOrchestrator(app_config, ui_settings, EchoLlm(), None)
+    gen = orchestrator._run_chapter_writer(sample_structure, "context")
+    logs = []
+    try:
+        while True:
+            logs.append(next(gen)[0])
+    except StopIteration as stop:
+        chapters = stop.value
+
+    assert chapters == [f"text {i}" for i in range(1, 6)]
+    assert "Все 5 глав написаны" in logs[-1]
+
+
+def test_classify_error_and_backoff_delay():
+    from src.resilience import RetryPolicy, classify_error, backoff_delay, ERROR_RETRYABLE, ERROR_FATAL
+
+    class HttpError(Exception):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert classify_error(HttpError(429)) == ERROR_RETRYABLE
+    assert classify_error(HttpError(503)) == ERROR_RETRYABLE
+    assert classify_error(HttpError(401)) == ERROR_FATAL
+    assert classify_error(ConnectionError("reset")) == ERROR_RETRYABLE
+    assert classify_error(ValueError("bad")) == ERROR_FATAL
+
+    policy = RetryPolicy(base_delay=1.0, max_delay=3.0)
+    assert backoff_delay(1, policy, rng=lambda: 1.0) == 1.0
+    assert backoff_delay(2, policy, rng=lambda: 1.0) == 2.0
+    assert backoff_delay(5, policy, rng=lambda: 0.5) == 1.5
+
+
+def test_call_with_retry_retries_transient_and_stops_on_fatal():
+    from src.resilience import RetryPolicy, call_with_retry
+
+    attempts = []
+    sleeps = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    policy = RetryPolicy(max_attempts=3, attempt_timeout=5.0)
+    assert call_with_retry(flaky, policy, sleep=sleeps.append) == "ok"
+    assert attempts == [5.0, 5.0, 5.0]
+    assert len(sleeps) == 2
+
+    fatal_calls = []
+
+    def fatal(timeout):
+        fatal_calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        call_with_retry(fatal, policy, sleep=sleeps.append)
+    assert len(fatal_calls) == 1
+
+
+def test_call_with_retry_respects_deadline():
+    from src.resilience import RetryPolicy, call_with_retry, DeadlineExceededError
+
+    now = [0.0]
+    timeouts = []
+
+    def slow(timeout):
+        timeouts.append(timeout)
+        now[0] += 6.0
+        raise TimeoutError("slow")
+
+    policy = RetryPolicy(max_attempts=5, base_delay=0.0, max_delay=0.0, attempt_timeout=10.0, deadline_seconds=10.0)
+    with pytest.raises((TimeoutError, DeadlineExceededError)):
+        call_with_retry(slow, policy, sleep=lambda d: None, clock=lambda: now[0])
+    assert timeouts == [10.0, 4.0]
+
+
+def test_hedged_call_returns_fastest_response():
+    import threading
+    from src.resilience import hedged_call, LatencyTracker
+
+    release_first = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            release_first.wait(2)
+            return "slow"
+        return "fast"
+
+    assert hedged_call(fn, hedge_after=0.01) == "fast"
+    release_first.set()
+    assert hedged_call(lambda: "direct", hedge_after=None) == "direct"
+
+    tracker = LatencyTracker(min_samples=3)
+    assert tracker.percentile(0.95) is None
+    for latency in (0.1, 0.2, 0.3):
+        tracker.record(latency)
+    assert tracker.percentile(0.95) == 0.3
+
+
+def test_hedged_llm_call_aborts_loser_and_records_its_usage(app_config, monkeypatch):
+    import threading
+    import time
+    from types import SimpleNamespace
+    from src.clients import LlmClient
+    from src.concurrency import AdaptiveConcurrencyLimiter
+    from src.usage import UsageLedger, use_usage_ledger
+
+    closed = threading.Event()
+
+    class SlowStream:
+        def __iter__(self):
+            while not closed.is_set():
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="слово "))], usage=None)
+                time.sleep(0.01)
+
+        def close(self):
+            closed.set()
+
+    class Completions:
+        def __init__(self):
+            self.calls = 0
+
+        def create(self, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                return SlowStream()
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="fast"))],
+                usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+            )
+
+    class NoopLimiter:
+        def acquire(self, provider, model, tokens=0):
+            return 0.0
+
+        def reconcile(self, provider, model, estimated, actual):
+            pass
+
+    monkeypatch.setattr("src.clients.OpenAI", lambda **kwargs: SimpleNamespace(chat=SimpleNamespace(completions=Completions())))
+    concurrency = AdaptiveConcurrencyLimiter("llm", initial_limit=2, max_limit=2)
+    client = LlmClient(app_config, rate_limiter=NoopLimiter(), concurrency_limiter=concurrency)
+    client.hedge_requests = True
+    monkeypatch.setattr(client.latency_trackers["markdown"], "percentile", lambda q: 0.05)
+
+    ledger = UsageLedger()
+    with use_usage_ledger(ledger, "chapter_writer"):
+        assert client.generate_markdown("sys", "user", hedge=True) == "fast"
+
+    assert closed.wait(1.0)
+    deadline = time.monotonic() + 1.0
+    while len(ledger.records) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert concurrency.inflight == 0
+    # Проигравший hedge учтен по оценке промпта и полученной части ответа
+    assert sorted(record.input_tokens for record in ledger.records) == [2, 10]
+    assert all(record.output_tokens > 0 for record in ledger.records)
+
+
+def test_search_once_retries_transient_failures(app_config):
+    from src.clients import TavilyClientWrapper
+    from src.concurrency import get_concurrency_limiter
+    from src.ratelimit import get_rate_limiter
+    from src.resilience import RetryPolicy
+
+    class FlakyTavily:
+        def __init__(self):
+            self.calls = 0
+
+        def search(self, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                raise ConnectionError("reset")
+            return {"results": [{"title": "ok"}]}
+
+    wrapper = TavilyClientWrapper(app_config, retry_policy=RetryPolicy(max_attempts=2, base_delay=0.0, max_delay=0.0))
+    wrapper.client = FlakyTavily()
+    assert wrapper.search_once("q") == {"results": [{"title": "ok"}]}
+    assert wrapper.client.calls == 2
+    # Клиент, собранный не через build_clients, все равно идет через общие лимитеры процесса
+    assert wrapper.rate_limiter is get_rate_limiter(app_config)
+    assert wrapper.concurrency_limiter is get_concurrency_limiter("tavily")
+
+
+def test_cancel_token_child_budget_and_parent_cancellation():
+    from src.cancellation import CancelToken
+    from src.errors import RunCancelledError
+
+    now = [0.0]
+    run = CancelToken(100.0, clock=lambda: now[0])
+    stage = run.child(30.0, "SEARCH")
+    assert stage.remaining() == 30.0
+    assert run.child(500.0, "ASSEMBLY").remaining() == 100.0
+    assert stage.bound_timeout(120.0) == 30.0
+    assert CancelToken().bound_timeout(120.0) == 120.0
+
+    now[0] = 31.0
+    assert stage.cancelled and "SEARCH deadline exceeded" in stage.reason
+    assert not run.cancelled
+
+    other = run.child(None, "CHAPTER_WRITER")
+    run.cancel("stopped by user")
+    with pytest.raises(RunCancelledError, match="stopped by user"):
+        other.raise_if_cancelled()
+
+
+def test_run_cancellable_returns_immediately_on_cancel():
+    import threading
+    import time
+    from src.cancellation import CancelToken, run_cancellable
+    from src.errors import RunCancelledError
+
+    token = CancelToken()
+    release = threading.Event()
+    threading.Timer(0.05, lambda: token.cancel("client disconnected")).start()
+
+    started_at = time.monotonic()
+    with pytest.raises(RunCancelledError):
+        run_cancellable(lambda: release.wait(5), token, poll_interval=0.01)
+    assert time.monotonic() - started_at < 1.0
+    release.set()
+    assert run_cancellable(lambda: "ok", None) == "ok"
+
+
+def test_llm_client_bounds_request_timeout_by_stage_deadline(app_config, mock_openai_client, monkeypatch):
+    from src.clients import LlmClient
+    from src.cancellation import CancelToken, use_cancel_token
+    from src.errors import RunCancelledError
+
+    class NoopLimiter:
+        def acquire(self, provider, model, tokens=0):
+            return 0.0
+
+        def reconcile(self, provider, model, estimated, actual):
+            pass
+
+    monkeypatch.setattr("src.clients.OpenAI", lambda **kwargs: mock_openai_client)
+    client = LlmClient(app_config, rate_limiter=NoopLimiter())
+
+    with use_cancel_token(CancelToken(5.0)):
+        client.generate_markdown("sys", "user")
+    assert mock_openai_client.chat.completions.create.call_args.kwargs["timeout"] <= 5.0
+
+    cancelled = CancelToken()
+    cancelled.cancel("stopped by user")
+    mock_openai_client.chat.completions.create.reset_mock()
+    with use_cancel_token(cancelled), pytest.raises(RunCancelledError):
+        client.generate_markdown("sys", "user")
+    mock_openai_client.chat.completions.create.assert_not_called()
+
+
+def test_cancel_aborts_streamed_llm_call_and_frees_slot_and_tokens(app_config, monkeypatch):
+    import threading
+    import time
+    from types import SimpleNamespace
+    from src.clients import LlmClient
+    from src.concurrency import AdaptiveConcurrencyLimiter
+    from src.cancellation import CancelToken, use_cancel_token
+    from src.errors import RunCancelledError
+
+    streaming = threading.Event()
+    closed = threading.Event()
+
+    class SlowStream:
+        def __iter__(self):
+            while not closed.is_set():
+                streaming.set()
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="слово "))], usage=None)
+                time.sleep(0.01)
+
+        def close(self):
+            closed.set()
+
+    class Completions:
+        def create(self, **kwargs):
+            assert kwargs["stream"] is True
+            return SlowStream()
+
+    class RecordingLimiter:
+        def __init__(self):
+            self.reconciled = []
+            self.done = threading.Event()
+
+        def acquire(self, provider, model, tokens=0):
+            return 0.0
+
+        def reconcile(self, provider, model, estimated, actual):
+            self.reconciled.append((estimated, actual))
+            self.done.set()
+
+    monkeypatch.setattr("src.clients.OpenAI", lambda **kwargs: SimpleNamespace(chat=SimpleNamespace(completions=Completions())))
+    rate_limiter = RecordingLimiter()
+    concurrency = AdaptiveConcurrencyLimiter("llm", initial_limit=1, max_limit=1)
+    client = LlmClient(app_config, rate_limiter=rate_limiter, concurrency_limiter=concurrency)
+
+    token = CancelToken()
+    threading.Thread(target=lambda: streaming.wait(5) and token.cancel("stopped by user")).start()
+    with use_cancel_token(token), pytest.raises(RunCancelledError):
+        client.generate_markdown("sys", "user")
+
+    assert concurrency.inflight == 0
+    assert closed.wait(1.0)
+    # прерванный стрим сверяется с потраченным (промпт и полученная часть), а не возвращает оценку целиком
+    assert rate_limiter.done.wait(1.0)
+    [(estimated, actual)] = rate_limiter.reconciled
+    assert actual > estimated
+
+
+def test_llm_streams_only_markdown_and_falls_back_when_stream_options_are_rejected(app_config, monkeypatch):
+    from types import SimpleNamespace
+    from src.clients import LlmClient
+
+    class BadRequestError(Exception):
+        status_code = 400
+
+    calls = []
+
+    class Completions:
+        def create(self, **kwargs):
+            calls.append(kwargs)
+            if "stream_options" in kwargs:
+                raise BadRequestError("Unrecognized request argument supplied: stream_options")
+            usage = SimpleNamespace(prompt_tokens=3, completion_tokens=2, total_tokens=5)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=usage)
+
+    class Limiter:
+        def acquire(self, provider, model, tokens=0):
+            return 0.0
+
+        def reconcile(self, provider, model, estimated, actual):
+            pass
+
+    monkeypatch.setattr("src.clients.OpenAI", lambda **kwargs: SimpleNamespace(chat=SimpleNamespace(completions=Completions())))
+    client = LlmClient(app_config, rate_limiter=Limiter())
+
+    # JSON-ответ не стримится
+    assert client.generate_json("sys", "user") == "ok"
+    assert "stream" not in calls[0] and "stream_options" not in calls[0]
+
+    # Отклоненный stream_options: тот же вызов повторяется без стрима, следующие сразу идут без него
+    assert client.generate_markdown("sys", "user") == "ok"
+    assert calls[1]["stream"] is True and "stream" not in calls[2]
+    assert client.generate_markdown("sys", "user") == "ok"
+    assert len(calls) == 4 and "stream" not in calls[3] and client.stream_markdown is False
+
+
+def test_orchestrator_stops_before_next_stage_when_cancelled(app_config, ui_settings, sample_structure):
+    from src.orchestrator import GenerationOrchestrator
+    from src.cancellation import CancelToken
+    from src.errors import RunCancelledError
+
+    class CountingLlm:
+        calls = 0
+
+        def generate_markdown(self, system_prompt, user_prompt, temperature=0.7):
+            CountingLlm.calls += 1
+            return "text"
+
+    token = CancelToken()
+    orchestrator = GenerationOrchestrator(app_config, ui_settings, CountingLlm(), None)
+    orchestrator._start_run(token)
+    token.cancel("stopped by user")
+
+    with pytest.raises(RunCancelledError):
+        list(orchestrator._run_chapter_writer(sample_structure, "context"))
+    assert CountingLlm.calls == 0
+
+
+def test_single_flight_cancels_run_when_last_subscriber_detaches():
+    import threading
+    from src.coalescing import SingleFlight
+
+    flights = SingleFlight()
+    release = threading.Event()
+    abandoned = []
+
+    def factory():
+        yield ("a", None, None)
+        release.wait(5)
+        yield ("b", None, None)
+
+    first_detach, second_detach = threading.Event(), threading.Event()
+    first = flights.subscribe("k", factory, on_abandon=lambda: abandoned.append(1), detach=first_detach)
+    second = flights.subscribe("k", factory, detach=second_detach)
+    assert next(first) == ("a", None, None)
+    assert next(second) == ("a", None, None)
+
+    first_detach.set()
+    assert list(first) == []
+    assert abandoned == []
+
+    second_detach.set()
+    assert list(second) == []
+    assert abandoned == [1]
+    assert flights.in_flight("k") is False
+    release.set()
+
+
+def test_job_queue_cancel_stops_running_job(tmp_path, app_config, monkeypatch):
+    import threading
+    from src.jobs import JobQueue, execute_job, JOB_STATUS_CANCELLED
+    from src.errors import RunCancelledError
+
+    class WaitingOrchestrator:
+        def __init__(self, *args):
+            pass
+
+        def run_pipeline(self, topic, cancel_token=None):
+            yield ("started", None, None)
+            while not cancel_token.cancelled:
+                threading.Event().wait(0.01)
+            raise RunCancelledError(cancel_token.reason)
+
+    monkeypatch.setattr("src.orchestrator.GenerationOrchestrator", WaitingOrchestrator)
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.submit("topic", UiSettings())
+    job = queue.claim("w1")
+
+    threading.Timer(0.05, lambda: queue.cancel(job_id)).start()
+    execute_job(queue, job, None, None, app_config, cancel_poll_interval=0.01)
+
+    assert queue.get_job(job_id).status == JOB_STATUS_CANCELLED
+    assert queue.cancel(job_id) is False
+    events = list(queue.subscribe(job_id, poll_interval=0.01))
+    assert events[-1][0].startswith("⏹ Задание отменено")
+
+
+def test_stage_timing_store_median_in_memory_and_sqlite(tmp_path):
+    from src.planner import StageTimingStore
+
+    for store in (StageTimingStore(), StageTimingStore(str(tmp_path / "timings.sqlite3"))):
+        assert store.seconds_per_unit("gpt-4", "CHAPTER") is None
+        store.record("gpt-4", "CHAPTER", 30.0, units=3)
+        store.record("gpt-4", "CHAPTER", 12.0, units=3)
+        store.record("gpt-4", "CHAPTER", 60.0, units=3)
+        store.record("other", "CHAPTER", 100.0)
+        assert store.seconds_per_unit("gpt-4", "CHAPTER") == 10.0
+
+
+def test_plan_run_degrades_optional_work_to_fit_budget(app_config):
+    from dataclasses import replace
+    from src.planner import PlanBudget, StageTimingStore, plan_run
+
+    app_config = replace(app_config, llm_max_concurrency=4)
+    store = StageTimingStore()
+
+    thorough = plan_run(UiSettings(preset="thorough"), app_config, store)
+    assert (thorough.query_count, thorough.section_editors, thorough.final_editor) == (7, True, True)
+    assert thorough.chapter_concurrency == 1
+
+    speed = plan_run(UiSettings(chapter_count=3, words_per_chapter=200, preset="speed"), app_config, store)
+    assert speed.query_count == 3 and speed.section_editors is False
+    assert speed.estimated_seconds <= 60.0 and speed.within_budget
+
+    # Медленная история модели заставляет отключить финальный редактор и поднять параллелизм
+    for _ in range(3):
+        store.record(app_config.llm_model, "FINAL_EDITOR", 100.0)
+    tight = plan_run(UiSettings(chapter_count=3, words_per_chapter=200, preset="speed"), app_config, store)
+    assert tight.final_editor is False
+
+    by_calls = plan_run(UiSettings(preset="balanced"), app_config, store, PlanBudget(max_llm_calls=8))
+    assert by_calls.estimated_llm_calls <= 8 and by_calls.section_editors is False
+
+    custom = plan_run(UiSettings(preset="custom", enable_section_editors=False), app_config, store)
+    assert custom.section_editors is False and custom.chapter_concurrency == 4
+    assert UiSettings(preset="unknown").preset == "balanced"
+
+
+def test_tracer_nests_spans_and_exports_jsonl_and_otlp(tmp_path):
+    import json
+    from src.tracing import JsonlSpanExporter, Tracer, to_otlp_json, use_span
+
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer([JsonlSpanExporter(str(path))])
+    root = tracer.start_span("pipeline.run", trace_id="a" * 32)
+    with tracer.span("stage.search"):
+        pass
+    with pytest.raises(ValueError):
+        with use_span(root), tracer.span("llm.chat_completion", **{"gen_ai.usage.input_tokens": 12}) as child:
+            raise ValueError("boom")
+    root.end()
+
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    by_name = {span["name"]: span for span in spans}
+    assert by_name["llm.chat_completion"]["trace_id"] == "a" * 32
+    assert by_name["llm.chat_completion"]["parent_id"] == root.span_id
+    assert by_name["llm.chat_completion"]["status"] == "error"
+    assert by_name["stage.search"]["trace_id"] != "a" * 32
+
+    otlp = to_otlp_json([child, root])
+    otlp_spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert otlp_spans[0]["parentSpanId"] == root.span_id
+    assert otlp_spans[0]["attributes"] == [{"key": "gen_ai.usage.input_tokens", "value": {"intValue": "12"}}]
+    assert otlp_spans[0]["status"]["code"] == 2 and "parentSpanId" not in otlp_spans[1]
+
+
+def test_orchestrator_stage_and_llm_spans_share_run_id(app_config, ui_settings, sample_structure, mock_openai_client, monkeypatch):
+    from src.clients import LlmClient
+    from src.orchestrator import GenerationOrchestrator
+    from src.tracing import Tracer
+
+    class Collector:
+        def __init__(self):
+            self.spans = []
+
+        def export(self, spans):
+            self.spans.extend(spans)
+
+    class NoopLimiter:
+        def acquire(self, provider, model, tokens=0):
+            return 0.0
+
+        def reconcile(self, provider, model, estimated, actual):
+            pass
+
+    collector = Collector()
+    monkeypatch.setattr("src.clients.OpenAI", lambda **kwargs: mock_openai_client)
+    monkeypatch.setattr("src.clients.get_tracer", lambda: tracer)
+    tracer = Tracer([collector])
+
+    orchestrator = GenerationOrchestrator(app_config, ui_settings, LlmClient(app_config, rate_limiter=NoopLimiter()), None)
+    orchestrator.tracer = tracer
+    orchestrator._start_run(None, topic="crm")
+    list(orchestrator._traced_stage("chapter_writer", orchestrator._run_chapter_writer(sample_structure, "context")))
+    orchestrator._run_span.end()
+
+    names = [span.name for span in collector.spans]
+    assert names.count("llm.chat_completion") == 5 and names.count("chapter.write") == 5
+    assert {span.trace_id for span in collector.spans} == {orchestrator.run_id}
+    stage = next(span for span in collector.spans if span.name == "stage.chapter_writer")
+    chapter_parents = {span.parent_id for span in collector.spans if span.name == "chapter.write"}
+    assert chapter_parents == {stage.span_id}
+    assert all(span.attributes["gen_ai.request.model"] == "gpt-4" for span in collector.spans if span.name == "llm.chat_completion")
+
+
+def test_metrics_registry_renders_prometheus_text_and_serves_it():
+    import urllib.request
+    from src.metrics import MetricsRegistry, _Metric, start_metrics_server
+
+    with pytest.raises(TypeError):
+        _Metric("bare", "Metric without samples")
+
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls", ("provider",))
+    latency = registry.histogram("latency_seconds", "Latency", ("stage",), buckets=(1.0, 5.0))
+    calls.inc(provider="llm")
+    calls.inc(2, provider="llm")
+    latency.observe(0.5, stage="search")
+    latency.observe(3.0, stage="search")
+    latency.observe(7.0, stage="search")
+    assert registry.counter("calls_total", "Calls", ("provider",)) is calls
+    with pytest.raises(ValueError):
+        calls.inc(model="gpt-4")
+
+    server = start_metrics_server(0, registry=registry)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    finally:
+        server.shutdown()
+
+    assert "# TYPE calls_total counter" in body
+    assert 'calls_total{provider="llm"} 3' in body
+    assert 'latency_seconds_bucket{stage="search",le="1"} 1' in body
+    assert 'latency_seconds_bucket{stage="search",le="5"} 2' in body
+    assert 'latency_seconds_bucket{stage="search",le="+Inf"} 3' in body
+    assert 'latency_seconds_count{stage="search"} 3' in body
+
+
+def test_orchestrator_and_llm_client_record_metrics(app_config, ui_settings, mock_openai_client, monkeypatch):
+    from src.clients import LlmClient
+    from src.errors import RunCancelledError
+    from src.metrics import LLM_TOKENS_TOTAL, PROVIDER_CALLS_TOTAL, RUNS_IN_FLIGHT, RUNS_TOTAL, STAGE_SECONDS
+    from src.orchestrator import GenerationOrchestrator
+
+    class NoopLimiter:
+        def acquire(self, provider, model, tokens=0):
+            return 0.0
+
+        def reconcile(self, provider, model, estimated, actual):
+            pass
+
+    def stage():
+        yield ("log", None, None)
+        raise RunCancelledError("stopped by user")
+
+    mock_openai_client.chat.completions.create.return_value.usage.prompt_tokens = 11
+    monkeypatch.setattr("src.clients.OpenAI", lambda **kwargs: mock_openai_client)
+    llm = LlmClient(app_config, rate_limiter=NoopLimiter())
+    calls_before = PROVIDER_CALLS_TOTAL.value(provider="llm", operation="json", status="ok")
+    tokens_before = LLM_TOKENS_TOTAL.value(model="gpt-4", direction="input")
+    cancelled_before = RUNS_TOTAL.value(status="cancelled")
+    stages_before = STAGE_SECONDS.count(stage="search", status="error")
+
+    llm.generate_json("system", "user")
+    orchestrator = GenerationOrchestrator(app_config, ui_settings, llm, None)
+    orchestrator._start_run(None, topic="crm")
+    assert RUNS_IN_FLIGHT.value() >= 1
+    with pytest.raises(RunCancelledError):
+        try:
+            list(orchestrator._traced_stage("search", stage()))
+        finally:
+            orchestrator._finish_run()
+
+    assert PROVIDER_CALLS_TOTAL.value(provider="llm", operation="json", status="ok") == calls_before + 1
+    assert LLM_TOKENS_TOTAL.value(model="gpt-4", direction="input") == tokens_before + 11
+    assert RUNS_TOTAL.value(status="cancelled") == cancelled_before + 1
+    assert STAGE_SECONDS.count(stage="search", status="error") == stages_before + 1
+
+
+def test_load_env_config_parses_llm_prices(monkeypatch):
+    monkeypatch.setenv("LLM_API_KEY", "k1")
+    monkeypatch.setenv("LLM_BASE_URL", "https://x")
+    monkeypatch.setenv("LLM_MODEL", "m")
+    monkeypatch.setenv("TAVILY_API_KEY", "k2")
+    monkeypatch.setenv("LLM_PRICES", "openai/gpt-4o=2.5/10, gpt-4o-mini=0.15/0.6")
+
+    cfg = load_env_config()
+    assert cfg.llm_prices == {"openai/gpt-4o": (2.5, 10.0), "gpt-4o-mini": (0.15, 0.6)}
+
+    monkeypatch.setenv("LLM_PRICES", "gpt-4o=cheap")
+    with pytest.raises(ValueError) as e:
+        load_env_config()
+    assert "LLM_PRICES" in str(e.value)
+
+
+def test_usage_ledger_aggregates_llm_calls_per_stage_and_writes_report(app_config, mock_openai_client, tmp_path, monkeypatch):
+    from src.clients import LlmClient
+    from src.usage import UsageLedger, use_usage_ledger, write_usage_report
+
+    class NoopLimiter:
+        def acquire(self, provider, model, tokens=0):
+            return 0.0
+
+        def reconcile(self, provider, model, estimated, actual):
+            pass
+
+    usage = mock_openai_client.chat.completions.create.return_value.usage
+    usage.prompt_tokens, usage.completion_tokens = 1000, 500
+    monkeypatch.setattr("src.clients.OpenAI", lambda **kwargs: mock_openai_client)
+    llm = LlmClient(app_config, rate_limiter=NoopLimiter())
+    ledger = UsageLedger({"gpt-4": (30.0, 60.0)})
+
+    with use_usage_ledger(ledger, "chapter_writer"):
+        llm.generate_markdown("system", "user")
+        llm.generate_markdown("system", "user")
+    with use_usage_ledger(ledger, "assembly"):
+        llm.generate_json("system", "user")
+    llm.generate_json("system", "user")
+
+    stages = ledger.by_stage()
+    assert list(stages) == ["chapter_writer", "assembly"]
+    assert stages["chapter_writer"] == {"calls": 2, "input_tokens": 2000, "output_tokens": 1000, "cost_usd": 0.12}
+    assert ledger.totals()["cost_usd"] == pytest.approx(0.18)
+    assert "$0.1800" in ledger.summary()
+    unpriced = UsageLedger()
+    unpriced.record("search", "gpt-4", "json", 10, 5)
+    assert unpriced.totals()["cost_usd"] is None
+    assert unpriced.summary().endswith("цена модели не задана")
+
+    path = write_usage_report(ledger, tmp_path / "lead_magnet_20260101_000000.md", run_id="abc")
+    assert path.name == "lead_magnet_20260101_000000.usage.json"
+    report = json.loads(path.read_text(encoding="utf-8"))
+    assert report["run_id"] == "abc" and report["total"]["calls"] == 3
+
+
+def test_offline_benchmark_runs_pipeline_on_simulated_providers():
+    from src.benchmark import BenchmarkScenario, LatencyProfile, format_results, run_matrix
+
+    base = BenchmarkScenario(
+        words_per_chapter=100,
+        llm=LatencyProfile(median_seconds=0.0, error_rate=0.0),
+        search=LatencyProfile(median_seconds=0.0)
+    )
+    results = run_matrix([2, 3], [2], base)
+
+    assert [result.succeeded for result in results] == [True, True]
+    # запросы + структура + главы + секции (главы, введение, заключение) + финальный редактор
+    assert [result.llm_calls for result in results] == [2 + 2 + 4 + 1, 2 + 3 + 5 + 1]
+    assert all(result.search_calls == 5 and result.peak_memory_mb > 0 for result in results)
+    assert "chapters" in format_results(results).splitlines()[0]
+
+
+def test_stub_server_serves_openai_and_tavily_over_http(app_config):
+    from openai import OpenAI, RateLimitError
+    from src.benchmark import LatencyProfile
+    from src.clients import build_clients
+    from src.stub_server import StubConfig, start_stub_server
+
+    server = start_stub_server(StubConfig(ttft=LatencyProfile(0.0), search=LatencyProfile(0.0), raw_content_chars=10))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        app_config.llm_base_url = f"{base}/v1"
+        app_config.tavily_base_url = base
+        app_config.llm_max_attempts = 1
+        llm, tavily = build_clients(app_config)
+
+        queries = json.loads(llm.generate_json("Роль: Агент по уточнению поисковых запросов\nСоздайте ровно 3 уникальных", "тема"))
+        assert len(queries) == 3
+        response = tavily.search_once("crm", max_results=2)
+        assert [len(r["raw_content"]) for r in response["results"]] == [10, 10]
+
+        stream = OpenAI(api_key="stub", base_url=f"{base}/v1").chat.completions.create(
+            model="stub", messages=[{"role": "user", "content": "текст"}], stream=True
+        )
+        streamed = "".join(chunk.choices[0].delta.content or "" for chunk in stream)
+        assert streamed.startswith("### Раздел")
+
+        server.stub_config.update({"llm_429_rate": 1.0})
+        with pytest.raises(RateLimitError):
+            llm.generate_markdown("system", "user")
+        assert server.stub_stats.snapshot()["chat_completions_429"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_cassette_records_and_replays_provider_traffic(app_config, tmp_path):
+    from src.benchmark import FakeChatCompletions, FakeTavilySearch, LatencyProfile
+    from src.cassette import Cassette, CassetteMissError, CassettePlayer, attach_cassette
+    from src.clients import LlmClient, TavilyClientWrapper
+    from src.ratelimit import RateLimitConfig, RateLimiter
+
+    def make_clients(llm_fake=None, search_fake=None):
+        limiter = RateLimiter({"llm": RateLimitConfig(), "tavily": RateLimitConfig()})
+        llm = LlmClient(app_config, rate_limiter=limiter)
+        tavily = TavilyClientWrapper(app_config, limiter)
+        llm.client, tavily.client = llm_fake, search_fake
+        return llm, tavily
+
+    path = str(tmp_path / "cassettes" / "run.jsonl")
+    recorded_llm, recorded_search = make_clients(
+        FakeChatCompletions(LatencyProfile(0.0)), FakeTavilySearch(LatencyProfile(0.0), raw_content_chars=5)
+    )
+    attach_cassette(recorded_llm, recorded_search, "record", path)
+    prompt = "Роль: Агент по уточнению поисковых запросов\nСоздайте ровно 2 уникальных"
+    original_queries = recorded_llm.generate_json(prompt, "тема")
+    original_chapter = recorded_llm.generate_markdown("Длина: Примерно 5 слов.", "глава")
+    original_search = recorded_search.search_once("crm", max_results=2)
+
+    replay_llm, replay_search = make_clients()
+    attach_cassette(replay_llm, replay_search, "replay", path, latency="zero")
+    assert replay_llm.generate_markdown("Длина: Примерно 5 слов.", "глава") == original_chapter
+    assert replay_llm.generate_json(prompt, "тема") == original_queries
+    assert replay_search.search_once("crm", max_results=2) == original_search
+
+    entries = Cassette(path).load()
+    assert [entry["provider"] for entry in entries] == ["llm", "llm", "search"]
+    strict = CassettePlayer(entries, latency="zero", strict=True)
+    with pytest.raises(CassetteMissError):
+        strict.play("llm", "unknown-key", timeout=None)
+    lenient = CassettePlayer(entries, latency="zero")
+    assert lenient.play("llm", "unknown-key", timeout=None)["content"] == original_queries
+
+
+def test_loadtest_percentiles_and_named_generate_endpoint():
+    from src.loadtest import API_NAME, percentile
+    from src.ui import build_ui, configure_queue
+
+    assert percentile([], 0.95) is None
+    assert percentile([3.0, 1.0, 2.0, 4.0], 0.5) == 2.0
+    assert percentile([float(i) for i in range(1, 21)], 0.95) == 19.0
+
+    demo = configure_queue(build_ui(), concurrency_limit=3, max_size=10)
+    api_names = [fn.api_name for fn in demo.fns.values()]
+    assert API_NAME.lstrip("/") in api_names
+    assert demo._queue.max_size == 10
+
+
+def test_app_context_reuses_clients_until_env_changes(monkeypatch, tmp_path):
+    from src.app_context import get_app_context, reset_app_context
+
+    monkeypatch.setenv("LLM_API_KEY", "k1")
+    monkeypatch.setenv("LLM_BASE_URL", "https://x")
+    monkeypatch.setenv("LLM_MODEL", "m")
+    monkeypatch.setenv("TAVILY_API_KEY", "k2")
+    monkeypatch.setenv("CASSETTE_MODE", "off")
+    monkeypatch.setenv("UI_SETTINGS_DIR", str(tmp_path / "settings"))
+    monkeypatch.setenv("JOB_QUEUE_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.chdir(tmp_path)
+    reset_app_context()
+    try:
+        context = get_app_context()
+        assert get_app_context() is context
+        assert context.clients() == (context.llm_client, context.tavily_client)
+        # Очередь открывается один раз на контекст, а не на каждый запуск
+        assert context.job_queue is not None and get_app_context().job_queue is context.job_queue
+
+        context.settings_store.save_async("session/1", UiSettings(chapter_count=3))
+        context.settings_store.save_async("session/1", UiSettings(chapter_count=4))
+        assert context.settings_store.flush(timeout=5)
+        assert context.settings_store.load("session/1").chapter_count == 4
+        assert context.settings_store.path_for("session/1").parent == tmp_path / "settings"
+
+        monkeypatch.setenv("LLM_MODEL", "m2")
+        reloaded = get_app_context()
+        assert reloaded is not context and reloaded.config.llm_model == "m2"
+        assert reloaded.settings_store is context.settings_store
+
+        # Правка .env после старта тоже пересобирает контекст
+        (tmp_path / ".env").write_text("LLM_MODEL=m3\n", encoding="utf-8")
+        from_env_file = get_app_context()
+        assert from_env_file is not reloaded and from_env_file.config.llm_model == "m3"
+        assert get_app_context() is from_env_file
+        (tmp_path / ".env").write_text("LLM_MODEL=m45\n", encoding="utf-8")
+        assert get_app_context().config.llm_model == "m45"
+    finally:
+        reset_app_context()
+
+
+def test_progress_events_track_stage_percent_and_bounded_log():
+    from src.errors import RunCancelledError
+    from src.progress import LEVEL_STOPPED, ProgressLog, ProgressTracker, progress_events
+
+    def run():
+        yield (emit_log("Поиск", "Поиск исследовательских данных..."), None, None)
+        yield (emit_log("Писатель глав", "Глава 1 написана (1/2)"), None, None)
+        yield (emit_log("Писатель глав", "Глава 2 написана (2/2)"), "# Черновик", None)
+        raise RunCancelledError("user")
+
+    events = list(progress_events(run(), ProgressTracker(started_at=0.0)))
+    assert [e.stage for e in events[:3]] == ["Поиск", "Писатель глав", "Писатель глав"]
+    assert (events[1].step, events[1].total_steps) == (1, 2)
+    assert events[0].percent < events[1].percent < events[2].percent == 70.0
+    assert events[2].eta_seconds is not None and events[2].markdown == "# Черновик"
+    assert events[-1].level == LEVEL_STOPPED and events[-1].seq == 4
+
+    log = ProgressLog(max_events=2)
+    texts = []
+    for event in events:
+        log.append(event)
+        texts.append(log.text())
+    assert texts[1].startswith(texts[0])
+    assert log.dropped == 2 and texts[-1].startswith("… пропущено строк: 2\n📍 Писатель глав: Глава 2")
+    assert log.markdown == "# Черновик" and "остановлен" in log.status()
+
+
+def test_progress_log_rerenders_at_most_once_per_interval_and_flushes_on_significant_events():
+    from src.progress import ProgressLog, ProgressTracker
+
+    now = [0.0]
+    tracker = ProgressTracker(started_at=0.0)
+    log = ProgressLog(max_events=50, render_interval=1.0, clock=lambda: now[0])
+    assert log.render() is None
+
+    # Поток из 1000 строк одной стадии за 10 секунд: лог пересылается не чаще раза в секунду
+    payloads = []
+    for index in range(1000):
+        now[0] = index * 0.01
+        log.append(tracker.event(emit_log("Поиск", f"Ошибка запроса {index}")))
+        payloads.append(log.render())
+    rendered = [text for text in payloads if text is not None]
+    assert len(rendered) <= 11
+    assert max(len(text) for text in rendered) < 50 * 40
+    assert sum(len(text) for text in rendered) < 11 * 50 * 40
+
+    # Смена стадии и результат показываются сразу, вместе с отложенными строками
+    log.append(tracker.event(emit_log("Планировщик структуры", "Планирование структуры документа...")))
+    text = log.render()
+    assert text is not None and "Ошибка запроса 999" in text and text.startswith("… пропущено строк: 951\n")
+    assert log.render() is None
+    log.append(tracker.event(emit_log("Планировщик структуры", "Готово"), filepath="out.md"))
+    assert log.render().endswith("📍 Планировщик структуры: Готово") and log.filepath == "out.md"
+
+
+def test_render_preview_marks_pending_chapters_in_final_order():
+    from src.export import render_preview
+
+    preview = render_preview("T", "S", "Intro", [None, "Текст второй"], "Итог", ["Первая", "Вторая"])
+    assert preview.index("Intro") < preview.index("_Первая: пишется…_") < preview.index("Текст второй") < preview.index("Итог")
+    assert render_preview("T", "S", "Intro", ["A", "B"], "Итог") == assemble_document_sections("T", "S", "Intro", ["A", "B"], "Итог")
+
+
+def test_http_api_submit_stream_result_and_cancel(tmp_path):
+    from fastapi.testclient import TestClient
+    from src.api import create_api
+    from src.jobs import JobQueue
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    client = TestClient(create_api(queue))
+
+    assert client.post("/api/jobs", json={"topic": "CRM", "settings": {"chapters": 3}}).status_code == 422
+    submitted = client.post("/api/jobs", json={"topic": "CRM", "settings": {"chapter_count": 3}})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+    assert client.get(f"/api/jobs/{job_id}").json()["settings"]["chapter_count"] == 3
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 409
+
+    result_path = tmp_path / "doc.md"
+    result_path.write_text("# Doc", encoding="utf-8")
+    partial_path = tmp_path / ".doc.md.partial"
+    partial_path.write_text("# Do", encoding="utf-8")
+    queue.claim("w1")
+    assert client.get(f"/api/jobs/{job_id}/partial").status_code == 409
+    assert queue.set_partial_path(job_id, str(partial_path), "w1")
+    assert client.get(f"/api/jobs/{job_id}").json()["partial_url"] == f"/api/jobs/{job_id}/partial"
+    assert client.get(f"/api/jobs/{job_id}/partial").text == "# Do"
+    queue.append_event(job_id, emit_log("Писатель глав", "Глава 1 написана (1/2)"))
+    queue.append_event(job_id, emit_log("Сборка", "Документ сохранен"), "# Doc", str(result_path))
+    queue.complete(job_id, str(result_path))
+
+    stream = client.get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": "1"}).text
+    messages = [block for block in stream.split("\n\n") if block]
+    assert messages[0].startswith("id: 2\nevent: progress") and '"percent": 100.0' in messages[0]
+    assert messages[-1].startswith("event: done") and '"status": "succeeded"' in messages[-1]
+    assert client.get(f"/api/jobs/{job_id}").json()["result_url"] == f"/api/jobs/{job_id}/result"
+    assert client.get(f"/api/jobs/{job_id}/result").text == "# Doc"
+    assert client.get(f"/api/jobs/{job_id}/partial").status_code == 409
+
+    other = client.post("/api/jobs", json={"topic": "ERP"}).json()["job_id"]
+    cancelled = client.post(f"/api/jobs/{other}/cancel").json()
+    assert cancelled["cancelled"] is True and cancelled["status"] == "cancelled"
+    assert client.get("/api/jobs/missing").status_code == 404
+
+
+def test_cli_and_orchestrator_import_without_gradio_or_provider_sdks():
+    from src.cli import measure_import
+
+    for module in ("src.cli", "src.orchestrator"):
+        timing = measure_import(module, repeat=1)
+        assert timing.loaded_heavy == [], module
+        assert timing.forbidden and timing.budget_seconds is not None
+
+
+def test_warm_up_opens_provider_connections_and_reports_timing(app_config):
+    from src.benchmark import LatencyProfile
+    from src.clients import build_clients
+    from src.metrics import WARMUP_SECONDS
+    from src.stub_server import StubConfig, start_stub_server
+    from src.warmup import warm_up
+
+    server = start_stub_server(StubConfig(ttft=LatencyProfile(0.0), search=LatencyProfile(0.0)))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        app_config.llm_base_url = f"{base}/v1"
+        app_config.tavily_base_url = base
+        llm, tavily = build_clients(app_config)
+
+        assert warm_up(llm, tavily, mode="off").steps == []
+        report = warm_up(llm, tavily, mode="completion", timeout=5.0)
+        assert [step.target for step in report.steps] == ["llm.connect", "llm.completion", "search.connect"]
+        assert all(step.status == "ok" for step in report.steps), report.steps
+        assert server.stub_stats.snapshot()["chat_completions"] == 1
+        assert WARMUP_SECONDS.value(target="llm.completion") == report.steps[1].seconds
+        assert report.summary().startswith("Warm-up (completion)")
+    finally:
+        server.shutdown()
+
+
+def test_artifact_store_atomic_unique_and_deduplicated_under_concurrency(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from src.artifacts import DEFAULT_FILE_MODE, ArtifactBackend, ArtifactStore, LocalArtifactBackend, MemoryArtifactBackend
+
+    store = ArtifactStore(LocalArtifactBackend(str(tmp_path)))
+    names = [build_output_filename(run_id=f"{i:02x}" * 16) for i in range(16)]
+    assert len(set(names)) == 16 and re.match(r"^lead_magnet_\d{8}_\d{6}_(01){6}\.md$", names[1])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        artifacts = list(pool.map(lambda i: store.save_document(names[i], f"# Doc {i % 2}"), range(16)))
+
+    assert [Path(a.location).read_text(encoding="utf-8") for a in artifacts[:2]] == ["# Doc 0", "# Doc 1"]
+    assert len({a.sha256 for a in artifacts}) == 2
+    assert Path(artifacts[0].location).stat().st_ino == Path(artifacts[2].location).stat().st_ino
+    assert len(list((tmp_path / ".objects").rglob("*.md"))) == 2
+    assert not [p for p in tmp_path.rglob("*") if p.name.endswith((".tmp", ".link"))]
+    # Права как у open() по umask процесса, а не 0600 от mkstemp
+    assert Path(artifacts[0].location).stat().st_mode & 0o777 == DEFAULT_FILE_MODE
+
+    with pytest.raises(TypeError):
+        ArtifactBackend()
+
+    memory = ArtifactStore(MemoryArtifactBackend())
+    first, second = memory.save_document("a.md", "same"), memory.save_document("b.md", "same")
+    assert (first.deduplicated, second.deduplicated) == (False, True)
+    assert second.location == "memory://artifacts/b.md" and memory.backend.read("b.md") == b"same"
+
+
+def test_assembly_keeps_document_in_memory_and_writes_no_draft():
+    from src.artifacts import ArtifactStore, MemoryArtifactBackend
+    from src.benchmark import BenchmarkScenario, LatencyProfile, run_scenario
+    from src.export import assemble_document
+
+    document = assemble_document("T", "S", "Intro", ["Первая", "Вторая"], "Итог")
+    assert document.markdown == assemble_document_sections("T", "S", "Intro", ["Первая", "Вторая"], "Итог")
+    assert [section.name for section in document.sections] == ["Introduction", "Chapter 1", "Chapter 2", "Conclusion"]
+    assert all(document.markdown[s.start:s.end] == s.text for s in document.sections)
+    assert document.section("Chapter 2").text == "Вторая"
+
+    result = run_scenario(BenchmarkScenario(
+        chapter_count=2,
+        words_per_chapter=100,
+        llm=LatencyProfile(median_seconds=0.0),
+        search=LatencyProfile(median_seconds=0.0)
+    ))
+    # документ и отчет usage; черновик по умолчанию не пишется
+    assert result.succeeded and result.output_files == 2
+    assert "assembly" in result.stage_seconds
+
+    store = ArtifactStore(MemoryArtifactBackend("drafts"))
+    assert store.save_text_async("draft.md", document.markdown).result(timeout=5) == "memory://drafts/draft.md"
+
+
+def test_output_catalog_searches_documents_and_evicts_by_retention(tmp_path):
+    import time
+    from src.artifacts import ArtifactStore, LocalArtifactBackend
+    from src.catalog import OutputCatalog, RetentionPolicy
+
+    store = ArtifactStore(LocalArtifactBackend(str(tmp_path / "outputs")))
+    catalog = OutputCatalog(str(tmp_path / "outputs" / "catalog.sqlite3"))
+    docs = [
+        ("a.md", "Продажи в B2B", "CRM для малого бизнеса", "# Один"),
+        ("b.md", "Воронка лидов", "Лидогенерация", "# Два"),
+        ("c.md", "Продажи без CRM", "Таблицы и продажи", "# Один"),
+    ]
+    for name, title, topic, content in docs:
+        artifact = store.save_document(name, content)
+        store.save_text(name.replace(".md", ".usage.json"), "{}")
+        catalog.add(artifact.key, artifact.location, title, topic, artifact.sha256, artifact.size,
+                    settings=UiSettings(), run_id="r", usage_totals={"input_tokens": 10, "output_tokens": 5, "cost_usd": 0.01})
+        time.sleep(0.01)
+
+    assert catalog.full_text
+    assert [e.key for e in catalog.search("продаж")] and {e.key for e in catalog.search("продаж")} == {"a.md", "c.md"}
+    assert [e.key for e in catalog.search("crm малого")] == ["a.md"]
+    assert [e.key for e in catalog.search("")] == ["c.md", "b.md", "a.md"]
+    entry = catalog.get(catalog.search("воронка")[0].doc_id)
+    assert entry.settings["chapter_count"] == 5 and entry.cost_usd == 0.01 and "Воронка лидов" in entry.label()
+
+    evicted = catalog.enforce_retention(RetentionPolicy(max_count=2), store)
+    assert [e.key for e in evicted] == ["a.md"]
+    assert not (tmp_path / "outputs" / "a.md").exists() and not (tmp_path / "outputs" / "a.usage.json").exists()
+    # c.md ссылается на то же содержимое: объект остается
+    assert store.read_document("c.md") == "# Один" and len(list((tmp_path / "outputs" / ".objects").rglob("*.md"))) == 2
+    assert catalog.search("crm малого") == []
+
+    assert catalog.enforce_retention(RetentionPolicy(), store) == []
+    evicted = catalog.enforce_retention(RetentionPolicy(max_age_days=1), store, now=time.time() + 2 * 86400)
+    assert {e.key for e in evicted} == {"b.md", "c.md"} and catalog.recent() == []
+    assert list((tmp_path / "outputs" / ".objects").rglob("*.md")) == []
+
+
+@pytest.mark.parametrize("final_editor", [True, False])
+def test_saved_drafts_are_cataloged_for_retention(app_config, ui_settings, sample_structure, tmp_path, final_editor):
+    import time
+    from dataclasses import replace
+    from types import SimpleNamespace
+    from src.artifacts import ArtifactStore, LocalArtifactBackend, _writer
+    from src.catalog import KIND_DRAFT, OutputCatalog
+    from src.orchestrator import GenerationOrchestrator
+
+    class EditingLlm:
+        def generate_markdown(self, system_prompt, user_prompt, temperature=0.7):
+            return "# Итог"
+
+    store = ArtifactStore(LocalArtifactBackend(str(tmp_path / "outputs")))
+    catalog = OutputCatalog(str(tmp_path / "catalog.sqlite3"))
+    orchestrator = GenerationOrchestrator(
+        replace(app_config, save_drafts=True), ui_settings, EditingLlm(), None, artifact_store=store, catalog=catalog
+    )
+    orchestrator.plan = replace(orchestrator.plan, section_editors=False, final_editor=final_editor)
+    orchestrator.run_id = "run-draft"
+    orchestrator._run_span = SimpleNamespace(start_time=time.time())
+    for _ in orchestrator._run_assembly_and_editor(sample_structure, [f"Глава {i}" for i in range(1, 6)]):
+        pass
+    # однопоточный фоновый writer: следующая задача начинается после callback'ов предыдущей
+    _writer().submit(lambda: None).result()
+
+    with catalog._connect() as conn:
+        kinds = {row["key"]: row["kind"] for row in conn.execute("SELECT key, kind FROM documents")}
+    drafts = [key for key, kind in kinds.items() if kind == KIND_DRAFT]
+    assert len(drafts) == 1 and (tmp_path / "outputs" / drafts[0]).exists() and len(kinds) == 2
+    assert [e.key for e in catalog.recent()] == [key for key in kinds if key not in drafts]
+
+
+def test_output_catalog_backfills_existing_outputs_and_evicts_drafts(tmp_path):
+    import os
+    import time
+    from src.artifacts import ArtifactStore, LocalArtifactBackend
+    from src.catalog import KIND_DRAFT, OutputCatalog, RetentionPolicy
+
+    outputs = tmp_path / "outputs"
+    store = ArtifactStore(LocalArtifactBackend(str(outputs)))
+    store.save_text("lead_magnet_old.md", "# Старый документ\n\nТекст")
+    store.save_text("draft_old.md", "# Старый черновик")
+    os.utime(outputs / "lead_magnet_old.md", (time.time() - 3 * 86400,) * 2)
+    catalog = OutputCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.add("known.md", store.backend.location("known.md"), "Известный", "", "0" * 64, 1)
+
+    added = catalog.backfill(store)
+    assert sorted((e.key, e.kind) for e in added) == [("draft_old.md", KIND_DRAFT), ("lead_magnet_old.md", "document")]
+    assert catalog.backfill(store) == []
+    # черновики не показываются в поиске, но подчиняются политике хранения
+    assert [e.title for e in catalog.search("старый")] == ["Старый документ"]
+    assert {e.key for e in catalog.recent()} == {"known.md", "lead_magnet_old.md"}
+    evicted = catalog.enforce_retention(RetentionPolicy(max_age_days=1), store)
+    assert [e.key for e in evicted] == ["lead_magnet_old.md"] and not (outputs / "lead_magnet_old.md").exists()
+    evicted = catalog.enforce_retention(RetentionPolicy(max_count=1), store)
+    assert [e.key for e in evicted] == ["draft_old.md"] and not (outputs / "draft_old.md").exists()
+
+    # без FTS5 спецсимволы LIKE ищутся буквально
+    catalog.full_text = False
+    catalog.add("p.md", "p.md", "Рост на 100%", "a_b", "1" * 64, 1)
+    catalog.add("q.md", "q.md", "Рост на 1000", "axb", "2" * 64, 1)
+    assert [e.key for e in catalog.search("100%")] == ["p.md"]
+    assert [e.key for e in catalog.search("a_b")] == ["p.md"]
+
+
+def test_streaming_writer_publishes_sections_in_order_atomically(tmp_path, monkeypatch):
+    from dataclasses import replace
+    from src.artifacts import DEFAULT_FILE_MODE
+    from src.benchmark import BenchmarkScenario, LatencyProfile, run_scenario
+    from src.export import StreamingMarkdownWriter, document_chunks
+    from src.planner import manual_plan
+
+    chunks = list(document_chunks("T", "S", "Intro", ["Первая", "Вторая"], "Итог"))
+    target = tmp_path / "doc.md"
+    writer = StreamingMarkdownWriter(target, sections=len(chunks))
+    writer.put(0, chunks[0])
+    writer.put(2, chunks[2])
+    # глава 1 готова раньше введения: частичный файл содержит только непрерывный префикс
+    assert writer.read_partial() == chunks[0] and writer.written_sections == 1 and not target.exists()
+    writer.put(1, chunks[1])
+    assert writer.read_partial() == "".join(chunks[:3])
+    with pytest.raises(ValueError):
+        writer.put(1, chunks[1])
+    with pytest.raises(ValueError):
+        writer.commit()
+    writer.put(4, chunks[4])
+    writer.put(3, chunks[3])
+    assert writer.commit() == target
+    document = assemble_document_sections("T", "S", "Intro", ["Первая", "Вторая"], "Итог")
+    assert target.read_text(encoding="utf-8") == document
+    assert writer.sha256 == hashlib.sha256(document.encode("utf-8")).hexdigest() and writer.size == len(document.encode("utf-8"))
+    assert not writer.partial_path.exists()
+    assert target.stat().st_mode & 0o777 == DEFAULT_FILE_MODE
+
+    with StreamingMarkdownWriter(tmp_path / "aborted.md", sections=3) as aborted:
+        aborted.put(0, "# T\n")
+    assert not aborted.partial_path.exists() and not (tmp_path / "aborted.md").exists()
+
+    # План без финального редактора: итоговый документ пишется потоково и регистрируется без повторной записи
+    monkeypatch.setattr(
+        "src.orchestrator.plan_run",
+        lambda settings, app_config, store=None: replace(manual_plan(settings, app_config), final_editor=False)
+    )
+    result = run_scenario(BenchmarkScenario(
+        chapter_count=2,
+        words_per_chapter=100,
+        llm=LatencyProfile(median_seconds=0.0),
+        search=LatencyProfile(median_seconds=0.0)
+    ))
+    assert result.succeeded and result.output_files == 2
+    assert result.llm_calls == 2 + 2 + 4
+
+
+def test_final_editor_gets_in_memory_draft_without_writing_files(app_config, ui_settings, sample_structure, tmp_path):
+    from dataclasses import replace
+    from src.artifacts import ArtifactStore, LocalArtifactBackend
+    from src.export import assemble_document
+    from src.orchestrator import GenerationOrchestrator
+
+    chapters = [f"Глава {i}" for i in range(1, 6)]
+    draft = assemble_document(
+        sample_structure.title, sample_structure.subtitle, sample_structure.introduction, chapters, sample_structure.conclusions
+    ).markdown
+    files_during_edit = []
+
+    class EditingLlm:
+        def generate_markdown(self, system_prompt, user_prompt, temperature=0.7):
+            # Черновик передается редактору из памяти: на диске в этот момент ничего нет
+            files_during_edit.extend(path.name for path in tmp_path.rglob("*"))
+            assert draft in user_prompt and orchestrator.partial_path is None
+            return "# Итог"
+
+    store = ArtifactStore(LocalArtifactBackend(str(tmp_path)))
+    orchestrator = GenerationOrchestrator(
+        replace(app_config, save_drafts=False), ui_settings, EditingLlm(), None, artifact_store=store, catalog=None
+    )
+    orchestrator.plan = replace(orchestrator.plan, section_editors=False, final_editor=True)
+    orchestrator.run_id = "run-partial"
+    stage = orchestrator._run_assembly_and_editor(sample_structure, chapters)
+    try:
+        while True:
+            next(stage)
+    except StopIteration as done:
+        filepath = done.value
+
+    assert files_during_edit == []
+    assert Path(filepath).read_text(encoding="utf-8") == "# Итог"
+    assert orchestrator.partial_path is None and not list(tmp_path.glob("draft_*"))
+
+    # UI отдает снимок частичного файла сессии для скачивания
+    from types import SimpleNamespace
+    from src import ui
+
+    ui._register_session_partial("session-partial", lambda: filepath)
+    snapshot = ui.on_partial_download(SimpleNamespace(session_hash="session-partial"))
+    assert Path(snapshot).read_text(encoding="utf-8") == "# Итог"
+    ui._register_session_partial("session-partial", lambda: None)
+    assert ui.on_partial_download(SimpleNamespace(session_hash="session-partial")) is None
+
+
+def test_ui_startup_steps_fail_independently(app_config, monkeypatch):
+    import threading
+    from dataclasses import replace
+    import src.ui as ui
+
+    started = []
+
+    def busy_port(port):
+        raise OSError("Address already in use")
+
+    monkeypatch.setattr(ui, "start_metrics_server", busy_port)
+    monkeypatch.setattr(ui, "configure_tracing", lambda config: started.append("tracing"))
+    monkeypatch.setattr(ui, "start_worker_pool", lambda path, workers, metrics_port: started.append(("workers", path, workers, metrics_port)))
+    monkeypatch.setattr(ui, "warm_up", lambda *args, **kwargs: started.append("warm-up"))
+    monkeypatch.setattr(ui, "_JOB_QUEUE_UNAVAILABLE", threading.Event())
+
+    class Context:
+        config = replace(app_config, metrics_port=9464, job_queue_path="jobs.sqlite3", job_workers=2)
+
+        def clients(self):
+            return None, None
+
+    # Занятый порт метрик не отключает пул worker и режим очереди
+    assert ui.start_services(Context()) == "jobs.sqlite3"
+    assert started == ["tracing", ("workers", "jobs.sqlite3", 2, 9464), "warm-up"]
+    assert not ui._JOB_QUEUE_UNAVAILABLE.is_set()
+
+    def no_workers(path, workers, metrics_port):
+        raise OSError("cannot fork")
+
+    monkeypatch.setattr(ui, "start_worker_pool", no_workers)
+    assert ui.start_services(Context()) == ""
+    assert ui._JOB_QUEUE_UNAVAILABLE.is_set()